@@ -5,22 +5,41 @@ import re
 from datetime import datetime
 
 # 假设你刚才修改的两个脚本文件名如下，请确保文件名对应
-from download_video import get_bili_video_tasks, download_with_ytdlp
+from download_video import get_bili_video_tasks, plan_downloads, download_with_ytdlp
+from util.browser_pool import close_pool
+from util.trend_store import TrendStore
 from merge_video import run_video_pipeline
 
 # ================= 静态配置区 =================
 # 🎯 已按要求修改为 10~20 分钟范围
 TARGET_RANGE = (10, 20)
+# 热点候选：趋势库里近 3 小时排名上升最快的词 (由 observe_hot --watch 持续写入)
+RISING_WINDOW = 3 * 3600
+RISING_SUGGEST = 10
 
 
 # =============================================
 
+def pick_hot_keyword():
+    """列出近几小时涨得最快的热搜供选择：输入序号直接选用，也可以手动输入关键词"""
+    rising = TrendStore().rising(RISING_WINDOW, RISING_SUGGEST)
+    if rising:
+        print(f"📈 近 {RISING_WINDOW // 3600} 小时上升最快的热搜:")
+        for i, r in enumerate(rising, 1):
+            print(f"  {i:>2}. {r['term']}  第{r['old_rank']}→{r['rank']}名  热度 {r['hot']}")
+    choice = input("🔥 请输入【当前热点】关键词或上面的序号 (1.mp4): ").strip()
+    if choice.isdigit() and 1 <= int(choice) <= len(rising):
+        choice = rising[int(choice) - 1]['term']
+        print(f"✅ 已选热点: {choice}")
+    return choice
+
+
 async def main():
     # 1. 分别输入两个核心搜索词
     min_m, max_m = TARGET_RANGE
     print(f"🎬 --- 视频素材 1080P 高清增强版 ({min_m}-{max_m}min) ---")
 
-    hot_kw = input("🔥 请输入【当前热点】关键词 (1.mp4): ").strip()
+    hot_kw = pick_hot_keyword()
     history_kw = input("📜 请输入【黑历史】关键词 (2.mp4...): ").strip()
 
     if not hot_kw or not history_kw:
@@ -36,13 +55,19 @@ async def main():
         history_kw,
         target_total_range=TARGET_RANGE
     )
+    # 后面不再搜索，浏览器可以关了
+    await close_pool()
 
     if not video_tasks:
         print("❌ 未检索到符合条件的视频任务，流程终止。")
         return
 
+    # 先按已知时长规划出字节最少的组合，只下计划内的素材
+    plan, backups = plan_downloads(video_tasks, target_total_range=TARGET_RANGE)
+
     # 传入 target_min_sec 为 600秒 (10分钟)
-    downloaded_dir = await download_with_ytdlp(video_tasks, hot_kw, target_min_sec=min_m * 60)
+    downloaded_dir = await download_with_ytdlp(plan, hot_kw, target_min_sec=min_m * 60,
+                                               backups=backups, target_total_range=TARGET_RANGE)
 
     if not downloaded_dir or not os.path.exists(downloaded_dir):
         print("❌ 下载失败或未发现素材，流程终止。")
@@ -1,17 +1,28 @@
 import asyncio
-from playwright.async_api import async_playwright
 import yt_dlp
 import sys
 import re
 import csv
 import os
+import time
+import threading
 from datetime import datetime
+from urllib.parse import urlparse
 import random
 
+from util.browser_pool import close_pool
+from util.search_cache import cached_search
+from util.download_opts import format_opts
+
 # ================= 配置区 =================
 OUTPUT_ROOT = "my_creative_material"
 USE_SUBFOLDER = True
 PROXY_URL = "http://127.0.0.1:7897"
+CONCURRENT_DOWNLOADS = 3  # 同时下载的任务数，设为 1 即恢复逐个下载
+HOST_MAX_CONCURRENT = 2  # 同一站点最多同时几个请求
+HOST_INTERVAL = (2, 4)  # 同一站点两次发起下载之间的随机间隔 (秒)
+# 搜索结果拿不到文件大小，按 1080P AVC + AAC 的平均码率估算 (约 4.5Mbps)
+EST_BYTES_PER_SEC = 560 * 1024
 
 
 # ==========================================
@@ -28,63 +39,33 @@ def save_to_csv(data, folder_path):
         writer.writerow(data)
 
 
-async def get_bili_video_tasks(hot_kw, history_kw, target_total_range=(10, 20)):  # 修改范围至10~20min
+async def get_bili_video_tasks(hot_kw, history_kw, target_total_range=(10, 20), refresh=False):  # 修改范围至10~20min
+    """refresh=True 时跳过搜索缓存强制重新抓取"""
     all_hot_candidates = []
     all_history_candidates = []
 
-    async with async_playwright() as p:
-        browser = await p.chromium.launch(headless=False
-                                          # , proxy={"server": PROXY_URL}
-                                          )
-        context = await browser.new_context(
-            user_agent="Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/122.0.0.0 Safari/537.36")
-        page = await context.new_page()
-
-        async def search_and_pick(search_kw, is_hot=True, min_len=60, max_len=1200):  # 最大素材长度配合20min阈值
-            url = f"https://search.bilibili.com/all?keyword={search_kw}"
-            print(f"\n🌐 正在检索关键词: {search_kw}")
-            try:
-                await page.goto(url, wait_until="networkidle", timeout=30000)
-                try:
-                    await page.click("button:has-text('最多点击')", timeout=5000)
-                    await asyncio.sleep(2)
-                    print(f"📈 已切换至「最多点击」排序")
-                except:
-                    print(f"⚠️ 切换排序失败，使用默认排序")
-
-                await page.wait_for_selector(".bili-video-card, .video-list-item", timeout=8000)
-                cards = await page.query_selector_all(".bili-video-card, .video-list-item")
-
-                found_count = 0
-                for card in cards:
-                    if found_count >= 8: break
-
-                    duration_el = await card.query_selector(".bili-video-card__stats__duration, .duration")
-                    if not duration_el: continue
-                    d_str = (await duration_el.inner_text()).strip()
-
-                    parts = list(map(int, d_str.split(':')))
-                    sec = parts[0] * 60 + parts[1] if len(parts) == 2 else parts[0] * 3600 + parts[1] * 60 + parts[
-                        2] if len(parts) == 3 else 0
-
-                    if sec < min_len or sec > max_len: continue
-
-                    link_el = await card.query_selector("a[href*='/video/BV']")
-                    if link_el:
-                        href = await link_el.get_attribute("href")
-                        clean_url = (f"https:{href}" if href.startswith("//") else href).split("?")[0]
-                        task = (clean_url, sec, d_str)
-                        if is_hot:
-                            all_hot_candidates.append(task)
-                        else:
-                            all_history_candidates.append(task)
-                        found_count += 1
-            except Exception as e:
-                print(f"⚠️ 搜索异常: {e}")
-
-        await search_and_pick(hot_kw, is_hot=True)
-        await search_and_pick(history_kw, is_hot=False)
-        await browser.close()
+    async def search_and_pick(search_kw, is_hot=True, min_len=60, max_len=1200):  # 最大素材长度配合20min阈值
+        print(f"\n🌐 正在检索关键词: {search_kw}")
+        try:
+            # 「最多点击」排序；先查搜索缓存，未命中才从常驻浏览器池抓取
+            cards = await cached_search(search_kw, order="click", bypass=refresh)
+
+            found_count = 0
+            for card in cards:
+                if found_count >= 8: break
+                sec = card['sec']
+                if sec < min_len or sec > max_len: continue
+
+                task = (card['url'], sec, card['d_str'])
+                if is_hot:
+                    all_hot_candidates.append(task)
+                else:
+                    all_history_candidates.append(task)
+                found_count += 1
+        except Exception as e:
+            print(f"⚠️ 搜索异常: {e}")
+
+    await asyncio.gather(search_and_pick(hot_kw, is_hot=True), search_and_pick(history_kw, is_hot=False))
 
     final_tasks = []
     if all_hot_candidates:
@@ -96,7 +77,119 @@ async def get_bili_video_tasks(hot_kw, history_kw, target_total_range=(10, 20)):
     return final_tasks
 
 
-async def download_with_ytdlp(tasks, hot_kw, target_min_sec=600):  # 修改目标为10分钟
+def estimate_bytes(task):
+    return task.get('bytes') or task['sec'] * EST_BYTES_PER_SEC
+
+
+def _pick_subset(candidates, lo_sec, hi_sec):
+    """
+    在候选里选一组总时长落在 [lo_sec, hi_sec] 且总字节最少的组合 (字节相同取排名靠前的)。
+    没有组合能达到 lo_sec 时，退而求其次取不超过 hi_sec 的最长组合。返回候选下标列表。
+    """
+    # 按总时长做背包: sec -> (字节, 排名和, 下标组合)
+    states = {0: (0, 0, ())}
+    for i, task in enumerate(candidates):
+        for sec, (size, rank, idx) in list(states.items()):
+            n_sec = sec + task['sec']
+            if n_sec > hi_sec:
+                continue
+            cand = (size + estimate_bytes(task), rank + i, idx + (i,))
+            if n_sec not in states or cand[:2] < states[n_sec][:2]:
+                states[n_sec] = cand
+    feasible = [v for sec, v in states.items() if sec >= lo_sec]
+    if feasible:
+        return list(min(feasible)[2])
+    return list(states[max(states)][2])
+
+
+def plan_downloads(tasks, target_total_range=(10, 20), done_sec=0, need_hot=True):
+    """
+    下载前先规划：用已知时长和估算大小，选出总时长落在 target_total_range (分钟) 内、
+    字节数最少的一组素材；没选中的按原排名留作失败时的备选。
+    返回 (plan, backups)
+    """
+    lo_sec, hi_sec = target_total_range[0] * 60 - done_sec, target_total_range[1] * 60 - done_sec
+    plan, backups = [], []
+    hot = [t for t in tasks if t['type'] == "hot"]
+    history = [t for t in tasks if t['type'] == "history"]
+
+    # 最热第一个是主视频，必下
+    if need_hot and hot and hot[0]['sec'] <= hi_sec:
+        plan.append(hot[0])
+        lo_sec -= hot[0]['sec']
+        hi_sec -= hot[0]['sec']
+
+    chosen = set(_pick_subset(history, lo_sec, hi_sec)) if lo_sec > 0 else set()
+    plan.extend(t for i, t in enumerate(history) if i in chosen)
+    backups.extend(t for i, t in enumerate(history) if i not in chosen)
+
+    total = sum(t['sec'] for t in plan)
+    size = sum(estimate_bytes(t) for t in plan)
+    print(f"🧾 下载计划: {len(plan)} 个素材 | 共 {total // 60}分{total % 60}秒 | 预计 {size / 1024 / 1024:.0f}MB "
+          f"| 备选 {len(backups)} 个")
+    return plan, backups
+
+
+class YtdlpSession:
+    """
+    多个下载线程共用的 yt-dlp 会话：Chrome cookie 只读一次，
+    每个线程一个 YoutubeDL 实例 (提取器初始化也只做一次)，共享同一个 cookie jar。
+    """
+
+    def __init__(self, opts):
+        self.opts = dict(opts)
+        loader = yt_dlp.YoutubeDL(self.opts)
+        self.cookiejar = loader.cookiejar  # 这里触发 cookiesfrombrowser 读取
+        loader.close()
+        self.opts.pop('cookiesfrombrowser', None)
+        self.local = threading.local()
+        self.instances = []
+        self.lock = threading.Lock()
+
+    def _ydl(self):
+        ydl = getattr(self.local, 'ydl', None)
+        if ydl is None:
+            ydl = yt_dlp.YoutubeDL(self.opts)
+            ydl.cookiejar = self.cookiejar
+            self.local.ydl = ydl
+            with self.lock:
+                self.instances.append(ydl)
+        return ydl
+
+    def download(self, url, slot):
+        """下载到 outtmpl 里的 %(slot)s 文件名，返回 info"""
+        return self._ydl().extract_info(url, download=True, extra_info={'slot': slot})
+
+    def close(self):
+        for ydl in self.instances:
+            ydl.close()
+
+
+class HostLimiter:
+    """按站点限流：同站点并发上限 + 两次发起之间的随机间隔"""
+
+    def __init__(self, max_concurrent=HOST_MAX_CONCURRENT, interval=HOST_INTERVAL):
+        self.max_concurrent = max_concurrent
+        self.interval = interval
+        self.sems = {}
+        self.next_start = {}
+        self.lock = asyncio.Lock()
+
+    async def acquire(self, url):
+        host = urlparse(url).netloc
+        sem = self.sems.setdefault(host, asyncio.Semaphore(self.max_concurrent))
+        await sem.acquire()
+        async with self.lock:
+            now = time.monotonic()
+            start = max(now, self.next_start.get(host, now))
+            self.next_start[host] = start + random.uniform(*self.interval)
+        await asyncio.sleep(start - now)
+        return sem
+
+
+async def download_with_ytdlp(tasks, hot_kw, target_min_sec=600, concurrency=CONCURRENT_DOWNLOADS,
+                              backups=None, target_total_range=(10, 20)):  # 修改目标为10分钟
+    """tasks 为 plan_downloads 的计划；有下载失败时从 backups 里按同样规则重新规划补位"""
     if not tasks:
         print("\n终止: 没有符合要求的素材。")
         return None
@@ -113,14 +206,12 @@ async def download_with_ytdlp(tasks, hot_kw, target_min_sec=600):  # 修改目
 
     # 状态控制
     MAX_TOTAL_SEC = 1200  # 硬性上限20分钟，防止素材过多
-    actual_hot_success = 0
-    actual_history_success = 0
-    current_total_sec = 0
+    state = {'hot': 0, 'history': 0, 'total': 0}  # 已成功
+    inflight = {'hot': 0, 'total': 0}  # 下载中 (按成功预占预算)
 
-    # 修改为 1080P 优先配置
+    # merge_video 输出 1920x1080：最高 1080P，其中选够用的最小流，同分辨率优先 AVC + AAC
     ydl_opts_base = {
-        'format': 'bestvideo[height<=1080][vcodec^=avc1]+bestaudio[acodec^=mp4a]/bestvideo[height<=1080]+bestaudio/best',
-        'merge_output_format': 'mp4',
+        **format_opts(1920, 1080),
         'nocheckcertificate': True,
         'socket_timeout': 60,
         'retries': 5,
@@ -128,59 +219,99 @@ async def download_with_ytdlp(tasks, hot_kw, target_min_sec=600):  # 修改目
         # 'proxy': PROXY_URL,
         'quiet': True,
         'no_warnings': True,
+        # 先下到临时槽位文件名，成功后再按完成顺序改名为 1.mp4 / 2.mp4 ...
+        'outtmpl': os.path.join(final_dir, "%(slot)s.%(ext)s"),
     }
 
-    print(f"\n🚀 开始 1080P 素材下载 (目标时长: 10~20min)...")
-
-    for task in tasks:
-        # 如果总时长已超过上限 20min，停止下载
-        if current_total_sec >= MAX_TOTAL_SEC:
-            break
-
+    def admit(task, total, hot):
+        """按 10~20min 预算规则判断该任务现在能不能下"""
+        if total >= MAX_TOTAL_SEC:
+            return False
         if task['type'] == "history":
-            # 如果是副视频，且总时长已达到最小目标 10min，则跳过后续
-            if current_total_sec >= target_min_sec:
-                continue
-
-        if task['type'] == "hot" and actual_hot_success >= 1:
-            continue
-
+            # 如果是副视频，且总时长已达到最小目标 10min，则跳过
+            return total < target_min_sec
+        return hot < 1
+
+    print(f"\n🚀 开始 1080P 素材下载 (目标时长: 10~20min | 并发: {concurrency})...")
+    session = await asyncio.to_thread(YtdlpSession, ydl_opts_base)
+    limiter = HostLimiter()
+
+    async def fetch(task, slot):
+        sem = await limiter.acquire(task['url'])
+        try:
+            info = await asyncio.to_thread(session.download, task['url'], slot)
+        finally:
+            sem.release()
+        return info
+
+    def finish(task, slot, info):
+        # 按完成顺序命名，失败的任务不会在编号里留空洞
         if task['type'] == "hot":
             filename = "1.mp4"
         else:
-            filename = f"{actual_history_success + 2}.mp4"
-
-        print(f"📥 尝试下载 [{filename}] | 时长: {task['d_str']} | URL: {task['url']}")
-        await asyncio.sleep(random.uniform(2, 4))
-
-        opts = ydl_opts_base.copy()
-        opts['outtmpl'] = os.path.join(final_dir, filename.split('.')[0] + ".%(ext)s")
-
-        with yt_dlp.YoutubeDL(opts) as ydl:
-            try:
-                info = ydl.extract_info(task['url'], download=True)
-                metadata = {
-                    "搜索关键词": hot_kw, "文件名": filename,
-                    "是否最热第一个": "是" if filename == "1.mp4" else "否",
-                    "标题": info.get('title'), "播放量": info.get('view_count'),
-                    "点赞数": info.get('like_count'), "时长": info.get('duration_string'),
-                    "发布日期": info.get('upload_date'), "视频链接": task['url']
-                }
-                save_to_csv(metadata, final_dir)
-
-                if task['type'] == "hot":
-                    actual_hot_success += 1
-                else:
-                    actual_history_success += 1
-
-                current_total_sec += task['sec']
-                print(f"✨ 下载成功! 当前已累积时长: {current_total_sec // 60}分{current_total_sec % 60}秒")
-
-            except Exception as e:
-                print(f"❌ 下载失败: {e}")
+            filename = f"{state['history'] + 2}.mp4"
+        for f in os.listdir(final_dir):
+            if f.startswith(f"{slot}."):
+                os.replace(os.path.join(final_dir, f), os.path.join(final_dir, filename.split('.')[0] + os.path.splitext(f)[1]))
+        metadata = {
+            "搜索关键词": hot_kw, "文件名": filename,
+            "是否最热第一个": "是" if filename == "1.mp4" else "否",
+            "标题": info.get('title'), "播放量": info.get('view_count'),
+            "点赞数": info.get('like_count'), "时长": info.get('duration_string'),
+            "发布日期": info.get('upload_date'), "视频链接": task['url']
+        }
+        save_to_csv(metadata, final_dir)
+        state[task['type']] += 1
+        state['total'] += task['sec']
+        print(f"✨ 下载成功 [{filename}]! 当前已累积时长: {state['total'] // 60}分{state['total'] % 60}秒")
+
+    pending = list(tasks)
+    running = {}
+    slots = 0
+    try:
+        while pending or running:
+            # 1. 在并发上限内尽量多地发起任务
+            i = 0
+            while i < len(pending) and len(running) < concurrency:
+                task = pending[i]
+                if not admit(task, state['total'], state['hot']):
+                    # 只看已成功的就超预算了，以后也不会再需要它
+                    pending.pop(i)
+                    continue
+                if not admit(task, state['total'] + inflight['total'], state['hot'] + inflight['hot']):
+                    # 算上下载中的才超预算：等它们结果，失败了可能还要补下
+                    i += 1
+                    continue
+                pending.pop(i)
+                slots += 1
+                slot = f"_dl_{slots}"
+                print(f"📥 尝试下载 [{slot}] | 时长: {task['d_str']} | URL: {task['url']}")
+                inflight['total'] += task['sec']
+                inflight['hot'] += task['type'] == "hot"
+                running[asyncio.create_task(fetch(task, slot))] = (task, slot)
+            if not running:
+                break
+
+            # 2. 等任意一个完成，结算预算
+            done, _ = await asyncio.wait(running, return_when=asyncio.FIRST_COMPLETED)
+            for fut in done:
+                task, slot = running.pop(fut)
+                inflight['total'] -= task['sec']
+                inflight['hot'] -= task['type'] == "hot"
+                try:
+                    finish(task, slot, fut.result())
+                except Exception as e:
+                    print(f"❌ 下载失败: {e}")
+                    if backups:
+                        # 按剩余预算从备选里重新规划补位
+                        extra, backups = plan_downloads(backups, target_total_range,
+                                                        done_sec=state['total'] + inflight['total'], need_hot=False)
+                        pending.extend(extra)
+    finally:
+        session.close()
 
     print(
-        f"\n✅ 任务结束 | 成功下载: {actual_hot_success}主 + {actual_history_success}副 | 总长: {current_total_sec // 60}min")
+        f"\n✅ 任务结束 | 成功下载: {state['hot']}主 + {state['history']}副 | 总长: {state['total'] // 60}min")
     return final_dir
 
 
@@ -191,8 +322,10 @@ if __name__ == "__main__":
         async def run():
             # 搜索匹配 10~20min
             tasks = await get_bili_video_tasks(hot_kw, history_kw, target_total_range=(10, 20))
+            plan, backups = plan_downloads(tasks, target_total_range=(10, 20))
             # 下载目标最小 10min (600秒)
-            await download_with_ytdlp(tasks, hot_kw, target_min_sec=600)
+            await download_with_ytdlp(plan, hot_kw, target_min_sec=600, backups=backups, target_total_range=(10, 20))
+            await close_pool()
 
 
         asyncio.run(run())
\ No newline at end of file
@@ -1,7 +1,8 @@
-import whisper
 import os
 import sys
 
+from util.transcribe import transcribe
+
 
 def transcribe_video_content(video_path, model_size="small"):
     # 1. 再次确认文件是否存在
@@ -16,20 +17,16 @@ def transcribe_video_content(video_path, model_size="small"):
     print(f"--- 🚀 开始处理视频: {video_path} ---")
 
     try:
-        # 2. 加载模型 (针对 Mac 优化)
-        print(f"正在加载 Whisper [{model_size}] 模型...")
-        model = whisper.load_model(model_size)
-
-        # 3. 语音识别 (Whisper 直接读视频通常比提取音频更稳)
+        # 2. 语音识别 (Whisper 直接读视频通常比提取音频更稳；模型由常驻转录服务持有)
         print("语音识别中，可能需要几分钟（视视频长度而定）...")
-        result = model.transcribe(
+        result = transcribe(
             video_path,
-            fp16=False,
-            language="Chinese",
+            model=model_size,
+            language="zh",
             initial_prompt="这是一段关于娱乐八卦、冯小刚和范冰冰的视频。"
         )
 
-        # 4. 保存文本
+        # 3. 保存文本
         with open(output_txt, "w", encoding="utf-8") as f:
             f.write(result["text"])
 
@@ -4,8 +4,33 @@ import time
 import random
 import json
 import shutil
-from concurrent.futures import ProcessPoolExecutor
+import threading
+from concurrent.futures import ProcessPoolExecutor, Future
 
+from util.ffmpeg_runner import run_ffmpeg, RunTelemetry
+from util.encoder import pick_encode_settings, encoder_profile, with_upload
+from util.filtergraph import FilterGraph
+
+# ================= 配置区 =================
+# 优化：Intel 芯片并行数建议设为 2，设为 4 极易导致 I/O 阻塞引发死机
+MAX_WORKERS = 2
+# 流式合并：转码完成的片段按顺序直接推入同一个 mux 进程，不再落地 combined.ts
+STREAM_MUX = True
+# 长素材拆分：超过该时长的输入按关键帧切成多段并行转码，再无损拼回
+SPLIT_LONG_INPUTS = True
+SPLIT_LONG_SEC = 180
+SPLIT_CHUNK_SEC = 120
+# 断点续跑：保留 temp_dir 里已完成且校验通过的片段，重跑时只补缺失或损坏的部分
+RESUME = False
+# 吞吐目标模式：给定整批目标实时倍率 (或截止时间秒数)，自动试编码选 x264 预设/线程/并发
+# 两者都为 None 时按本机能力自动选最快的编码后端 (Mac 上即 VideoToolbox)
+TARGET_RTF = None
+DEADLINE_SEC = None
+BITRATE = "4500k"  # 优化：4500k 在 1080P 下体积与画质最平衡，减少上传压力
+THREADS = 2  # 优化：限制单任务线程，防止 Intel CPU 瞬间满载死机
+
+
+# ==========================================
 
 def clean_up(temp_dir, output_file):
     if os.path.exists(temp_dir):
@@ -28,90 +53,327 @@ def get_video_info(file_path):
         return None
 
 
-def process_single_video(task_info):
-    file_path, output_ts, info = task_info
-    keep_duration = max(0.1, info['duration'] - 2.5)
+def probe_segment(ts_file, expected_duration):
+    """快速校验片段：能被 ffprobe 正常解析且时长基本完整"""
+    try:
+        res = subprocess.run(['ffprobe', '-v', 'error', '-show_entries', 'format=duration', '-of', 'csv=p=0', ts_file],
+                             capture_output=True, text=True, timeout=15)
+        return res.returncode == 0 and float(res.stdout.strip()) >= expected_duration - 1.0
+    except:
+        return False
+
+
+class SegmentManifest:
+    """temp_dir/manifest.json：记录已完成片段对应的输入指纹 (大小/修改时间)、滤镜参数、时间段和编码配置"""
+
+    def __init__(self, temp_dir):
+        self.path = os.path.join(temp_dir, "manifest.json")
+        self.lock = threading.Lock()
+        self.done = {}
+        if os.path.exists(self.path):
+            try:
+                with open(self.path, 'r', encoding='utf-8') as f:
+                    self.done = json.load(f).get('segments', {})
+            except:
+                print("⚠️ manifest 损坏，将全部重新转码。")
+
+    @staticmethod
+    def fingerprint(file_path):
+        st = os.stat(file_path)
+        return st.st_size, st.st_mtime
+
+    def params_for(self, file_path):
+        """输入未变化时沿用上次的随机参数，保证补转的片段与已有片段画面一致"""
+        size, mtime = self.fingerprint(file_path)
+        for entry in self.done.values():
+            if entry['input'] == file_path and entry['size'] == size and entry['mtime'] == mtime:
+                return entry['params']
+        return None
+
+    @staticmethod
+    def encoder_of(profile):
+        # 编码后端 / 预设 / 码率 / 线程变了的旧片段不能和新片段直接拼接 (H.264 profile / level 可能不一致)
+        return {'backend': profile['backend'], 'video_args': list(profile['video_args']), 'upload': profile['upload']}
 
+    def is_done(self, task):
+        file_path, output_ts, _, params, seg_range, profile = task
+        entry = self.done.get(os.path.basename(output_ts))
+        if not entry or not os.path.exists(output_ts):
+            return False
+        size, mtime = self.fingerprint(file_path)
+        if (entry['input'], entry['size'], entry['mtime']) != (file_path, size, mtime):
+            return False
+        if entry['params'] != params or entry['range'] != list(seg_range):
+            return False
+        if entry.get('encoder') != self.encoder_of(profile):
+            return False
+        return probe_segment(output_ts, seg_range[1])
+
+    def mark_done(self, task):
+        file_path, output_ts, _, params, seg_range, profile = task
+        size, mtime = self.fingerprint(file_path)
+        with self.lock:
+            self.done[os.path.basename(output_ts)] = {
+                'input': file_path, 'size': size, 'mtime': mtime, 'params': params, 'range': list(seg_range),
+                'encoder': self.encoder_of(profile),
+            }
+            # 先写临时文件再原子替换，进程被杀也不会留下半个 manifest
+            tmp_path = self.path + ".tmp"
+            with open(tmp_path, 'w', encoding='utf-8') as f:
+                json.dump({'segments': self.done}, f, ensure_ascii=False, indent=2)
+            os.replace(tmp_path, self.path)
+
+
+def get_keyframe_times(file_path):
+    """只解复用不解码，读出视频流所有关键帧的时间点"""
+    cmd = ['ffprobe', '-v', 'quiet', '-select_streams', 'v:0',
+           '-show_entries', 'packet=pts_time,flags', '-of', 'csv=p=0', file_path]
+    try:
+        res = subprocess.run(cmd, capture_output=True, text=True, timeout=60)
+    except subprocess.TimeoutExpired:
+        return []
+    times = []
+    for line in res.stdout.splitlines():
+        parts = line.split(',')
+        if len(parts) >= 2 and 'K' in parts[1]:
+            try:
+                times.append(float(parts[0]))
+            except ValueError:
+                continue
+    return sorted(times)
+
+
+def plan_ranges(keep_duration, keyframes, chunk_sec=SPLIT_CHUNK_SEC):
+    """把 [0, keep_duration) 按最接近等分点的关键帧切开，返回 [(start, duration), ...]"""
+    parts = max(1, round(keep_duration / chunk_sec))
+    cuts = [0.0]
+    for k in range(1, parts):
+        target = keep_duration * k / parts
+        candidates = [t for t in keyframes if cuts[-1] + 1 < t < keep_duration - 1]
+        if not candidates:
+            break
+        cut = min(candidates, key=lambda t: abs(t - target))
+        if cut > cuts[-1]:
+            cuts.append(cut)
+    cuts.append(keep_duration)
+    return [(a, b - a) for a, b in zip(cuts, cuts[1:])]
+
+
+def random_filter_params():
     # --- 随机参数逻辑 ---
-    r_bright = random.uniform(-0.005, 0.005)
-    r_cont = random.uniform(0.995, 1.005)
-    blur_value = random.randint(40, 60)
-    crop_offset = random.uniform(0.09, 0.11)
+    # 同一个输入拆成多段时必须共用同一组参数，否则拼接处画面会跳变
+    return {
+        'r_bright': random.uniform(-0.005, 0.005),
+        'r_cont': random.uniform(0.995, 1.005),
+        'blur_value': random.randint(40, 60),
+        'crop_offset': random.uniform(0.09, 0.11),
+        'volume': random.uniform(0.98, 1.02),
+    }
+
 
+def build_filters(params, duration, size=None, report=False):
+    """返回 (视频滤镜链, 音频滤镜链)；视频链经 FilterGraph 自动做成本改写"""
     # --- Intel Mac 专项优化滤镜链 ---
-    complex_filter = (
-        f"trim=0:{keep_duration},setpts=PTS-STARTPTS,"
-        f"crop=iw:ih*0.9:0:ih*{crop_offset},"
-        f"split=2[bg][fg];"
-        f"[bg]scale=1920:1080:flags=bilinear,boxblur={blur_value}:3[bg_blur];"
-        f"[fg]scale=-1:1080:flags=bilinear[fg_scale];"
-        f"[bg_blur][fg_scale]overlay=(W-w)/2:(H-h)/2,"
-        f"eq=brightness={r_bright}:contrast={r_cont},"
-        f"unsharp=3:3:0.5:3:3:0.0"
-    )
+    g = FilterGraph("merge_video")
+    head = g.chain(outputs="[bg][fg]", size=size)
+    head.add('trim', f"0:{duration}").add('setpts', 'PTS-STARTPTS')
+    head.crop('iw', 'ih*0.9', 0, f"ih*{params['crop_offset']}").add('split', 2)
+    g.chain('[bg]', '[bg_blur]', head.out_size()).scale(1920, 1080, 'bilinear').boxblur(params['blur_value'], 3)
+    g.chain('[fg]', '[fg_scale]', head.out_size()).scale(-1, 1080, 'bilinear')
+    tail = g.chain('[bg_blur][fg_scale]', size=(1920, 1080))
+    tail.add('overlay', '(W-w)/2:(H-h)/2')
+    tail.add('eq', f"brightness={params['r_bright']}:contrast={params['r_cont']}")
+    tail.add('unsharp', '3:3:0.5:3:3:0.0')
+    complex_filter = g.render()
+    if report:
+        g.report()
+
+    audio_filter = f"atrim=0:{duration},asetpts=PTS-STARTPTS,volume={params['volume']}"
+    return complex_filter, audio_filter
+
 
+def process_single_video(task_info):
+    file_path, output_ts, info, params, (start, duration), profile = task_info
+    complex_filter, audio_filter = build_filters(params, duration, (info['width'], info['height']))
+
+    # 拆分段从关键帧处输入定位，起点之前无需解码
+    seek = ['-ss', f"{start:.3f}"] if start > 0 else []
     cmd = [
-        'ffmpeg', '-y', '-i', file_path,
-        '-vf', complex_filter,
-        '-af', f"atrim=0:{keep_duration},asetpts=PTS-STARTPTS,volume={random.uniform(0.98, 1.02)}",
-        '-c:v', 'h264_videotoolbox',
-        '-b:v', '4500k',  # 优化：4500k 在 1080P 下体积与画质最平衡，减少上传压力
-        '-profile:v', 'main',
-        '-realtime', '1',
-        '-threads', '2',  # 优化：限制单任务线程，防止 Intel CPU 瞬间满载死机
+        'ffmpeg', '-y', *profile['input_args'], *seek, '-i', file_path,
+        '-vf', with_upload(complex_filter, profile),
+        '-af', audio_filter,
+        *profile['video_args'],
         '-c:a', 'aac', '-b:a', '128k',
         '-map_metadata', '-1',
         '-f', 'mpegts', output_ts
     ]
 
-    res = subprocess.run(cmd, capture_output=True, text=True)
+    res = run_ffmpeg(cmd, label=os.path.basename(output_ts), duration=duration, filter_desc="bg_blur_overlay_1080p")
     if res.returncode != 0:
         print(f"❌ 文件 {os.path.basename(file_path)} 处理失败。")
-        return None
-    return output_ts
+        return None, res.stats
+    return output_ts, res.stats
 
 
-def run_video_pipeline(input_dir, temp_dir, output_file):
+def stream_concat(futures, output_file, temp_dir, keep_segments=False, telemetry=None):
+    """
+    按输入顺序把转码好的 .ts 片段推入同一个 ffmpeg mux 进程 (stdin 管道)，
+    直接封装成 faststart MP4，省掉 combined.ts 这一次整片落盘。
+    片段推入后立即删除，临时目录峰值占用也随之下降。
+    """
+    cmd = [
+        'ffmpeg', '-y', '-f', 'mpegts', '-i', 'pipe:0',
+        '-c', 'copy',
+        '-map_metadata', '-1',
+        '-movflags', '+faststart',
+        output_file
+    ]
+    fed = 0
+    # stderr 写入日志文件而不是 PIPE，避免 mux 输出塞满管道反过来卡住写入
+    with open(os.path.join(temp_dir, "mux.log"), 'wb') as log:
+        muxer = subprocess.Popen(cmd, stdin=subprocess.PIPE, stdout=subprocess.DEVNULL, stderr=log)
+        try:
+            for future in futures:
+                ts_file, stats = future.result()
+                if telemetry:
+                    telemetry.add(stats)
+                if ts_file is None or not os.path.exists(ts_file):
+                    continue
+                with open(ts_file, 'rb') as infile:
+                    shutil.copyfileobj(infile, muxer.stdin, 1024 * 1024)
+                if not keep_segments:
+                    os.remove(ts_file)
+                fed += 1
+        except BrokenPipeError:
+            print("❌ mux 进程提前退出。")
+        finally:
+            try:
+                muxer.stdin.close()
+            except BrokenPipeError:
+                pass
+            muxer.wait()
+
+    if not fed and os.path.exists(output_file):
+        os.remove(output_file)
+    return fed, muxer.returncode
+
+
+def build_tasks(file_path, index, info, temp_dir, split_long, manifest, profile):
+    """一个输入对应一个或多个转码任务；长素材按关键帧拆成多段，各段共用同一组随机参数"""
+    keep_duration = max(0.1, info['duration'] - 2.5)
+    params = (manifest and manifest.params_for(file_path)) or random_filter_params()
+    ranges = [(0.0, keep_duration)]
+    if split_long and keep_duration > SPLIT_LONG_SEC:
+        ranges = plan_ranges(keep_duration, get_keyframe_times(file_path))
+        if len(ranges) > 1:
+            print(f"✂️ {os.path.basename(file_path)} 时长 {keep_duration / 60:.1f}min，按关键帧拆为 {len(ranges)} 段并行转码")
+    return [(file_path, os.path.join(temp_dir, f"{index:04d}_{j:03d}.ts"), info, params, r, profile)
+            for j, r in enumerate(ranges)]
+
+
+def _record_segment(manifest, future, task):
+    if not future.cancelled() and future.exception() is None and future.result()[0]:
+        manifest.mark_done(task)
+
+
+def run_video_pipeline(input_dir, temp_dir, output_file, stream_mux=STREAM_MUX, split_long=SPLIT_LONG_INPUTS,
+                       resume=RESUME, target_rtf=TARGET_RTF, deadline_sec=DEADLINE_SEC):
     start_time = time.time()
     input_dir, temp_dir, output_file = map(os.path.abspath, [input_dir, temp_dir, output_file])
-    clean_up(temp_dir, output_file)
+    manifest = None
+    if resume:
+        os.makedirs(temp_dir, exist_ok=True)
+        if os.path.exists(output_file):
+            os.remove(output_file)
+        manifest = SegmentManifest(temp_dir)
+    else:
+        clean_up(temp_dir, output_file)
 
     files = sorted(
         [f for f in os.listdir(input_dir) if f.lower().endswith(('.mp4', '.mov', '.mkv')) and not f.startswith('.')])
     if not files: return print("未发现视频。")
 
     print(f"🚀 [1080P 高清优化模式] 正在处理 {len(files)} 个视频...")
+    infos = [(os.path.join(input_dir, f), get_video_info(os.path.join(input_dir, f))) for f in files]
+    infos = [(i, path, info) for i, (path, info) in enumerate(infos) if info]
+    if not infos: return print("❌ 视频信息读取失败。")
+
+    # 这个脚本原来就开着 VideoToolbox 的 -realtime 1，保持不变
+    profile, workers = encoder_profile('master', BITRATE, threads=THREADS, realtime=True), MAX_WORKERS
+    # 滤镜成本估算只打印一次 (按第一个素材的尺寸)
+    sample_size = (infos[0][2]['width'], infos[0][2]['height'])
+    build_filters(random_filter_params(), SPLIT_CHUNK_SEC, sample_size, report=True)
+
+    if target_rtf or deadline_sec:
+        # 用第一个素材 + 真实滤镜链试编码，选出满足吞吐目标的最高画质软件编码配置
+        sample_path = infos[0][1]
+        vf, af = build_filters(random_filter_params(), SPLIT_CHUNK_SEC, sample_size)
+        total_media = sum(max(0.1, info['duration'] - 2.5) for _, _, info in infos)
+        settings = pick_encode_settings(['-i', sample_path, '-vf', vf, '-af', af], BITRATE,
+                                        target_rtf=target_rtf, deadline_sec=deadline_sec,
+                                        total_media_sec=total_media)
+        profile = encoder_profile('master', BITRATE, threads=settings['threads'], preset=settings['preset'])
+        workers = settings['workers']
+
     tasks = []
-    for i, f in enumerate(files):
-        info = get_video_info(os.path.join(input_dir, f))
-        if info:
-            tasks.append((os.path.join(input_dir, f), os.path.join(temp_dir, f"{i:04d}.ts"), info))
-
-    # 优化：Intel 芯片并行数建议设为 2，设为 4 极易导致 I/O 阻塞引发死机
-    with ProcessPoolExecutor(max_workers=2) as executor:
-        results = list(executor.map(process_single_video, tasks))
-
-    valid_ts = [r for r in results if r is not None and os.path.exists(r)]
-    if not valid_ts:
-        print("❌ 转码失败。")
-        return
-
-    combined_ts = os.path.join(temp_dir, "combined.ts")
-    with open(combined_ts, 'wb') as outfile:
-        for ts_file in valid_ts:
-            with open(ts_file, 'rb') as infile:
-                shutil.copyfileobj(infile, outfile)
-
-    # 最终合并优化：加入 faststart 标记，方便 YouTube 快速转码和播放
-    subprocess.run([
-        'ffmpeg', '-y', '-i', combined_ts,
-        '-c', 'copy',
-        '-map_metadata', '-1',
-        '-movflags', '+faststart',
-        output_file
-    ], capture_output=True)
+    for i, path, info in infos:
+        tasks.extend(build_tasks(path, i, info, temp_dir, split_long, manifest, profile))
+
+    telemetry = RunTelemetry("merge_video", workers)
+    with ProcessPoolExecutor(max_workers=workers) as executor:
+        futures, reused = [], 0
+        for t in tasks:
+            if manifest and manifest.is_done(t):
+                # 已完成且校验通过的片段直接复用，包装成已完成的 Future 以便统一按顺序合并
+                future = Future()
+                future.set_result((t[1], None))
+                reused += 1
+            else:
+                future = executor.submit(process_single_video, t)
+                if manifest:
+                    future.add_done_callback(lambda fut, t=t: _record_segment(manifest, fut, t))
+            futures.append(future)
+        if reused:
+            print(f"♻️ 复用已完成片段 {reused} 个，需补转 {len(tasks) - reused} 个")
+
+        if stream_mux:
+            # 边转码边合并：主进程按顺序等待片段，完成一个就推入 mux 一个
+            fed, code = stream_concat(futures, output_file, temp_dir, keep_segments=resume, telemetry=telemetry)
+        else:
+            results = [f.result() for f in futures]
+            for _, stats in results:
+                telemetry.add(stats)
+    telemetry.write(os.path.dirname(output_file))
+
+    if stream_mux:
+        if not fed:
+            print("❌ 转码失败。")
+            return
+        if code != 0:
+            print(f"❌ 合并失败，详情见: {os.path.join(temp_dir, 'mux.log')}")
+            return
+    else:
+        valid_ts = [r for r, _ in results if r is not None and os.path.exists(r)]
+        if not valid_ts:
+            print("❌ 转码失败。")
+            return
+
+        combined_ts = os.path.join(temp_dir, "combined.ts")
+        with open(combined_ts, 'wb') as outfile:
+            for ts_file in valid_ts:
+                with open(ts_file, 'rb') as infile:
+                    shutil.copyfileobj(infile, outfile)
+
+        # 最终合并优化：加入 faststart 标记，方便 YouTube 快速转码和播放
+        subprocess.run([
+            'ffmpeg', '-y', '-i', combined_ts,
+            '-c', 'copy',
+            '-map_metadata', '-1',
+            '-movflags', '+faststart',
+            output_file
+        ], capture_output=True)
 
-    if os.path.exists(combined_ts): os.remove(combined_ts)
+        if os.path.exists(combined_ts): os.remove(combined_ts)
     print(f"✅ 完成！总耗时: {time.time() - start_time:.2f}s")
 
 
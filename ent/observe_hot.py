@@ -1,19 +1,28 @@
 import os
+import sys
+import time
+import random
 import requests
 import pandas as pd
 from datetime import datetime
 
+from util.trend_store import TrendStore
+
 # --- ⚙️ 配置区域 ---
 # 严格遵守命名习惯，严禁使用 cleansed_P
 OUTPUT_DIR = "/Users/huangyun/Desktop/搬运/ENT/trend_reports"
+SAVE_CSV_SNAPSHOT = False  # 趋势已写进 TrendStore；需要给别人看原始快照时再打开
 
+POLL_INTERVAL = 10 * 60  # 正常轮询间隔 (秒)
+POLL_JITTER = 60  # 间隔上加的随机抖动，避免每次都在整点请求
+BACKOFF_MAX = 60 * 60  # 连续失败时指数退避的上限
+RISING_WINDOW = 3 * 3600  # 「近 3 小时涨得最快」
 
-# ------------------
 
-def fetch_weibo_hot():
-    if not os.path.exists(OUTPUT_DIR):
-        os.makedirs(OUTPUT_DIR)
+# ------------------
 
+def fetch_weibo_hot(store=None):
+    """抓一次微博热搜并写入趋势库，返回本次榜单；失败返回 None (由轮询器退避重试)"""
     print(f"[{datetime.now()}] 🚀 启动微博娱乐热点雷达 (国内瓜源)...")
 
     url = "https://weibo.com/ajax/side/hotSearch"
@@ -24,40 +33,73 @@ def fetch_weibo_hot():
 
     try:
         response = requests.get(url, headers=headers, timeout=10)
-        if response.status_code == 200:
-            data = response.json()
-            hot_list = data.get('data', {}).get('realtime', [])
-
-            items = []
-            for item in hot_list:
-                # 过滤出娱乐类目（通常带有 '剧集', '综艺', '明星' 等标签，或者直接全量抓取）
-                # label_name 有时代表类别，比如 '爆', '沸', '热'
-                title = item.get('word', '')
-                category = item.get('category', '')
-                num = item.get('num', 0)  # 热度值
-
-                items.append({'Search_Term': title, 'Category': category, 'Hot_Value': num})
-
-            if items:
-                df = pd.DataFrame(items)
-                # 按照热度排序
-                df = df.sort_values(by='Hot_Value', ascending=False)
-
-                timestamp = datetime.now().strftime('%Y%m%d_%H%M')
-                filename = f"Weibo_Hot_{timestamp}.csv"
-                save_path = os.path.join(OUTPUT_DIR, filename)
-
-                df.to_csv(save_path, index=False)
-                print(f"✅ 微博热搜已捕获！当前第一名：{items[0]['Search_Term']}")
-                print(df.head(10))  # 打印前 10 名
-            else:
-                print("⚠️ 未能抓取到微博热搜数据。")
-        else:
+        if response.status_code != 200:
             print(f"❌ 访问微博失败，状态码: {response.status_code}")
+            return None
+        data = response.json()
+        hot_list = data.get('data', {}).get('realtime', [])
+
+        items = []
+        for item in hot_list:
+            # 过滤出娱乐类目（通常带有 '剧集', '综艺', '明星' 等标签，或者直接全量抓取）
+            # label_name 有时代表类别，比如 '爆', '沸', '热'
+            title = item.get('word', '')
+            category = item.get('category', '')
+            num = item.get('num', 0)  # 热度值
+
+            items.append({'Search_Term': title, 'Category': category, 'Hot_Value': num})
+
+        if not items:
+            print("⚠️ 未能抓取到微博热搜数据。")
+            return None
+
+        # 按照热度排序，名次即排序后的位置
+        items.sort(key=lambda x: x['Hot_Value'], reverse=True)
+        store = store or TrendStore()
+        changed = store.record([{'term': it['Search_Term'], 'rank': i + 1, 'hot': it['Hot_Value'],
+                                 'category': it['Category']} for i, it in enumerate(items)])
+        print(f"✅ 微博热搜已捕获！当前第一名：{items[0]['Search_Term']} | 变化 {changed} 条已入库")
+
+        if SAVE_CSV_SNAPSHOT:
+            os.makedirs(OUTPUT_DIR, exist_ok=True)
+            timestamp = datetime.now().strftime('%Y%m%d_%H%M')
+            pd.DataFrame(items).to_csv(os.path.join(OUTPUT_DIR, f"Weibo_Hot_{timestamp}.csv"), index=False)
+        return items
 
     except Exception as e:
         print(f"❌ 微博监控异常: {e}")
+        return None
+
+
+def print_rising(store, window_sec=RISING_WINDOW, limit=10):
+    rows = store.rising(window_sec, limit)
+    print(f"📈 近 {window_sec / 3600:g} 小时上升最快:")
+    for i, r in enumerate(rows, 1):
+        print(f"  {i:>2}. {r['term']}  第{r['old_rank']}→{r['rank']}名 ({r['rank_velocity']:+.1f}名/小时)"
+              f"  热度 {r['hot']} ({r['hot_delta']:+d})")
+    return rows
+
+
+def watch(interval=POLL_INTERVAL):
+    """常驻轮询：成功后按固定间隔 (+抖动) 再抓；失败时指数退避，恢复后回到正常间隔"""
+    store = TrendStore()
+    failures = 0
+    while True:
+        if fetch_weibo_hot(store):
+            failures = 0
+            print_rising(store)
+            delay = interval + random.uniform(0, POLL_JITTER)
+        else:
+            failures += 1
+            delay = min(BACKOFF_MAX, interval * 2 ** failures) * random.uniform(0.5, 1)
+            print(f"⏳ 连续失败 {failures} 次，{delay / 60:.1f} 分钟后重试")
+        time.sleep(delay)
 
 
 if __name__ == "__main__":
-    fetch_weibo_hot()
\ No newline at end of file
+    # python -m ent.observe_hot          抓一次
+    # python -m ent.observe_hot --watch  常驻轮询
+    if '--watch' in sys.argv:
+        watch()
+    elif fetch_weibo_hot():
+        print_rising(TrendStore())
@@ -1,74 +1,46 @@
 import os
-import time
 import re
-import pandas as pd
-import whisper
-from google import genai  # 使用最新的 Google GenAI SDK
-from moviepy import VideoFileClip
+import asyncio
 from tqdm import tqdm
 from dotenv import load_dotenv
+
+from util.transcribe import transcribe_batch
+from util.llm_client import LLMClient
+from util.result_store import ResultStore, RESULT_DB_NAME
 import warnings
 
 warnings.filterwarnings("ignore")
 
 # --- 1. 初始化配置 ---
 load_dotenv()
-# SDK 会自动从环境变量 GEMINI_API_KEY 中读取，如果没有，可以在这里手动传入
-client = genai.Client(api_key=os.getenv("GEMINI_API_KEY"))
-
-# --- 2. 载入转录引擎 ---
-print("🤖 正在载入 Whisper (small) 引擎...")
-whisper_model = whisper.load_model("small")
-
-
-# --- 3. Gemini 3 Flash 调用函数 ---
-
-def get_gemini_3_flash_copywriting(transcript, retry_count=0):
+# 模型尝试优先级 (带 models/ 前缀最稳)；404 直接换下一个，503/429 由 LLMClient 抖动退避后重试
+MODEL_POOL = [
+    "models/gemini-2.0-flash-exp",  # 目前最强的 Flash 预览版
+    "models/gemini-1.5-flash",  # 标准 Flash 版
+    "models/gemini-1.5-flash-latest",  # 始终指向最新的 1.5 Flash
+    "models/gemini-3-flash-preview"  # 如果你的环境已开放 3.0
+]
+LLM_IN_FLIGHT = 3  # 同时在途的 Gemini 请求数
+# 改了提示词想让旧结果作废时升这个版本号；重跑「失败」行时相同转录直接用缓存 (LLM_CACHE_BYPASS=1 强制重新请求)
+PROMPT_VERSION = "copywriting-v1"
+# 每次交给转录服务的文件数：短视频叠成 30 秒窗口批量推理，比一个个转录快；
+# 长视频 (超过 transcribe_engine.BATCH_MAX_SEC) 服务端会自动逐个转录，不损失转录质量
+TRANSCRIBE_BATCH = 8
+
+# 使用最新的 Google GenAI SDK (异步接口)，限速 / 重试 / 换模型统一交给 LLMClient
+client = LLMClient('gemini', api_key=os.getenv("GEMINI_API_KEY"), max_in_flight=LLM_IN_FLIGHT)
+
+# --- 2. Gemini 3 Flash 调用函数 ---
+
+async def get_gemini_3_flash_copywriting(transcript):
     """
-    使用官方 SDK 的自适应模型调用
+    使用官方 SDK 的自适应模型调用 (异步，多个视频的请求可同时在途)
     """
-    # 定义模型尝试优先级 (带 models/ 前缀最稳)
-    model_pool = [
-        "models/gemini-2.0-flash-exp",  # 目前最强的 Flash 预览版
-        "models/gemini-1.5-flash",  # 标准 Flash 版
-        "models/gemini-1.5-flash-latest",  # 始终指向最新的 1.5 Flash
-        "models/gemini-3-flash-preview"  # 如果你的环境已开放 3.0
-    ]
-
-    # 根据重试次数选择模型，如果第一个不行，第二次换一个试
-    current_model = model_pool[retry_count % len(model_pool)]
-
-    try:
-        print(f"📡 正在尝试模型: {current_model} ...")
-
-        response = client.models.generate_content(
-            model=current_model,
-            contents=f"角色：資深香港娛樂主編。內容：{transcript}\n要求：以毒舌港式口語創作標題黨標題、描述和標籤。格式：TITLE:, DESC:, TAGS:"
-        )
-
-        if response and response.text:
-            return response.text
-        return None
-
-    except Exception as e:
-        err_msg = str(e)
-
-        # 如果是 404，说明模型名不对，立刻换下一个模型重试
-        if "404" in err_msg or "NOT_FOUND" in err_msg:
-            if retry_count < len(model_pool) - 1:
-                print(f"⚠️ 模型 {current_model} 未找到，切换下一个...")
-                return get_gemini_3_flash_copywriting(transcript, retry_count + 1)
-
-        # 如果是 503 或 429，等一会儿再试同一个或下一个
-        if "503" in err_msg or "429" in err_msg:
-            if retry_count < 5:
-                wait_time = 15
-                print(f"⏳ 服务器忙或限流，静默 {wait_time}s 后重试...")
-                time.sleep(wait_time)
-                return get_gemini_3_flash_copywriting(transcript, retry_count + 1)
-
-        print(f"❌ SDK 最终报错: {err_msg}")
-        return None
+    return await client.complete(
+        f"角色：資深香港娛樂主編。內容：{transcript}\n要求：以毒舌港式口語創作標題黨標題、描述和標籤。格式：TITLE:, DESC:, TAGS:",
+        MODEL_POOL, template_version=PROMPT_VERSION,
+        # 解析不出 TITLE 的回复不缓存，重跑时重新请求
+        validate=lambda text: re.search(r"TITLE:", text, re.IGNORECASE))
 
 
 def parse_output(text):
@@ -81,72 +53,99 @@ def parse_output(text):
             ts.group(1).strip() if ts else "")
 
 
-# --- 4. 自动化主流程 ---
+# --- 3. 自动化主流程 ---
+
+async def _process_video(filename, content):
+    try:
+        # 3. SDK 调用 Gemini 3 Flash (此时下一批视频已经开始转录)
+        print(f"[3/3] 正在向 Gemini 3 Flash 请求营销文案: {filename}")
+        ai_text = await get_gemini_3_flash_copywriting(content)
+
+        title, desc, tags = ("请求失败", "请求失败", "")
+        if ai_text:
+            title, desc, tags = parse_output(ai_text)
+
+        return {
+            "原文件名": filename,
+            "旁白内容": content,
+            "youtube标题": title,
+            "youtube描述": desc,
+            "youtube hashtag": tags
+        }
+    except Exception as e:
+        print(f"❌ 处理 {filename} 时发生错误: {e}")
+        return None
+
+
+DATASET = "youtube_marketing_data"
+CSV_COLUMNS = ["原文件名", "旁白内容", "youtube标题", "youtube描述", "youtube hashtag"]
+
+
+def is_valid(record):
+    # 如果标题包含失败字样，则视为未完成，允许重跑
+    return not re.search("失败|错误|请求", str(record.get('youtube标题', '')))
+
+
+async def _run_todo(video_dir, todo_list, store):
+    bar = tqdm(total=len(todo_list), desc="任务总进度")
+
+    async def finish(filename, content):
+        record = await _process_video(filename, content)
+        if record:
+            # 追加一行即提交，防止中途奔溃；不再每条都重写整个 CSV
+            store.append(DATASET, record['原文件名'], record, ok=is_valid(record))
+            print(f"✨ {record['原文件名']} 文案已生成并存盘。")
+        bar.update(1)
+
+    # 转录按批交给常驻服务 (同一时间只有一批在转录)，每批转完其 LLM 请求立刻发出、与下一批转录并行
+    llm_tasks = []
+    for i in range(0, len(todo_list), TRANSCRIBE_BATCH):
+        chunk = todo_list[i:i + TRANSCRIBE_BATCH]
+        # 1+2. 视频音轨直接解码到内存交给 Whisper，不再落临时 mp3
+        print(f"\n[2/3] 正在批量转录 {len(chunk)} 个视频: {', '.join(chunk)}")
+        try:
+            results = await asyncio.to_thread(transcribe_batch, [os.path.join(video_dir, f) for f in chunk],
+                                              model="small", language='zh')
+        except Exception as e:
+            print(f"❌ 批量转录失败: {e}")
+            bar.update(len(chunk))
+            continue
+        for f, r in zip(chunk, results):
+            if r.get('error'):
+                # 坏文件 / 没音轨只跳过它自己，同批的其它视频照常继续
+                print(f"❌ 处理 {f} 时发生错误: {r['error']}")
+                bar.update(1)
+                continue
+            llm_tasks.append(asyncio.create_task(finish(f, r['text'])))
+
+    await asyncio.gather(*llm_tasks)
+    bar.close()
+    print(f"📊 Gemini 请求统计: {client.stats}")
+
 
 def start_automation(video_dir, output_dir):
     if not os.path.exists(output_dir): os.makedirs(output_dir)
     csv_path = os.path.join(output_dir, 'youtube_marketing_data.csv')
 
-    # 读取旧数据，支持断点续传
-    results = []
-    if os.path.exists(csv_path):
-        try:
-            df_old = pd.read_csv(csv_path)
-            # 如果标题包含失败字样，则视为未完成，允许重跑
-            df_valid = df_old[~df_old['youtube标题'].str.contains("失败|错误|请求", na=False)]
-            results = df_valid.to_dict('records')
-            print(f"📊 已有有效记录：{len(results)} 条")
-        except:
-            pass
-
-    processed_names = {str(r['原文件名']) for r in results}
+    # 结果库支持断点续传，「是否已处理」直接查索引；老版本留下的 CSV 第一次运行时导入
+    store = ResultStore(os.path.join(output_dir, RESULT_DB_NAME))
+    store.import_csv(DATASET, csv_path, '原文件名', is_ok=is_valid)
+    print(f"📊 已有有效记录：{store.count(DATASET)} 条")
+
     all_videos = [f for f in os.listdir(video_dir) if f.lower().endswith(('.mp4', '.mov'))]
-    todo_list = [f for f in all_videos if f not in processed_names]
+    todo_list = [f for f in all_videos if not store.is_done(DATASET, f)]
 
     if not todo_list:
         print("✅ 任务已全部完成！")
+        store.close()
         return
 
-    for filename in tqdm(todo_list, desc="任务总进度"):
-        v_path = os.path.join(video_dir, filename)
-        # 根据你的习惯，避开 cleansed_P 前缀，使用时间戳
-        tmp_audio = os.path.join(output_dir, f"audio_cache_{int(time.time())}.mp3")
-
-        try:
-            # 1. 视频转音频
-            with VideoFileClip(v_path) as video:
-                video.audio.write_audiofile(tmp_audio, logger=None)
-
-            # 2. Whisper 转录文字
-            print(f"\n[2/3] 正在转录文字: {filename}")
-            result = whisper_model.transcribe(tmp_audio, language='zh', fp16=False)
-            content = result['text']
-
-            # 3. SDK 调用 Gemini 3 Flash
-            print(f"[3/3] 正在向 Gemini 3 Flash 请求营销文案...")
-            ai_text = get_gemini_3_flash_copywriting(content)
-
-            title, desc, tags = ("请求失败", "请求失败", "")
-            if ai_text:
-                title, desc, tags = parse_output(ai_text)
-
-            results.append({
-                "原文件名": filename,
-                "旁白内容": content,
-                "youtube标题": title,
-                "youtube描述": desc,
-                "youtube hashtag": tags
-            })
-
-            # 实时存盘，防止中途奔溃
-            pd.DataFrame(results).to_csv(csv_path, index=False, encoding='utf-8-sig')
-            print(f"✨ {filename} 文案已生成并存盘。")
-
-        except Exception as e:
-            print(f"❌ 处理 {filename} 时发生错误: {e}")
-        finally:
-            if os.path.exists(tmp_audio):
-                os.remove(tmp_audio)
+    try:
+        asyncio.run(_run_todo(video_dir, todo_list, store))
+    finally:
+        # 结束 (或中断) 时导出一次 CSV；运营也可以随时 python -m util.result_store export 导出 Excel
+        store.export(DATASET, csv_path, CSV_COLUMNS)
+        store.close()
 
     print(f"\n🎉 运行结束！结果保存在: {csv_path}")
 
@@ -157,4 +156,4 @@ if __name__ == "__main__":
     output_v = '/Users/huangyun/Desktop/搬运/ENT/output'
     # start_automation(input_v, output_v)
 
-    get_gemini_3_flash_copywriting('郭碧婷')
\ No newline at end of file
+    print(asyncio.run(get_gemini_3_flash_copywriting('郭碧婷')))
\ No newline at end of file
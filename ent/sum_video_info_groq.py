@@ -2,14 +2,14 @@ import os
 import time
 import re
 import json
-import gc
-import pandas as pd
-import whisper
-import threading
-from groq import Groq
-from moviepy import VideoFileClip
-from concurrent.futures import ThreadPoolExecutor, as_completed
+import asyncio
 from dotenv import load_dotenv
+
+from util.transcribe import transcribe
+from util.audio_ingest import decode_audio
+from util.pipeline import Stage, Pipeline
+from util.llm_client import LLMClient
+from util.result_store import ResultStore, RESULT_DB_NAME
 import warnings
 import logging
 
@@ -50,23 +50,35 @@ def get_csv_filename_from_path(path):
 
 CSV_NAME_BASE = get_csv_filename_from_path(VIDEO_ROOT_DIR)
 
-# 并发建议：i5 建议 2
-MAX_WORKERS = 2
-
-# --- 2. 初始化引擎与锁 ---
-logger.info("正在加載 Whisper 引擎 (small)...")
-whisper_model = whisper.load_model("small")
-client = Groq(api_key=GROQ_API_KEY)
-
-whisper_lock = threading.Lock()
-csv_lock = threading.Lock()
+# 三级流水线：音频解码 (多个 ffmpeg 并行) -> 转录 (单个消费者，服务端本来就串行) -> LLM 总结 (异步)
+EXTRACT_WORKERS = 2  # 并发建议：i5 建议 2
+TRANSCRIBE_SEC = 120  # 只取前 120 秒
+# 同时等待总结结果的视频数；要不小于一批能装下的条数，否则批量凑不满
+SUMMARY_WORKERS = 16
+# 同时在途的 Groq 请求数；限速 / 退避 / 备用模型由 LLMClient 统一处理
+LLM_IN_FLIGHT = 4
+GROQ_MODELS = ["openai/gpt-oss-safeguard-20b", "llama-3.1-8b-instant"]
+# 改了提示词想让旧结果作废时升这个版本号；相同转录 + 相同版本直接用缓存 (LLM_CACHE_BYPASS=1 强制重新请求)
+PROMPT_VERSION = "summary-v1"
+
+# 批量模式：多条转录拼进一个请求，固定提示词只发一次，按请求数计的限额也省下来
+BATCH_MODE = True
+BATCH_TOKEN_BUDGET = 4000  # 每批转录的估算 token 上限
+BATCH_MAX_ITEMS = 8  # 每批最多几条，要小于 SUMMARY_WORKERS
+# 转录一条一条往下送，上游还有活时批次一直开着；上游空了 (或全部转完) 才提前发出
+BATCH_POLL_SEC = 0.5  # 检查上游是否空闲的间隔
+BATCH_MAX_WAIT_SEC = 120.0  # 兜底：第一条进批后最多等这么久，上游一直忙也要发
+BATCH_RETRIES = 1  # 批量结果里缺失 / 解析失败的条目重新排队的次数，用完改为单条请求
+
+# --- 2. 初始化客户端 ---
+# 转录交给常驻转录服务 (python -m util.transcribe_server)，服务端自己排队串行推理
+client = LLMClient('groq', api_key=GROQ_API_KEY, max_in_flight=LLM_IN_FLIGHT)
 
 
 # --- 3. 核心功能函数 ---
 
-def get_groq_json_summary(transcript):
+async def get_groq_json_summary(transcript):
     """请求 Groq 并强制返回 JSON"""
-    model_name = "openai/gpt-oss-safeguard-20b"
     prompt = f"""
     你是香港資深娛樂記者。請對以下內容進行幽默抽水。
     要求：港式口語，標題黨風格。總結嚴格控制在 70 字以內。
@@ -77,17 +89,22 @@ def get_groq_json_summary(transcript):
         "characters": ["人物A", "人物B"]
     }}
     """
-    try:
-        completion = client.chat.completions.create(
-            model=model_name,
-            messages=[{"role": "user", "content": prompt}],
-            temperature=0.7,
-            response_format={"type": "json_object"}
-        )
-        return completion.choices[0].message.content
-    except Exception as e:
-        logger.error(f"Groq API 異常: {e}")
-        return None
+    raw = await client.complete(prompt, GROQ_MODELS, json_mode=True, temperature=0.7, template_version=PROMPT_VERSION,
+                                validate=lambda r: parse_json_output(r)[0] != "解析失敗")
+    if raw is None:
+        logger.error("Groq API 異常: 所有模型均請求失敗")
+    return raw
+
+
+def _parse_item(data):
+    summary = str(data.get("summary") or "解析失敗").replace('\n', ' ').strip()[:70]
+    characters = "无"
+    char_list = data.get("characters", [])
+    if isinstance(char_list, list):
+        characters = "，".join([str(c) for c in char_list]) if char_list else "无"
+    elif isinstance(char_list, str):
+        characters = char_list
+    return summary, characters
 
 
 def parse_json_output(raw_json):
@@ -95,66 +112,199 @@ def parse_json_output(raw_json):
     if not raw_json: return summary, characters
     try:
         clean_json = raw_json.replace('```json', '').replace('```', '').strip()
-        data = json.loads(clean_json)
-        summary = data.get("summary", "解析失敗").replace('\n', ' ').strip()[:70]
-        char_list = data.get("characters", [])
-        if isinstance(char_list, list):
-            characters = "，".join([str(c) for c in char_list]) if char_list else "无"
-        elif isinstance(char_list, str):
-            characters = char_list
+        summary, characters = _parse_item(json.loads(clean_json))
     except:
         s_match = re.search(r'"summary":\s*"(.*?)"', raw_json)
         if s_match: summary = s_match.group(1)[:70]
     return summary, characters
 
 
+# --- 3.1 批量请求 ---
+
+def estimate_tokens(text):
+    """粗估 token 数：中日韩字符约 1 字 1 token，其余约 4 字符 1 token"""
+    cjk = len(re.findall(r'[\u3000-\u9fff\uff00-\uffef]', text))
+    return cjk + (len(text) - cjk) // 4 + 20  # +20 为每条的文件名 / 分隔符开销
+
+
+def build_batch_prompt(items):
+    blocks = "\n".join(f"【文件：{key}】\n內容：{transcript}" for key, transcript in items)
+    return f"""
+    你是香港資深娛樂記者。請對以下每個文件的內容分別進行幽默抽水。
+    要求：港式口語，標題黨風格。每條總結嚴格控制在 70 字以內。
+    {blocks}
+    【指令】：你必須只輸出一個合法的 JSON 對象，每個文件對應 results 裡的一項，file 原樣照抄文件名，格式：
+    {{
+        "results": [
+            {{"file": "文件名", "summary": "這裡寫70字內的毒舌總結", "characters": ["人物A", "人物B"]}}
+        ]
+    }}
+    """
+
+
+def parse_batch_output(raw_json):
+    """批量回复 -> {文件名: (summary, characters)}，单条不合法的直接略过 (由调用方重新排队)"""
+    try:
+        data = json.loads(raw_json.replace('```json', '').replace('```', '').strip())
+    except (AttributeError, ValueError):
+        return {}
+    entries = data.get("results") if isinstance(data, dict) else data
+    parsed = {}
+    for entry in entries if isinstance(entries, list) else []:
+        if isinstance(entry, dict) and entry.get("file") and entry.get("summary"):
+            parsed[str(entry["file"])] = _parse_item(entry)
+    return parsed
+
+
+class SummaryBatcher:
+    """
+    把各个视频的总结请求攒成批：估算 token 到预算或条数到 BATCH_MAX_ITEMS 就发出一批；
+    upstream() 返回上游还没处理完的条数，为 0 (或没设置) 时不再等，手里有几条发几条。
+    批量回复逐条校验，缺失 / 不合法的条目重新排进下一批，重试用完后退回单条请求。
+    """
+
+    def __init__(self, token_budget=BATCH_TOKEN_BUDGET, max_items=BATCH_MAX_ITEMS, max_wait=BATCH_MAX_WAIT_SEC,
+                 upstream=None):
+        self.token_budget = token_budget
+        self.max_items = max_items
+        self.max_wait = max_wait
+        self.upstream = upstream
+        self.items = []  # [(key, transcript, future, attempts)]
+        self.tokens = 0
+        self.opened = 0.0  # 第一条进批的时间
+        self.timer = None
+        self.sending = set()  # 持有在途任务的引用，防止被回收
+        self.stats = {'batches': 0, 'requeued': 0, 'single': 0}
+
+    async def summarize(self, key, transcript):
+        fut = asyncio.get_running_loop().create_future()
+        self._add((key, transcript, fut, 0))
+        return await fut
+
+    def _add(self, item):
+        cost = estimate_tokens(item[1])
+        if self.items and self.tokens + cost > self.token_budget:
+            self._flush()
+        loop = asyncio.get_running_loop()
+        if not self.items:
+            self.opened = loop.time()
+        self.items.append(item)
+        self.tokens += cost
+        if self.tokens >= self.token_budget or len(self.items) >= self.max_items:
+            self._flush()
+        elif self.timer is None:
+            self.timer = loop.call_later(BATCH_POLL_SEC, self._poll)
+
+    def _poll(self):
+        self.timer = None
+        loop = asyncio.get_running_loop()
+        if self.upstream is None or self.upstream() == 0 or loop.time() - self.opened >= self.max_wait:
+            self._flush()
+        elif self.items:
+            self.timer = loop.call_later(BATCH_POLL_SEC, self._poll)
+
+    def _flush(self):
+        if self.timer:
+            self.timer.cancel()
+            self.timer = None
+        batch, self.items, self.tokens = self.items, [], 0
+        if batch:
+            task = asyncio.create_task(self._send(batch))
+            self.sending.add(task)
+            task.add_done_callback(self.sending.discard)
+
+    async def _send(self, batch):
+        try:
+            await self._request(batch)
+        except Exception as e:
+            # 不能让等待结果的视频永远挂着
+            for _, _, fut, _ in batch:
+                if not fut.done():
+                    fut.set_exception(e)
+
+    async def _request(self, batch):
+        if len(batch) == 1:
+            # 只有一条时用原来的单条提示词 (也能命中单条请求的缓存)
+            key, transcript, fut, _ = batch[0]
+            self.stats['single'] += 1
+            fut.set_result(parse_json_output(await get_groq_json_summary(transcript)))
+            return
+
+        keys = {item[0] for item in batch}
+        self.stats['batches'] += 1
+        raw = await client.complete(build_batch_prompt([(key, transcript) for key, transcript, _, _ in batch]),
+                                    GROQ_MODELS, json_mode=True, temperature=0.7,
+                                    template_version=PROMPT_VERSION + "-batch",
+                                    validate=lambda r: keys <= parse_batch_output(r).keys())
+        parsed = parse_batch_output(raw)
+        logger.info(f"📦 批量总结 {len(batch)} 条，成功解析 {sum(k in parsed for k in keys)} 条")
+        for key, transcript, fut, attempts in batch:
+            if key in parsed:
+                fut.set_result(parsed[key])
+            elif attempts < BATCH_RETRIES:
+                self.stats['requeued'] += 1
+                self._add((key, transcript, fut, attempts + 1))
+            else:
+                # 单独发出去，不和下一批的重试绑在一起
+                task = asyncio.create_task(self._send([(key, transcript, fut, attempts)]))
+                self.sending.add(task)
+                task.add_done_callback(self.sending.discard)
+
+
+batcher = SummaryBatcher()
+
+
+async def summarize(key, transcript):
+    if BATCH_MODE:
+        return await batcher.summarize(key, transcript)
+    return parse_json_output(await get_groq_json_summary(transcript))
+
+
 # --- 4. 处理单元 ---
 
-def process_single_video(task_info):
+def extract_stage(task_info):
     root, filename, folder_name = task_info
-    v_path = os.path.join(root, filename)
-    t_audio = os.path.join(OUTPUT_BASE_DIR, f"temp_{os.getpid()}_{time.time_ns()}.mp3")
-    try:
-        with VideoFileClip(v_path) as video:
-            duration = min(video.duration, 120)
-            clip = video.subclipped(0, duration) if hasattr(video, 'subclipped') else video.subclip(0, duration)
-            clip.audio.write_audiofile(t_audio, fps=16000, logger=None)
-
-        with whisper_lock:
-            logger.info(f"正在转录: {filename}")
-            trans_res = whisper_model.transcribe(t_audio, language='zh', fp16=False, condition_on_previous_text=False)
-            content = trans_res['text']
-            del trans_res
-            gc.collect()
-
-        raw_json = get_groq_json_summary(content)
-        summary, characters = parse_json_output(raw_json)
-
-        return {
-            "folder": folder_name,
-            "record": {
-                "视频文件名": filename,
-                "主人翁": characters,
-                "总结": summary,
-                "语音文字": content.replace('\n', ' ').replace('\r', ' '),
-                "处理时间": time.strftime("%Y-%m-%d %H:%M:%S")
-            }
+    # 直接从视频解码到内存，不再写临时 mp3
+    return task_info, decode_audio(os.path.join(root, filename), duration=TRANSCRIBE_SEC)
+
+
+def transcribe_stage(item):
+    task_info, samples = item
+    logger.info(f"正在转录: {task_info[1]}")
+    content = transcribe(samples, model="small", language='zh', condition_on_previous_text=False)['text']
+    return task_info, content
+
+
+async def summarize_stage(item):
+    (root, filename, folder_name), content = item
+    # 批量模式下按「子文件夹/文件名」区分，不同文件夹里的同名视频不会串
+    summary, characters = await summarize(f"{folder_name}/{filename}", content)
+    return {
+        "folder": folder_name,
+        "record": {
+            "视频文件名": filename,
+            "主人翁": characters,
+            "总结": summary,
+            "语音文字": content.replace('\n', ' ').replace('\r', ' '),
+            "处理时间": time.strftime("%Y-%m-%d %H:%M:%S")
         }
-    except Exception as e:
-        logger.error(f"处理失败 {filename}: {e}")
-        return None
-    finally:
-        if os.path.exists(t_audio):
-            try:
-                os.remove(t_audio)
-            except:
-                pass
+    }
 
 
 # --- 5. 主逻辑 ---
 
-def run_all():
+CSV_COLUMNS = ["视频文件名", "主人翁", "总结", "语音文字", "处理时间"]
+
+
+def get_csv_name(folder):
+    # 根据三级路径逻辑生成文件名
+    return f"{CSV_NAME_BASE}.csv" if folder == "." else f"{CSV_NAME_BASE}-{folder}.csv"
+
+
+async def run_all():
     if not os.path.exists(OUTPUT_BASE_DIR): os.makedirs(OUTPUT_BASE_DIR)
+    # 每条结果先追加进结果库 (崩溃不丢)，CSV 在结束时按文件夹统一导出
+    store = ResultStore(os.path.join(OUTPUT_BASE_DIR, RESULT_DB_NAME))
 
     all_tasks = []
     # 如果路径下还有子文件夹，则扫描子文件夹；否则扫描根目录
@@ -164,16 +314,10 @@ def run_all():
     targets = subfolders if subfolders else ["."]
     for folder in targets:
         folder_path = os.path.join(VIDEO_ROOT_DIR, folder)
-        # 根据三级路径逻辑生成文件名
-        final_csv_name = f"{CSV_NAME_BASE}.csv" if folder == "." else f"{CSV_NAME_BASE}-{folder}.csv"
-        csv_path = os.path.join(OUTPUT_BASE_DIR, final_csv_name)
-
-        processed = set()
-        if os.path.exists(csv_path):
-            try:
-                processed = set(pd.read_csv(csv_path)['视频文件名'].astype(str).tolist())
-            except:
-                pass
+        final_csv_name = get_csv_name(folder)
+        # 老版本只写了 CSV 的，第一次运行时导入结果库；和以前一样，CSV 里有的 (包括「解析失敗」) 都算处理过
+        store.import_csv(final_csv_name, os.path.join(OUTPUT_BASE_DIR, final_csv_name), "视频文件名")
+        processed = store.done_keys(final_csv_name)
 
         if os.path.exists(folder_path):
             for f in os.listdir(folder_path):
@@ -183,26 +327,32 @@ def run_all():
     logger.info(f"🚀 CSV命名规则: {CSV_NAME_BASE}.csv")
     logger.info(f"🚀 待处理视频: {len(all_tasks)}")
 
-    with ThreadPoolExecutor(max_workers=MAX_WORKERS) as executor:
-        future_to_video = {executor.submit(process_single_video, task): task for task in all_tasks}
-        for future in as_completed(future_to_video):
-            res = future.result()
-            if res:
-                f_name = res['folder']
-                record = res['record']
-                final_csv_name = f"{CSV_NAME_BASE}.csv" if f_name == "." else f"{CSV_NAME_BASE}-{f_name}.csv"
-                out_path = os.path.join(OUTPUT_BASE_DIR, final_csv_name)
-
-                with csv_lock:
-                    df = pd.DataFrame([record])
-                    cols = ["视频文件名", "主人翁", "总结", "语音文字", "处理时间"]
-                    df = df[cols]
-                    if not os.path.exists(out_path):
-                        df.to_csv(out_path, index=False, encoding='utf-8-sig')
-                    else:
-                        df.to_csv(out_path, mode='a', header=False, index=False, encoding='utf-8-sig')
-                logger.info(f"✓ 已完成并存入: {final_csv_name}")
+    touched = set()
+
+    def save(res):
+        final_csv_name = get_csv_name(res['folder'])
+        record = res['record']
+        store.append(final_csv_name, record["视频文件名"], record)
+        touched.add(final_csv_name)
+        logger.info(f"✓ 已完成并存入: {final_csv_name}")
+
+    transcribe = Stage("转录", transcribe_stage, workers=1)
+    # 转录还有排队 / 在转的视频时批次先不发，等它们进来一起总结
+    batcher.upstream = transcribe.pending
+    pipeline = Pipeline([
+        Stage("解码", extract_stage, workers=EXTRACT_WORKERS),
+        transcribe,
+        Stage("总结", summarize_stage, workers=SUMMARY_WORKERS, threaded=False),
+    ])
+    try:
+        await pipeline.run(all_tasks, on_result=save)
+    finally:
+        # 中途中断也把已完成的部分导出来
+        for final_csv_name in sorted(touched):
+            store.export(final_csv_name, os.path.join(OUTPUT_BASE_DIR, final_csv_name), CSV_COLUMNS)
+        store.close()
+    logger.info(f"📊 Groq 请求统计: {client.stats} | 批量: {batcher.stats}")
 
 
 if __name__ == "__main__":
-    run_all()
\ No newline at end of file
+    asyncio.run(run_all())
\ No newline at end of file
@@ -12,12 +12,19 @@ from moviepy.editor import VideoFileClip, AudioFileClip, concatenate_videoclips,
 import moviepy.video.fx.all as vfx
 
 from ent_v2.config import TaskType
+from util.encoder import encoder_profile, with_upload, moviepy_codec
+from util.browser_pool import close_pool
+from util.search_cache import cached_search
+from util.download_opts import range_opts, format_opts
 
 # ================= 配置区 =================
 TTS_VOICE = "zh-CN-XiaoxiaoNeural"
-SEARCH_SEMAPHORE = asyncio.Semaphore(2)
 TARGET_W = 854
 TARGET_H = 480
+RENDER_FPS = 24
+# 每个素材只用开头一小段：跳过前 CLIP_SKIP 秒，最多取 CLIP_MAX 秒，下载时只拉这一段
+CLIP_SKIP = 0.5
+CLIP_MAX = 8
 
 
 class VideoAutomation:
@@ -72,13 +79,18 @@ class VideoAutomation:
         # 核心转义：针对 Mac 绝对路径中的冒号进行特殊处理，确保滤镜能找到 srt
         safe_srt = abs_s.replace('\\', '/').replace(':', '\\:').replace("'", "'\\\\''")
 
+        # 按本机能力选最快的编码后端 (Mac 上为 VideoToolbox)，拉高码率确保画质
+        profile = encoder_profile('master', '4500k')
         cmd = [
             'ffmpeg', '-y',
+            *profile['input_args'],
             '-i', abs_v,
             # 使用 subtitles 滤镜，force_style 确保字幕不会因为默认颜色太淡看不见
             '-vf',
-            f"subtitles=filename='{safe_srt}':force_style='FontSize=12,MarginV=20,PrimaryColour=&H00FFFFFF,OutlineColour=&H00000000,BorderStyle=1,Outline=1'",
-            '-c:v', 'h264_videotoolbox', '-b:v', '4500k',  # 既然是 M1/M2，拉高码率确保画质
+            with_upload(
+                f"subtitles=filename='{safe_srt}':force_style='FontSize=12,MarginV=20,PrimaryColour=&H00FFFFFF,OutlineColour=&H00000000,BorderStyle=1,Outline=1'",
+                profile),
+            *profile['video_args'],
             '-c:a', 'copy',  # 直接流拷贝，确保声音 100% 还原
             '-map', '0:v:0',
             '-map', '0:a?',  # 自动抓取 tmp.mp4 里的所有音轨
@@ -101,37 +113,27 @@ class VideoAutomation:
             print(f"❌ 运行崩溃: {e}")
             return False
 
-    async def _single_search(self, context, keyword, limit):
-        async with SEARCH_SEMAPHORE:
-            page = await context.new_page()
-            try:
-                await page.goto(f"https://search.bilibili.com/all?keyword={keyword}", wait_until="load", timeout=30000)
-                cards = await page.query_selector_all(".bili-video-card, .video-list-item")
-                urls = []
-                for card in cards:
-                    link_el = await card.query_selector("a[href*='/video/BV']")
-                    if link_el:
-                        href = await link_el.get_attribute("href")
-                        urls.append(f"https:{href}" if href.startswith("//") else href)
-                    if len(urls) >= limit: break
-                return urls
-            except:
-                return []
-            finally:
-                await page.close()
+    async def _single_search(self, keyword, limit):
+        # 同一关键词跨幕、跨次运行复用搜索缓存；并发数由浏览器池的页面数控制
+        try:
+            cards = await cached_search(keyword, order=None)
+            return [c['url'] for c in cards[:limit]]
+        except:
+            return []
 
     async def batch_search_bili(self, keywords, limit=2):
-        from playwright.async_api import async_playwright
-        async with async_playwright() as p:
-            browser = await p.chromium.launch(headless=True)
-            context = await browser.new_context()
-            results = await asyncio.gather(*[self._single_search(context, kw, limit) for kw in keywords])
-            await browser.close()
-            return list(set([item for sublist in results for item in sublist]))
-
-    def download_with_ytdlp(self, url, save_path):
-        ydl_opts = {'format': 'bestvideo[ext=mp4]+bestaudio[ext=m4a]/best[ext=mp4]', 'outtmpl': save_path,
-                    'quiet': True}
+        # 所有幕共用进程内常驻的浏览器池，只启动一次 Chromium
+        results = await asyncio.gather(*[self._single_search(kw, limit) for kw in keywords])
+        return list(set([item for sublist in results for item in sublist]))
+
+    def download_with_ytdlp(self, url, save_path, time_range=None):
+        """time_range=(start, end) 时只下载这一段 (带关键帧余量)，不拉整部视频"""
+        # 成片只有 854x480@24，下 480P 就够了
+        ydl_opts = {**format_opts(TARGET_W, TARGET_H, RENDER_FPS), 'outtmpl': save_path, 'quiet': True}
+        if time_range:
+            # 计划区间都从 0 秒开始，offset 恒为 0，剪辑时间点不用平移
+            opts, _ = range_opts(*time_range)
+            ydl_opts.update(opts)
         with yt_dlp.YoutubeDL(ydl_opts) as ydl:
             try:
                 ydl.extract_info(url, download=True); return True
@@ -152,8 +154,8 @@ class VideoAutomation:
             try:
                 v = VideoFileClip(f, audio=False)
                 opened.append(v)
-                d = min(v.duration - 0.5, random.uniform(5, 8))
-                clips.append(self.process_clip(v.subclip(0.5, 0.5 + d)));
+                d = min(v.duration - CLIP_SKIP, random.uniform(5, CLIP_MAX))
+                clips.append(self.process_clip(v.subclip(CLIP_SKIP, CLIP_SKIP + d)));
                 curr += d
             except:
                 continue
@@ -189,8 +191,8 @@ async def main(json_path, output_root, target_total_duration=1800):
         os.makedirs(act_path, exist_ok=True)
         urls = await auto.batch_search_bili(info['search_queries'], limit=2)
         await asyncio.gather(
-            *[asyncio.to_thread(auto.download_with_ytdlp, u, os.path.join(act_path, f"{i}.mp4")) for i, u in
-              enumerate(urls)])
+            *[asyncio.to_thread(auto.download_with_ytdlp, u, os.path.join(act_path, f"{i}.mp4"),
+                                (0, CLIP_SKIP + CLIP_MAX)) for i, u in enumerate(urls)])
         a_clip = await auto.make_audio(info['content'], os.path.join(act_path, "v.mp3"))
         v_clips, vids = auto.get_clips(act_path, a_clip.duration)
         resources.extend(vids);
@@ -209,12 +211,15 @@ async def main(json_path, output_root, target_total_duration=1800):
         if queries:
             i_urls = await auto.batch_search_bili(queries, limit=3)
             await asyncio.gather(
-                *[asyncio.to_thread(auto.download_with_ytdlp, u, os.path.join(i_path, f"{i}.mp4")) for i, u in
-                  enumerate(i_urls)])
+                *[asyncio.to_thread(auto.download_with_ytdlp, u, os.path.join(i_path, f"{i}.mp4"), (0, needed))
+                  for i, u in enumerate(i_urls)])
             i_clips, i_vids = auto.get_interview_clips_fast(i_path, needed)
             resources.extend(i_vids)
             if i_clips: all_parts.append(concatenate_videoclips(i_clips, method="compose"))
 
+    # 搜索阶段结束，关掉常驻浏览器再进入渲染
+    await close_pool()
+
     if all_parts:
         final_video = concatenate_videoclips(all_parts, method="compose")
         tmp, srt, out = os.path.join(auto.project_dir, "tmp.mp4"), os.path.join(auto.project_dir,
@@ -225,10 +230,13 @@ async def main(json_path, output_root, target_total_duration=1800):
 
         # 强制显式包含音频流
         print(f"🚀 渲染临时视频 (时长: {final_video.duration / 60:.1f}min)...")
+        # 临时视频还要再烧一次字幕，属于中间产物
+        tmp_codec, tmp_params = moviepy_codec('intermediate')
         final_video.write_videofile(
             tmp,
-            fps=24,
-            codec="h264_videotoolbox",
+            fps=RENDER_FPS,
+            codec=tmp_codec,
+            ffmpeg_params=tmp_params,
             bitrate="3500k",
             audio=True,
             audio_codec="aac",
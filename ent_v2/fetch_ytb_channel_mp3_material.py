@@ -1,11 +1,11 @@
 import os
 import json
-import whisper
 import yt_dlp
 import threading
 from concurrent.futures import ThreadPoolExecutor
 
 from ent_v2.config import TaskType
+from util.transcribe import transcribe
 
 # ================= 配置区 =================
 PROXY = "http://127.0.0.1:7897"
@@ -34,9 +34,6 @@ class ConcurrentYTProcessor:
         self.processed_ids = self._load_history()
         self.file_lock = threading.Lock()
 
-        print(f"正在初始化 Whisper {WHISPER_MODEL} 模型... 🚀")
-        self.model = whisper.load_model(WHISPER_MODEL)
-
         # 转录执行器：单线程，确保 CPU 任务顺序执行
         self.transcribe_executor = ThreadPoolExecutor(max_workers=1)
 
@@ -83,7 +80,7 @@ class ConcurrentYTProcessor:
         """转录并截取前 1000 字"""
         try:
             print(f"\n[转录队列] 正在处理: {v_id} ... ☕")
-            result = self.model.transcribe(audio_path, fp16=False)
+            result = transcribe(audio_path, model=WHISPER_MODEL)
 
             # --- 核心修改：截取前 1000 字 ---
             full_text = result["text"].strip()
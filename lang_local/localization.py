@@ -6,11 +6,12 @@ import math
 import asyncio
 import edge_tts
 from concurrent.futures import ThreadPoolExecutor
-from faster_whisper import WhisperModel
 from moviepy import VideoFileClip, AudioFileClip, CompositeAudioClip, CompositeVideoClip, TextClip
 import moviepy.video.fx as vfx
 from pydub import AudioSegment
 
+from util.transcribe import transcribe
+
 
 # --- 1. 字体路径配置 (针对 Mac) ---
 def get_font():
@@ -73,13 +74,11 @@ async def process_video_pipeline(input_path, target_lang='vi'):
 
     # B. 极速识别
     print("🎙️ [2/5] Faster-Whisper 识别与翻译...")
-    model = WhisperModel("base", device="cpu", compute_type="int8")
-    segments_gen, _ = model.transcribe(vocal_wav, task="translate")
-    segments = list(segments_gen)
+    segments = transcribe(vocal_wav, model="base", backend="faster", task="translate")['segments']
 
     # C. 并行配音
     print(f"⏳ [3/5] 合成配音 ({len(segments)}段)...")
-    tts_tasks = [(s.text, target_lang, f"{temp_dir}/s_{i}.mp3") for i, s in enumerate(segments)]
+    tts_tasks = [(s['text'], target_lang, f"{temp_dir}/s_{i}.mp3") for i, s in enumerate(segments)]
     with ThreadPoolExecutor(max_workers=10) as executor:
         executor.map(run_tts_worker, tts_tasks)
 
@@ -90,7 +89,7 @@ async def process_video_pipeline(input_path, target_lang='vi'):
         p = f"{temp_dir}/s_{i}.mp3"
         if os.path.exists(p):
             seg_audio = AudioSegment.from_file(p)
-            full_vocal = full_vocal.overlay(seg_audio[:int((s.end - s.start) * 1000)], position=int(s.start * 1000))
+            full_vocal = full_vocal.overlay(seg_audio[:int((s['end'] - s['start']) * 1000)], position=int(s['start'] * 1000))
     vocal_final_path = f"{temp_dir}/v_final.wav"
     full_vocal.export(vocal_final_path, format="wav")
 
@@ -102,13 +101,13 @@ async def process_video_pipeline(input_path, target_lang='vi'):
     font_p = get_font()
     subtitle_clips = []
     for s in segments:
-        duration = s.end - s.start
+        duration = s['end'] - s['start']
         if duration <= 0: continue
         txt = TextClip(
-            text=s.text, font=font_p, font_size=55, color='yellow',
+            text=s['text'], font=font_p, font_size=55, color='yellow',
             stroke_color='black', stroke_width=2, method='caption',
             size=(layout_base.w * 0.85, None)
-        ).with_start(s.start).with_duration(duration).with_position(('center', layout_base.h * 0.72))
+        ).with_start(s['start']).with_duration(duration).with_position(('center', layout_base.h * 0.72))
         subtitle_clips.append(txt)
 
     # 合成最终画面 (布局 + 字幕)
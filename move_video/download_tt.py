@@ -3,6 +3,12 @@ import subprocess
 import sys  # 必须导入 sys
 import yt_dlp
 
+from util.download_opts import format_args
+
+# process_merge_video 把主视频缩到 608x1080@30，下载够用的最小流即可
+RENDER_SIZE = (608, 1080)
+RENDER_FPS = 30
+
 
 def download_tiktok_videos(collection_url, save_dir):
     """
@@ -23,8 +29,7 @@ def download_tiktok_videos(collection_url, save_dir):
         '--max-downloads', '3',
         '--match-filter', "duration > 15 & like_count >= 200000",
         '-o', f'{save_dir}/%(title).90s.%(ext)s',
-        '--format', 'bestvideo+bestaudio/best',
-        '--merge-output-format', 'mp4',
+        *format_args(*RENDER_SIZE, RENDER_FPS),
         '--no-check-certificate',
         '--ignore-errors',
 
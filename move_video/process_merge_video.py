@@ -1,15 +1,22 @@
 import os
 import random
-import subprocess
 from concurrent.futures import ThreadPoolExecutor
 import sys
 
+from util.ffmpeg_runner import run_ffmpeg, RunTelemetry
+from util.encoder import pick_encode_settings, encoder_profile, with_upload
+from util.filtergraph import FilterGraph
+
 # 确保 Mac 环境编码
 if sys.platform == "darwin":
     os.environ["PYTHONIOENCODING"] = "utf-8"
 
+MAX_WORKERS = 3  # Mac M1/M2/M3 并发 3 性能最佳
+BITRATE = "4800k"
+SOURCE_SIZE = (1080, 1920)  # 素材多为竖屏 1080P，只用于滤镜成本估算
+
 
-def process_with_ffmpeg(main_path, sub_path, bgm_path, output_path):
+def build_input_args(main_path, sub_path, bgm_path, profile, report=False):
     """
     【矩阵深度去重版】
     - 视频：608x1080 左右分割 + 丝滑羽化
@@ -30,56 +37,71 @@ def process_with_ffmpeg(main_path, sub_path, bgm_path, output_path):
     noise_seed = random.randint(1, 999999)
     bgm_volume = round(random.uniform(0.007, 0.015), 4)
 
-    # 2. 构造滤镜链
-    filter_complex = (
-        # --- 主视频层：变速 + 色彩增强 + 随机噪点注入 ---
-        f"[0:v]fps=30,scale=608:1080,setsar=1,"
-        f"setpts={rand_speed}*PTS,"
-        f"eq=brightness={rand_br}:saturation={rand_sat}:contrast={rand_cont},"
-        f"noise=alls={random.randint(1, 2)}:allf=t+u:all_seed={noise_seed},"  # 极细微随机像素干扰
-        f"pad=1080:1080:0:0[main];"
-
-        # --- 副视频层：保持常规处理 ---
-        f"[1:v]fps=30,scale=608:1080,setsar=1,setpts=PTS-STARTPTS,"
-        f"crop=540:1080:68:0,geq=lum='p(X,Y)':a='if(lt(X,68),X/68*255,255)'[sub];"
-
-        # --- 叠加融合 ---
-        f"[main][sub]overlay=540:0:shortest=1[outv];"
-
-        # --- 音频层：变速同步 + 噪音混合 ---
-        f"[2:a]lowpass=f=800,volume={bgm_volume}[bgm_soft];"
-        f"[0:a]atempo={atempo_val}[main_a];"
-        f"[main_a][bgm_soft]amix=inputs=2:duration=first:dropout_transition=2[outa]"
-    )
-
-    cmd = [
-        'ffmpeg', '-y',
-        '-hwaccel', 'videotoolbox',
+    # 2. 构造滤镜链 (FilterGraph 会自动把副视频的裁切挪到缩放之前)
+    g = FilterGraph("process_merge_video")
+    # --- 主视频层：变速 + 色彩增强 + 随机噪点注入 ---
+    main = g.chain('[0:v]', '[main]', SOURCE_SIZE)
+    main.fps(30).scale(608, 1080).add('setsar', 1).add('setpts', f"{rand_speed}*PTS")
+    main.add('eq', f"brightness={rand_br}:saturation={rand_sat}:contrast={rand_cont}")
+    main.add('noise', f"alls={random.randint(1, 2)}:allf=t+u:all_seed={noise_seed}")  # 极细微随机像素干扰
+    main.add('pad', '1080:1080:0:0')
+
+    # --- 副视频层：保持常规处理 ---
+    sub = g.chain('[1:v]', '[sub]', SOURCE_SIZE)
+    sub.fps(30).scale(608, 1080).add('setsar', 1).add('setpts', 'PTS-STARTPTS')
+    sub.crop(540, 1080, 68, 0).add('geq', "lum='p(X,Y)':a='if(lt(X,68),X/68*255,255)'")
+
+    # --- 叠加融合 ---
+    g.chain('[main][sub]', '[outv]', (1080, 1080)).add('overlay', '540:0:shortest=1')
+
+    # --- 音频层：变速同步 + 噪音混合 ---
+    g.chain('[2:a]', '[bgm_soft]', audio=True).add('lowpass', 'f=800').add('volume', bgm_volume)
+    g.chain('[0:a]', '[main_a]', audio=True).add('atempo', atempo_val)
+    g.chain('[main_a][bgm_soft]', '[outa]', audio=True).add('amix', 'inputs=2:duration=first:dropout_transition=2')
+
+    filter_complex = g.render()
+    if report:
+        g.report()
+
+    return [
+        *profile['input_args'],
         '-t', '59',
         '-i', main_path,
         # 随机从原视频开头切掉 0 到 0.5 秒，进一步改变视频指纹
         '-ss', str(round(random.uniform(0, 0.5), 2)),
         '-stream_loop', '-1', '-i', sub_path,
         '-stream_loop', '-1', '-i', bgm_path,
-        '-filter_complex', filter_complex,
+        '-filter_complex', with_upload(filter_complex, profile, '[outv]'),
         '-map', '[outv]',
         '-map', '[outa]',
         '-map_metadata', '-1',  # 【核心】抹除原始设备、GPS、时间等所有元数据
-        '-c:v', 'h264_videotoolbox',
-        '-b:v', '4800k',
+    ]
+
+
+def process_with_ffmpeg(main_path, sub_path, bgm_path, output_path, telemetry=None, profile=None):
+    # 未指定时按本机能力自动选最快的编码后端
+    profile = profile or encoder_profile('master', BITRATE)
+    cmd = [
+        'ffmpeg', '-y',
+        *build_input_args(main_path, sub_path, bgm_path, profile),
+        *profile['video_args'],
         '-c:a', 'aac', '-b:a', '128k',
-        '-pix_fmt', 'yuv420p',
+        # VAAPI 的输出已经是硬件帧 (hwupload)，不能再转 yuv420p；软件 / VideoToolbox 仍强制 yuv420p 保证兼容
+        *([] if profile['upload'] else ['-pix_fmt', 'yuv420p']),
         output_path
     ]
 
-    try:
-        subprocess.run(cmd, stdout=subprocess.DEVNULL, stderr=subprocess.PIPE, check=True)
+    res = run_ffmpeg(cmd, label=os.path.basename(output_path), duration=59, filter_desc="split_608_feather_overlay")
+    if telemetry:
+        telemetry.add(res.stats)
+    if res.returncode == 0:
         print(f"✅ 处理成功: {os.path.basename(output_path)}")
-    except subprocess.CalledProcessError as e:
-        print(f"❌ 失败: {os.path.basename(main_path)}\n原因: {e.stderr.decode('utf-8', 'ignore')}")
+    else:
+        print(f"❌ 失败: {os.path.basename(main_path)}\n原因: {res.stderr}")
 
 
-def batch_process(main_dir, sub_dir, bgm_dir, output_dir=None):
+def batch_process(main_dir, sub_dir, bgm_dir, output_dir=None, target_rtf=None, deadline_sec=None):
+    """target_rtf / deadline_sec 任一给定时进入吞吐目标模式：试编码后自动选择 x264 预设、线程和并发"""
     # 增加路径存在性检查，防止崩溃
     for d in [main_dir, sub_dir, bgm_dir]:
         if not os.path.exists(d):
@@ -111,10 +133,22 @@ def batch_process(main_dir, sub_dir, bgm_dir, output_dir=None):
         tasks.append((main_path, sub_path, bgm_path, output_path))
 
     print(f"🚀 深度去重生产线启动 | 总任务: {len(tasks)}")
-    # Mac M1/M2/M3 并发 3 性能最佳
-    with ThreadPoolExecutor(max_workers=3) as executor:
+    profile, workers = encoder_profile('master', BITRATE), MAX_WORKERS
+    build_input_args(*tasks[0][:3], profile, report=True)
+    if target_rtf or deadline_sec:
+        m, sub, bgm, _ = tasks[0]
+        software = encoder_profile('master', BITRATE, preset='veryfast')
+        settings = pick_encode_settings(build_input_args(m, sub, bgm, software), BITRATE,
+                                        target_rtf=target_rtf, deadline_sec=deadline_sec,
+                                        total_media_sec=59 * len(tasks))
+        profile = encoder_profile('master', BITRATE, threads=settings['threads'], preset=settings['preset'])
+        workers = settings['workers']
+
+    telemetry = RunTelemetry("process_merge_video", workers)
+    with ThreadPoolExecutor(max_workers=workers) as executor:
         for t in tasks:
-            executor.submit(process_with_ffmpeg, *t)
+            executor.submit(process_with_ffmpeg, *t, telemetry=telemetry, profile=profile)
+    telemetry.write(output_dir)
 
 
 if __name__ == "__main__":
@@ -4,12 +4,17 @@ import subprocess
 import time
 import json
 
+from util.ffmpeg_runner import run_ffmpeg, RunTelemetry
+from util.encoder import encoder_profile, with_upload
+from util.filtergraph import FilterGraph
+
 # ================= 配置区域 =================
 INPUT_DIR = "tiktok_raw"
 OUTPUT_DIR = "yt_shorts_ready"
 REACTION_FILE = "reaction_green.mp4"
 # 预设一个经典的绿幕猫咪
 REACTION_URL = "https://www.youtube.com/watch?v=J---aiyznGQ"
+REACTION_SIZE = (1920, 1080)  # 绿幕素材多为横屏 1080P，只用于滤镜成本估算
 
 FFMPEG_EXE = "ffmpeg"
 MAX_DURATION = 59
@@ -36,46 +41,55 @@ def get_video_duration(input_file):
     return float(json.loads(result.stdout)['format']['duration'])
 
 
-def process_segment(input_file, output_file, start_time):
+def process_segment(input_file, output_file, start_time, duration=MAX_DURATION, telemetry=None, report=False):
     speed = round(random.uniform(1.01, 1.04), 3)
     br = round(random.uniform(-0.02, 0.02), 3)
     cont = round(random.uniform(1.0, 1.05), 3)
     sat = round(random.uniform(1.0, 1.1), 3)
 
     # --- 核心改进：chromakey 相似度调高到 0.3，增加 despill 去绿边 ---
-    video_filter = (
-        f"[0:v]split[v1][v2];"
-        f"[v1]scale=1080:1920,boxblur=20:10[bg];"
-        f"[v2]scale=980:-1,setpts={1 / speed}*PTS,"
-        f"eq=brightness={br}:contrast={cont}:saturation={sat},"
-        f"vibrance=intensity=0.3,unsharp=5:5:1.0:5:5:0.0[fg];"
-        f"[1:v]chromakey=0x00FF00:0.3:0.1,despill,scale=350:-1,setpts=PTS-STARTPTS[react];"
-        f"[bg][fg]overlay=(W-w)/2:(H-h)/2:shortest=1[temp];"
-        f"[temp][react]overlay=W-w-30:H-h-200:shortest=1,"
-        f"drawbox=y=ih-15:w=iw*t/{MAX_DURATION}:h=15:color=orange@0.9:t=fill,format=yuv420p[v_final]"
-    )
+    g = FilterGraph("react_move")
+    g.chain('[0:v]', '[v1][v2]').add('split')
+    # 背景大半径模糊：FilterGraph 会改成缩小后再模糊、最后放大
+    g.chain('[v1]', '[bg]').scale(1080, 1920).boxblur(20, 10)
+    fg = g.chain('[v2]', '[fg]').scale(980, -1).add('setpts', f"{1 / speed}*PTS")
+    fg.add('eq', f"brightness={br}:contrast={cont}:saturation={sat}")
+    fg.add('vibrance', 'intensity=0.3').add('unsharp', '5:5:1.0:5:5:0.0')
+    # 绿幕层：FilterGraph 会把 scale=350 挪到 chromakey/despill 前面，只抠缩小后的画面
+    g.chain('[1:v]', '[react]', REACTION_SIZE).add('chromakey', '0x00FF00:0.3:0.1').add('despill').scale(350, -1).add('setpts', 'PTS-STARTPTS')
+    g.chain('[bg][fg]', '[temp]', (1080, 1920)).add('overlay', '(W-w)/2:(H-h)/2:shortest=1')
+    final = g.chain('[temp][react]', '[v_final]', (1080, 1920)).add('overlay', 'W-w-30:H-h-200:shortest=1')
+    final.add('drawbox', f"y=ih-15:w=iw*t/{MAX_DURATION}:h=15:color=orange@0.9:t=fill").add('format', 'yuv420p')
+    video_filter = g.render()
+    if report:
+        g.report()
 
     audio_filter = f"atempo={speed},asetrate=44100*1.01,aresample=44100"
 
+    profile = encoder_profile('master', '6000k')
     cmd = [
         FFMPEG_EXE, '-y',
+        *profile['input_args'],
         '-ss', str(start_time),
         '-t', str(MAX_DURATION),
         '-i', input_file,  # 0: ASMR
         '-stream_loop', '-1',
         '-i', REACTION_FILE,  # 1: 绿幕
-        '-filter_complex', video_filter,
+        '-filter_complex', with_upload(video_filter, profile, '[v_final]'),
         '-af', audio_filter,
         '-map', '[v_final]',  # 映射合成后的视频
         '-map', '0:a',  # 只要 ASMR 的声音
-        '-c:v', 'h264_videotoolbox',
-        '-b:v', '6000k',
+        *profile['video_args'],
         '-c:a', 'aac',
         '-map_metadata', '-1',
         output_file
     ]
 
-    result = subprocess.run(cmd, capture_output=True, text=True)
+    # 输出时长 = 源片段时长 / 变速倍率
+    result = run_ffmpeg(cmd, label=os.path.basename(output_file), duration=duration / speed,
+                        filter_desc="reaction_chromakey_1080x1920")
+    if telemetry:
+        telemetry.add(result.stats)
     if result.returncode != 0:
         print(f"❌ 报错: {result.stderr}")
 
@@ -89,6 +103,7 @@ def main():
         return
 
     print(f"🍏 M-Series 加速模式 | 正在清除绿幕并合成视频...")
+    telemetry = RunTelemetry("react_move", 1)
 
     for filename in files:
         in_p = os.path.join(INPUT_DIR, filename)
@@ -102,13 +117,16 @@ def main():
                 if total_dur - start < 5: break
                 out_name = f"final_P{part}_{filename}"
                 out_p = os.path.join(OUTPUT_DIR, out_name)
-                process_segment(in_p, out_p, start)
+                process_segment(in_p, out_p, start, min(MAX_DURATION, total_dur - start), telemetry,
+                                report=not telemetry.jobs)
                 start += MAX_DURATION
                 part += 1
             print(f"  ✅ 完成")
         except Exception as e:
             print(f"  ❌ 错误: {filename} | {e}")
 
+    telemetry.write(OUTPUT_DIR)
+
 
 if __name__ == "__main__":
     main()
\ No newline at end of file
@@ -7,6 +7,8 @@ import PIL.Image
 from pydub import AudioSegment
 from moviepy.editor import VideoFileClip, AudioFileClip, concatenate_videoclips
 
+from util.encoder import moviepy_codec
+
 # --- Pillow 兼容性补丁 ---
 if not hasattr(PIL.Image, 'ANTIALIAS'):
     PIL.Image.ANTIALIAS = PIL.Image.LANCZOS
@@ -104,6 +106,10 @@ def create_video(total_duration):
         print(f"❌ 错误：在 {SOURCE_VIDEOS_DIR} 中未找到素材！")
         return
 
+    # 分段是中间产物只求快，最终拼接才是成品；按本机能力选编码后端
+    chunk_codec, chunk_params = moviepy_codec('intermediate')
+    final_codec, final_params = moviepy_codec('master')
+
     chunk_files = []
     num_chunks = int(np.ceil(total_duration / CHUNK_LIMIT))
     print(f"启动 1080P 横屏合成模式：共 {num_chunks} 段...")
@@ -156,12 +162,12 @@ def create_video(total_duration):
 
             final_chunk.write_videofile(
                 chunk_path,
-                codec="h264_videotoolbox",
+                codec=chunk_codec,
                 bitrate=TARGET_BITRATE,
                 audio_codec="aac",
                 fps=24,
                 threads=4,
-                ffmpeg_params=["-movflags", "+faststart"],
+                ffmpeg_params=chunk_params + ["-movflags", "+faststart"],
                 logger="bar"
             )
             audio_chunk.close()
@@ -182,12 +188,12 @@ def create_video(total_duration):
     final_video = concatenate_videoclips(final_clips, method="compose")
     final_video.write_videofile(
         FINAL_VIDEO,
-        codec="h264_videotoolbox",
+        codec=final_codec,
         bitrate=TARGET_BITRATE,
         audio_codec="aac",
         fps=24,
         threads=4,
-        ffmpeg_params=["-movflags", "+faststart"],
+        ffmpeg_params=final_params + ["-movflags", "+faststart"],
         logger="bar"
     )
 
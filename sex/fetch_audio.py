@@ -1,9 +1,10 @@
 import yt_dlp
 import os
-import whisper
 import threading
 from concurrent.futures import ThreadPoolExecutor
 
+from util.transcribe import transcribe, PRIORITY_NORMAL, PRIORITY_LOW
+
 # --- 配置区 ---
 BASE_OUTPUT_DIR = "/Users/huangyun/git/creative/output1"
 # 历史文件现在动态指向 BASE_OUTPUT_DIR 下
@@ -19,9 +20,8 @@ file_lock = threading.Lock()
 # 专用转录线程池：max_workers=1 配合 transcribe_lock 确保 Intel CPU 顺序处理转录且不崩溃
 transcribe_executor = ThreadPoolExecutor(max_workers=1)
 
-print("正在加载 Whisper 模型...")
-# 如果 Intel Mac 依然吃力，可以考虑将 "base" 改为 "tiny"
-model = whisper.load_model("base")
+# 如果 Intel Mac 依然吃力，可以考虑将 "base" 改为 "tiny"；模型由常驻转录服务持有
+WHISPER_MODEL = "base"
 
 
 def get_video_info(url):
@@ -47,11 +47,11 @@ def download_audio(video_url, output_path, new_name):
         return os.path.join(output_path, f"{new_name}.mp3"), info.get('duration', 0)
 
 
-def safe_transcribe(audio_file, txt_path):
+def safe_transcribe(audio_file, txt_path, priority=PRIORITY_NORMAL):
     """确保 Intel CPU 同一时间只跑一个转录任务"""
     with transcribe_lock:
         print(f">>> 开始转录: {os.path.basename(audio_file)}")
-        result = model.transcribe(audio_file, language="zh")
+        result = transcribe(audio_file, model=WHISPER_MODEL, language="zh", priority=priority)
         with open(txt_path, "w", encoding="utf-8") as f:
             f.write(result["text"])
 
@@ -122,7 +122,8 @@ def process_single_task(main_video, low_views_pool, task_index):
 
             # 提交转录并记录路径以便后续合并
             txt_path = os.path.join(target_dir, f"{filler_count}.txt")
-            future = transcribe_executor.submit(safe_transcribe, filler_audio, txt_path)
+            # 补齐素材排在主视频后面
+            future = transcribe_executor.submit(safe_transcribe, filler_audio, txt_path, PRIORITY_LOW)
 
             filler_futures.append(future)
             filler_txt_paths.append(txt_path)
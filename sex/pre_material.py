@@ -1,7 +1,9 @@
 import os
-import subprocess
 import hashlib
 
+from util.ffmpeg_runner import run_ffmpeg, RunTelemetry
+from util.encoder import encoder_profile, with_upload
+
 # --- 核心配置 ---
 TARGET_RES = "1280x720"
 FPS = 24
@@ -33,10 +35,13 @@ def process_videos(input_folder):
         print(f"❌ 在目录 {input_folder} 中未找到视频文件。")
         return
 
+    # 预处理素材只求快：按本机能力选最快的编码后端
+    profile = encoder_profile('intermediate', BITRATE)
     print(f"🚀 启动预处理！目标目录: {output_dir}")
-    print(f"配置: 裁剪顶部15%, 缩放至720P, 帧率{FPS}, 使用Mac硬件加速")
+    print(f"配置: 裁剪顶部15%, 缩放至720P, 帧率{FPS}, 编码后端 {profile['backend']}")
     print("-" * 30)
 
+    telemetry = RunTelemetry("pre_material", 1)
     for i, filename in enumerate(vids):
         input_path = os.path.join(input_folder, filename)
 
@@ -66,18 +71,18 @@ def process_videos(input_folder):
 
         cmd = [
             "ffmpeg", "-y",
+            *profile['input_args'],
             "-i", input_path,
             "-an",  # 移除音频节省空间
-            "-vf", filter_str,
-            "-c:v", "h264_videotoolbox",  # Mac 硬件加速驱动
-            "-b:v", BITRATE,
-            "-preset", "p4",  # 质量预设
+            "-vf", with_upload(filter_str, profile),
+            *profile['video_args'],
             output_path
         ]
 
         try:
             # 运行命令
-            result = subprocess.run(cmd, capture_output=True, text=True)
+            result = run_ffmpeg(cmd, label=filename, filter_desc="crop_scale_fps")
+            telemetry.add(result.stats)
             if result.returncode != 0:
                 print(f"❌ 处理失败 {filename}: {result.stderr}")
             else:
@@ -86,6 +91,7 @@ def process_videos(input_folder):
             print(f"⚠️ 发生错误: {e}")
 
     print("-" * 30)
+    telemetry.write(output_dir)
     print(f"✨ 处理结束！所有可用素材已存放至: {output_dir}")
 
 
@@ -0,0 +1,26 @@
+import subprocess
+
+import numpy as np
+
+# ================= 配置区 =================
+SAMPLE_RATE = 16000  # Whisper 固定吃 16kHz 单声道 float32
+
+
+# ==========================================
+
+def decode_audio(path, start=0, duration=None, sr=SAMPLE_RATE):
+    """
+    一个 ffmpeg 进程把音视频文件的 [start, start+duration] 直接解码成 16kHz 单声道 float32 数组，
+    不落临时文件、不做有损转码。视频文件也可以直接传，视频流会被跳过。
+    """
+    cmd = ['ffmpeg', '-nostdin', '-v', 'error']
+    if start:
+        cmd += ['-ss', f"{start:.3f}"]  # 放在 -i 前面：直接跳到起点，前面的不解码
+    if duration:
+        cmd += ['-t', f"{duration:.3f}"]
+    cmd += ['-i', path, '-vn', '-ac', '1', '-ar', str(sr), '-f', 'f32le', '-']
+
+    res = subprocess.run(cmd, capture_output=True)
+    if res.returncode != 0:
+        raise RuntimeError(f"音频解码失败: {res.stderr.decode('utf-8', errors='ignore').strip()}")
+    return np.frombuffer(res.stdout, dtype=np.float32)
@@ -0,0 +1,83 @@
+from urllib.parse import quote
+
+# ================= 配置区 =================
+SEARCH_URL = "https://search.bilibili.com/all?keyword={keyword}"
+# 排序模式直接走 URL 参数，不用再点「最多点击」按钮等页面刷新
+ORDER_PARAMS = {None: "", "click": "&order=click", "pubdate": "&order=pubdate", "dm": "&order=dm"}
+CARD_SELECTOR = ".bili-video-card, .video-list-item"
+# 搜索只要 DOM 里的链接和时长，图片/视频/字体都不用加载
+BLOCKED_RESOURCES = {"image", "media", "font"}
+SEARCH_TIMEOUT = 30000
+
+# 在页面里一次性抽出所有卡片的链接、标题、时长，只走一次浏览器往返
+EXTRACT_JS = """
+(selector) => Array.from(document.querySelectorAll(selector)).map(card => {
+    const link = card.querySelector("a[href*='/video/BV']");
+    const dur = card.querySelector(".bili-video-card__stats__duration, .duration");
+    const title = card.querySelector(".bili-video-card__info--tit, .title, h3");
+    return {
+        href: link ? link.getAttribute("href") : null,
+        d_str: dur ? dur.innerText.trim() : null,
+        title: title ? (title.getAttribute("title") || title.innerText).trim() : null,
+    };
+})
+"""
+
+
+# ==========================================
+
+def parse_duration(d_str):
+    """'12:34' / '1:02:03' -> 秒，格式不对返回 0"""
+    try:
+        parts = list(map(int, d_str.split(':')))
+    except (AttributeError, ValueError):
+        return 0
+    if len(parts) == 2:
+        return parts[0] * 60 + parts[1]
+    if len(parts) == 3:
+        return parts[0] * 3600 + parts[1] * 60 + parts[2]
+    return 0
+
+
+def normalize_url(href):
+    return (f"https:{href}" if href.startswith("//") else href).split("?")[0]
+
+
+async def _abort_heavy(route):
+    if route.request.resource_type in BLOCKED_RESOURCES:
+        await route.abort()
+    else:
+        await route.continue_()
+
+
+async def block_heavy_resources(target):
+    """给 BrowserContext 或 Page 装上资源拦截，只放行文档/脚本/接口请求"""
+    await target.route("**/*", _abort_heavy)
+
+
+async def search_page(page, keyword, order="click"):
+    """
+    用已打开的 page 搜索一个关键词，返回结构化卡片列表:
+    [{'url', 'sec', 'd_str', 'title'}, ...] (按页面顺序，已去掉无链接的卡片)
+    """
+    url = SEARCH_URL.format(keyword=quote(keyword)) + ORDER_PARAMS.get(order, "")
+    # 不等 networkidle：卡片节点出现就能抽数据
+    await page.goto(url, wait_until="domcontentloaded", timeout=SEARCH_TIMEOUT)
+    await page.wait_for_selector(CARD_SELECTOR, timeout=8000)
+    raw = await page.evaluate(EXTRACT_JS, CARD_SELECTOR)
+
+    results, seen = [], set()
+    for item in raw:
+        if not item['href']:
+            continue
+        clean_url = normalize_url(item['href'])
+        if clean_url in seen:
+            continue
+        seen.add(clean_url)
+        results.append({
+            'url': clean_url,
+            'sec': parse_duration(item['d_str']),
+            'd_str': item['d_str'] or "",
+            'title': item['title'] or "",
+        })
+    return results
@@ -0,0 +1,106 @@
+import asyncio
+
+from util.bili_search import search_page, block_heavy_resources
+
+# ================= 配置区 =================
+POOL_CONTEXTS = 2  # 常驻的浏览器上下文数，也就是同时进行的搜索数上限
+PAGES_PER_CONTEXT = 1
+USER_AGENT = "Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/122.0.0.0 Safari/537.36"
+
+
+# ==========================================
+
+class BrowserPool:
+    """
+    常驻的无头 Chromium + 上下文/页面池。所有搜索脚本从这里借页面，
+    整个进程只付一次浏览器启动成本。用 get_pool() 取共享实例，结束时 close_pool()。
+    """
+
+    def __init__(self, contexts=POOL_CONTEXTS, pages_per_context=PAGES_PER_CONTEXT, headless=True):
+        self.n_contexts = contexts
+        self.pages_per_context = pages_per_context
+        self.headless = headless
+        self.playwright = None
+        self.browser = None
+        self.contexts = []
+        self.pages = asyncio.Queue()
+        self.searches = 0
+
+    async def start(self):
+        from playwright.async_api import async_playwright
+        self.playwright = await async_playwright().start()
+        self.browser = await self.playwright.chromium.launch(headless=self.headless)
+        for _ in range(self.n_contexts):
+            context = await self.browser.new_context(user_agent=USER_AGENT)
+            await block_heavy_resources(context)
+            self.contexts.append(context)
+            for _ in range(self.pages_per_context):
+                self.pages.put_nowait((context, await context.new_page()))
+        print(f"🧭 浏览器池已启动: {self.n_contexts} 个上下文 x {self.pages_per_context} 页")
+        return self
+
+    async def _borrow(self):
+        context, page = await self.pages.get()
+        if page is None:
+            # 上次换页失败留下的空位，借出时补建页面
+            try:
+                page = await context.new_page()
+            except Exception:
+                self.pages.put_nowait((context, None))
+                raise
+        return context, page
+
+    @staticmethod
+    async def _replace(context, page):
+        """丢掉可能卡在异常状态的页面换一个新的；新页面也建不出来时返回 None，空位留给下次借出时补建"""
+        try:
+            await page.close()
+        except Exception:
+            pass
+        try:
+            return await context.new_page()
+        except Exception:
+            return None
+
+    async def search(self, keyword, order="click"):
+        """借一个页面搜索关键词，返回 search_page 的结构化结果；出错时换一个新页面再放回池子"""
+        context, page = await self._borrow()
+        healthy = False
+        try:
+            self.searches += 1
+            result = await search_page(page, keyword, order=order)
+            healthy = True
+            return result
+        finally:
+            # 无论成功失败都归还这个名额，池子不会越用越小，也不会把坏页面借给下一个人
+            if not healthy:
+                page = await self._replace(context, page)
+            self.pages.put_nowait((context, page))
+
+    async def close(self):
+        if self.browser:
+            await self.browser.close()
+        if self.playwright:
+            await self.playwright.stop()
+        print(f"🧭 浏览器池已关闭 | 共服务 {self.searches} 次搜索")
+        self.browser = self.playwright = None
+
+
+_pool = None
+_pool_lock = asyncio.Lock()
+
+
+async def get_pool():
+    """当前进程共享的浏览器池，第一次调用时启动"""
+    global _pool
+    async with _pool_lock:
+        if _pool is None:
+            _pool = await BrowserPool().start()
+    return _pool
+
+
+async def close_pool():
+    global _pool
+    if _pool is not None:
+        await _pool.close()
+        _pool = None
@@ -1,7 +1,18 @@
 import os
+import asyncio
 import subprocess
 import sys
 
+from util.browser_pool import close_pool
+from util.search_cache import cached_search
+
+
+async def _resolve_urls(query, refresh):
+    try:
+        return [c['url'] for c in await cached_search(query, order=None, bypass=refresh)]
+    finally:
+        await close_pool()
+
 
 class BiliDownloader:
     def __init__(self, download_path="test_assets"):
@@ -9,17 +20,18 @@ class BiliDownloader:
         if not os.path.exists(self.download_path):
             os.makedirs(self.download_path)
 
-    def search_and_download(self, query, limit=1):
+    def search_and_download(self, query, limit=1, refresh=False):
         print(f"开始搜索并下载关键词: {query}")
 
-        # 将搜索关键词转为 B 站标准的搜索链接
-        # yt-dlp 能够自动解析这种 search URL 并抓取结果
-        search_url = f"https://search.bilibili.com/all?keyword={query}"
+        # 搜索结果走共享的关键词缓存，命中时不再抓取搜索页；refresh=True 强制重新搜索
+        urls = asyncio.run(_resolve_urls(query, refresh))[:limit]
+        if not urls:
+            print("❌ 没有搜索到结果")
+            return
 
         cmd = [
             sys.executable, '-m', 'yt_dlp',
-            search_url,
-            '--playlist-items', f'1-{limit}',  # 下载搜索结果的前 limit 个
+            *urls,
             '--paths', self.download_path,
             '--output', '%(title).20s-%(id)s.%(ext)s',
             '--format', 'bestvideo[ext=mp4]+bestaudio[ext=m4a]/best[ext=mp4]/best',
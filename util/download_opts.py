@@ -0,0 +1,65 @@
+from yt_dlp.utils import download_range_func
+
+# ================= 配置区 =================
+# 按时间段下载时前后多拿的秒数：流拷贝只能从关键帧切，B 站 GOP 一般不超过 2 秒
+KEYFRAME_MARGIN = 2.0
+# 同等分辨率下优先 H.264 + AAC：解码最便宜，合并 mp4 不用转封装
+CODEC_SORT = ['vcodec:h264', 'acodec:aac']
+# 常见清晰度档位 (短边)，下载上限取不低于渲染短边的最近一档
+STANDARD_TIERS = [144, 240, 360, 480, 540, 576, 720, 1080, 1440, 2160]
+
+
+# ==========================================
+
+def range_opts(start, end, margin=KEYFRAME_MARGIN):
+    """
+    只下载 [start, end] 这一段 (前后各留 margin 秒关键帧余量) 的 yt-dlp 参数。
+    不开 force_keyframes_at_cuts：那会整段重编码，余量里多出的几帧由后续剪辑裁掉即可。
+    返回 (opts, offset)，offset 是下载文件 0 秒对应原视频的时间，剪辑时间点要减去它。
+    """
+    lo = max(0.0, start - margin)
+    hi = end + margin
+    opts = {
+        'download_ranges': download_range_func(None, [(lo, hi)]),
+        'force_keyframes_at_cuts': False,
+    }
+    return opts, lo
+
+
+def _format_sort(width, height, fps=None):
+    # yt-dlp 的 res 指短边；+res:N = 不低于 N 的最小分辨率，没有就取能拿到的最大的 (上限由 _format_spec 卡住)
+    fields = [f"+res:{min(width, height)}"]
+    if fps:
+        fields.append(f"+fps:{fps}")
+    # 分辨率/帧率够用之后，选体积和码率最小的
+    return fields + CODEC_SORT + ['+size', '+br']
+
+
+def _tier(n):
+    return next((t for t in STANDARD_TIERS if t >= n), n)
+
+
+def _format_spec(width, height):
+    """
+    硬上限只卡渲染画面的短边方向 (竖屏卡宽、横屏卡高)，上限取不低于短边的最近一档，长边不限。
+    例：608x1080 竖屏 -> width<=720，720x1280 保留、1080x1920 排除；
+    1920x1080 横屏 -> height<=1080，缺 1080P 时不会跳到 1440P / 4K。
+    +res 排序在上限之内挑最小的够用流；都没有尺寸信息时退回合流最佳。
+    """
+    side = 'width' if width < height else 'height'
+    cap = f"[{side}<=?{_tier(min(width, height))}]"
+    return f"bv*{cap}+ba/b{cap}/b"
+
+
+def format_opts(width, height, fps=None):
+    """按下游渲染分辨率/帧率选「刚好够用」的最小流，返回可直接合并进 YoutubeDL 参数的 dict"""
+    return {
+        'format': _format_spec(width, height),
+        'format_sort': _format_sort(width, height, fps),
+        'merge_output_format': 'mp4',
+    }
+
+
+def format_args(width, height, fps=None):
+    """同 format_opts，给命令行调用 yt-dlp 的脚本用"""
+    return ['-f', _format_spec(width, height), '-S', ','.join(_format_sort(width, height, fps)), '--merge-output-format', 'mp4']
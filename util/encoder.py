@@ -0,0 +1,238 @@
+import os
+import json
+import shutil
+import functools
+import subprocess
+from concurrent.futures import ThreadPoolExecutor
+
+from util.ffmpeg_runner import run_ffmpeg
+
+# ================= 配置区 =================
+# x264 预设按画质从高到低排列，吞吐达标时优先选靠前的
+X264_PRESETS = ['slow', 'medium', 'fast', 'faster', 'veryfast', 'superfast', 'ultrafast']
+# 候选并发数：每档的单任务线程数 = CPU 核数 // 并发数
+WORKER_OPTIONS = (1, 2, 4, 8)
+BENCH_SECONDS = 5  # 每次试编码的素材时长
+
+# 本机 ffmpeg 能力探测结果缓存 (按 ffmpeg 可执行文件的路径/大小/修改时间失效)
+CAPS_CACHE = os.path.expanduser("~/.cache/creative/ffmpeg_caps.json")
+VAAPI_DEVICE = "/dev/dri/renderD128"
+
+# 质量意图 -> 候选后端 (按速度从快到慢)，选第一个本机可用的
+#   master:       最终成品，上传 YouTube，必须是 H.264
+#   intermediate: 预处理素材 / 临时渲染，只求快
+#   archive:      长期存放的素材库，体积优先
+INTENT_BACKENDS = {
+    'master': ['videotoolbox', 'vaapi', 'libx264'],
+    'intermediate': ['videotoolbox', 'vaapi', 'libx264'],
+    'archive': ['libsvtav1', 'libx265', 'libx264'],
+}
+# 软件编码器在各意图下的预设
+SOFTWARE_PRESETS = {
+    'libx264': {'master': 'veryfast', 'intermediate': 'superfast', 'archive': 'medium'},
+    'libx265': {'archive': 'fast'},
+    'libsvtav1': {'archive': '8'},
+}
+# 后端 -> ffmpeg 编码器名
+BACKEND_ENCODERS = {
+    'videotoolbox': 'h264_videotoolbox',
+    'vaapi': 'h264_vaapi',
+    'libx264': 'libx264',
+    'libx265': 'libx265',
+    'libsvtav1': 'libsvtav1',
+}
+
+
+# ==========================================
+
+def _ffmpeg_fingerprint():
+    path = shutil.which('ffmpeg')
+    if not path:
+        return None
+    st = os.stat(path)
+    return f"{path}:{st.st_size}:{st.st_mtime}"
+
+
+def _list_encoders():
+    res = subprocess.run(['ffmpeg', '-hide_banner', '-encoders'], capture_output=True, text=True)
+    names = set()
+    for line in res.stdout.splitlines():
+        parts = line.split()
+        # 形如 " V....D libx264   libx264 H.264 ..."
+        if len(parts) >= 2 and len(parts[0]) == 6 and parts[0][0] in 'VAS':
+            names.add(parts[1])
+    return names
+
+
+def _trial_encode(backend):
+    """硬件编码器编进了 ffmpeg 不代表本机能用 (没 GPU / 不是 Mac)，编 1 帧试一下"""
+    if backend == 'vaapi':
+        if not os.path.exists(VAAPI_DEVICE):
+            return False
+        cmd = ['ffmpeg', '-v', 'error', '-vaapi_device', VAAPI_DEVICE, '-f', 'lavfi', '-i', 'color=s=256x256:d=0.1',
+               '-vf', 'format=nv12,hwupload', '-frames:v', '1', '-c:v', 'h264_vaapi', '-f', 'null', '-']
+    else:
+        cmd = ['ffmpeg', '-v', 'error', '-f', 'lavfi', '-i', 'color=s=256x256:d=0.1',
+               '-frames:v', '1', '-c:v', BACKEND_ENCODERS[backend], '-f', 'null', '-']
+    try:
+        return subprocess.run(cmd, capture_output=True, timeout=20).returncode == 0
+    except subprocess.TimeoutExpired:
+        return False
+
+
+@functools.lru_cache(maxsize=None)
+def detect_capabilities():
+    """
+    探测本机 ffmpeg 可用的编码后端，结果写入磁盘缓存，同一个 ffmpeg 只探测一次。
+    返回 {'backends': [...], 'hwaccels': [...]}
+    """
+    fingerprint = _ffmpeg_fingerprint()
+    if fingerprint is None:
+        print("⚠️ 未找到 ffmpeg，请先安装。")
+        return {'backends': [], 'hwaccels': []}
+
+    if os.path.exists(CAPS_CACHE):
+        try:
+            with open(CAPS_CACHE, 'r', encoding='utf-8') as f:
+                cached = json.load(f)
+            if cached.get('fingerprint') == fingerprint:
+                return cached['caps']
+        except:
+            pass
+
+    encoders = _list_encoders()
+    backends = []
+    for backend, encoder in BACKEND_ENCODERS.items():
+        if encoder not in encoders:
+            continue
+        if backend in ('videotoolbox', 'vaapi') and not _trial_encode(backend):
+            continue
+        backends.append(backend)
+
+    res = subprocess.run(['ffmpeg', '-hide_banner', '-hwaccels'], capture_output=True, text=True)
+    hwaccels = [l.strip() for l in res.stdout.splitlines()[1:] if l.strip()]
+
+    caps = {'backends': backends, 'hwaccels': hwaccels}
+    print(f"🔍 ffmpeg 可用编码后端: {', '.join(backends) or '无'}")
+    os.makedirs(os.path.dirname(CAPS_CACHE), exist_ok=True)
+    with open(CAPS_CACHE, 'w', encoding='utf-8') as f:
+        json.dump({'fingerprint': fingerprint, 'caps': caps}, f, indent=2)
+    return caps
+
+
+def select_backend(intent):
+    available = detect_capabilities()['backends']
+    for backend in INTENT_BACKENDS[intent]:
+        if backend in available:
+            return backend
+    # 探测失败时兜底 libx264，至少命令能拼出来，报错信息更直观
+    return 'libx264'
+
+
+def encoder_profile(intent, bitrate, threads=None, preset=None, realtime=False):
+    """
+    按质量意图选出本机最快的后端，返回拼 ffmpeg 命令所需的各部分：
+      input_args: 放在 -i 之前 (硬件解码 / VAAPI 设备)
+      video_args: 视频编码参数
+      upload:     VAAPI 需要接在滤镜链末尾的上传滤镜，其它后端为空
+    传入 preset 时强制走 libx264 (吞吐目标模式的试编码结果)。
+    realtime=True 时 VideoToolbox 加 -realtime 1：编码更快，但码率分配更粗、画质可能下降，只给明确要速度的脚本用。
+    """
+    backend = 'libx264' if preset else select_backend(intent)
+    thread_args = ['-threads', str(threads)] if threads else []
+    profile = {'backend': backend, 'input_args': [], 'video_args': [], 'upload': ''}
+
+    if backend == 'videotoolbox':
+        profile['input_args'] = ['-hwaccel', 'videotoolbox']
+        profile['video_args'] = ['-c:v', 'h264_videotoolbox', '-b:v', bitrate, '-profile:v', 'main',
+                                 *(['-realtime', '1'] if realtime else []), *thread_args]
+    elif backend == 'vaapi':
+        profile['input_args'] = ['-vaapi_device', VAAPI_DEVICE]
+        profile['video_args'] = ['-c:v', 'h264_vaapi', '-b:v', bitrate, '-profile:v', 'main', *thread_args]
+        profile['upload'] = 'format=nv12,hwupload'
+    elif backend == 'libx264':
+        preset = preset or SOFTWARE_PRESETS['libx264'][intent]
+        profile['video_args'] = [*x264_args(preset, threads or 0, bitrate), '-profile:v', 'main']
+    else:
+        rate = int(bitrate.rstrip('kK'))
+        profile['video_args'] = ['-c:v', BACKEND_ENCODERS[backend], '-preset', SOFTWARE_PRESETS[backend][intent],
+                                 '-b:v', bitrate, '-maxrate', bitrate, '-bufsize', f"{rate * 2}k",
+                                 '-pix_fmt', 'yuv420p', *thread_args]
+    return profile
+
+
+def with_upload(filter_str, profile, out_label=None):
+    """把 VAAPI 上传滤镜接到滤镜链末尾；filter_complex 需给出最终视频输出标签 (如 '[outv]')"""
+    if not profile['upload']:
+        return filter_str
+    if out_label:
+        return filter_str.replace(out_label, f",{profile['upload']}{out_label}", 1)
+    return f"{filter_str},{profile['upload']}"
+
+
+def moviepy_codec(intent):
+    """
+    MoviePy write_videofile 用：返回 (codec, ffmpeg_params)。
+    MoviePy 无法插入上传滤镜，所以这里不考虑 VAAPI。
+    """
+    available = detect_capabilities()['backends']
+    if 'videotoolbox' in available and 'videotoolbox' in INTENT_BACKENDS[intent]:
+        return 'h264_videotoolbox', []
+    return 'libx264', ['-preset', SOFTWARE_PRESETS['libx264'].get(intent, 'veryfast'), '-pix_fmt', 'yuv420p']
+
+
+def x264_args(preset, threads, bitrate):
+    """软件编码参数：码率与原 VideoToolbox 配置保持一致，加 VBV 上限防止体积失控"""
+    rate = int(bitrate.rstrip('kK'))
+    # threads 为 0 时交给 x264 自己按核数决定
+    return [
+        '-c:v', 'libx264', '-preset', preset, '-threads', str(threads),
+        '-b:v', bitrate, '-maxrate', bitrate, '-bufsize', f"{rate * 2}k",
+        '-pix_fmt', 'yuv420p',
+    ]
+
+
+def _bench_once(bench_args, preset, threads, bitrate):
+    cmd = ['ffmpeg', '-y', *bench_args, '-t', str(BENCH_SECONDS),
+           *x264_args(preset, threads, bitrate), '-f', 'null', '-']
+    res = run_ffmpeg(cmd, label=f"bench {preset}/{threads}t", duration=BENCH_SECONDS, report_interval=3600)
+    return res.stats['speed'] if res.returncode == 0 else 0.0
+
+
+def benchmark(bench_args, preset, workers, bitrate):
+    """同时跑 workers 个试编码，返回整体实时倍率 (各任务倍速之和)"""
+    threads = max(1, (os.cpu_count() or 1) // workers)
+    with ThreadPoolExecutor(max_workers=workers) as ex:
+        speeds = list(ex.map(lambda _: _bench_once(bench_args, preset, threads, bitrate), range(workers)))
+    if not all(speeds):
+        return 0.0
+    return sum(speeds)
+
+
+def pick_encode_settings(bench_args, bitrate, target_rtf=None, deadline_sec=None, total_media_sec=None):
+    """
+    吞吐目标模式：在真实滤镜链上试编码一小段，挑出能达到目标实时倍率的最高画质预设。
+    bench_args: 不含编码参数和输出的 ffmpeg 参数 (输入 + 滤镜 + map)
+    target_rtf: 整批目标实时倍率 (输出时长 / 墙钟时间)；也可给 deadline_sec + total_media_sec 推算
+    返回 {'preset', 'threads', 'workers', 'est_rtf'}
+    """
+    if target_rtf is None:
+        target_rtf = total_media_sec / deadline_sec
+    cpu = os.cpu_count() or 1
+    options = [w for w in WORKER_OPTIONS if w <= cpu] or [1]
+    print(f"⏱️ 吞吐目标 {target_rtf:.2f}x 实时 | CPU {cpu} 核 | 正在试编码选预设...")
+
+    best = None
+    for preset in X264_PRESETS:
+        for workers in options:
+            rtf = benchmark(bench_args, preset, workers, bitrate)
+            print(f"   {preset:<10} {workers} 并发 x {max(1, cpu // workers)} 线程 -> {rtf:.2f}x")
+            if best is None or rtf > best['est_rtf']:
+                best = {'preset': preset, 'threads': max(1, cpu // workers), 'workers': workers, 'est_rtf': rtf}
+            if rtf >= target_rtf:
+                print(f"✅ 选定: {preset} | {workers} 并发 | 预计 {rtf:.2f}x")
+                return {'preset': preset, 'threads': max(1, cpu // workers), 'workers': workers, 'est_rtf': rtf}
+
+    # 最快档也达不到目标：退回整体最快的组合
+    print(f"⚠️ 本机最快只能到 {best['est_rtf']:.2f}x，达不到目标，使用最快组合: {best['preset']} | {best['workers']} 并发")
+    return best
@@ -1,8 +1,9 @@
 import os
 import json
-import whisper
 from yt_dlp import YoutubeDL
 
+from util.transcribe import transcribe
+
 # ================= 配置区 =================
 PROXY = "http://127.0.0.1:7897"
 DOWNLOAD_LIMIT = 3  # 每次下载3个
@@ -21,7 +22,6 @@ class RobustYouTubeProcessor:
         self.history_file = os.path.join(output_dir, "processed_history.txt")
         if not os.path.exists(self.output_dir): os.makedirs(self.output_dir)
         self.processed_ids = self._load_history()
-        self.model = whisper.load_model(WHISPER_MODEL)
 
     def _load_history(self):
         if os.path.exists(self.history_file):
@@ -92,10 +92,8 @@ class RobustYouTubeProcessor:
                 audio_filename = os.path.join(self.output_dir, f"{v_id}.mp3")
 
             print(f"Transcribing {v_id}... ☕")
-            audio = whisper.load_audio(audio_filename)
             # 截取前 10 分钟
-            audio_cut = whisper.pad_or_trim(audio, length=16000 * 600)
-            result = self.model.transcribe(audio_cut, fp16=False)
+            result = transcribe(audio_filename, model=WHISPER_MODEL, duration=600)
 
             # 组织 JSON 数据
             content = result["text"].strip()[:CONTENT_LIMIT]
@@ -0,0 +1,170 @@
+import os
+import re
+import json
+import time
+import threading
+import subprocess
+from datetime import datetime
+
+# ================= 配置区 =================
+REPORT_INTERVAL = 5.0  # 每个任务最多每隔几秒打印一次进度
+
+
+# ==========================================
+
+class FFmpegResult:
+    """与 subprocess.run 返回值用法保持一致 (returncode / stderr)，额外带上本次任务的吞吐统计"""
+
+    def __init__(self, returncode, stderr, stats):
+        self.returncode = returncode
+        self.stderr = stderr
+        self.stats = stats
+
+
+def _parse_hms(text):
+    h, m, s = text.split(':')
+    return int(h) * 3600 + int(m) * 60 + float(s)
+
+
+def _fmt_size(num_bytes):
+    return f"{num_bytes / 1024 / 1024:.1f}MB"
+
+
+def run_ffmpeg(cmd, label=None, duration=None, filter_desc=None, report_interval=REPORT_INTERVAL):
+    """
+    运行一条 ffmpeg 命令并实时读取 -progress 输出，周期性打印 fps / 倍速 / 已写字节 / ETA。
+    duration 为本任务预期输出时长 (秒)；不传时从 stderr 的 "Duration:" 头信息里推断。
+    """
+    label = label or os.path.basename(cmd[-1])
+    # -progress 写到 stdout，-nostats 关掉 stderr 里的刷屏进度行
+    full_cmd = [cmd[0], '-progress', 'pipe:1', '-nostats', *cmd[1:]]
+
+    stats = {
+        'label': label, 'filter': filter_desc, 'returncode': None,
+        'wall_sec': 0.0, 'media_sec': 0.0, 'frames': 0, 'bytes': 0,
+        'avg_fps': 0.0, 'speed': 0.0,
+    }
+    stderr_lines = []
+    expected = {'duration': duration}
+
+    def drain_stderr(pipe):
+        # 单独线程读 stderr，防止管道写满后 ffmpeg 卡死
+        for line in pipe:
+            stderr_lines.append(line)
+            if expected['duration'] is None and 'Duration:' in line:
+                m = re.search(r'Duration:\s*(\d+:\d+:\d+(?:\.\d+)?)', line)
+                if m:
+                    expected['duration'] = _parse_hms(m.group(1))
+
+    start = time.time()
+    last_report = start
+    proc = subprocess.Popen(full_cmd, stdout=subprocess.PIPE, stderr=subprocess.PIPE, text=True,
+                            encoding='utf-8', errors='ignore')
+    reader = threading.Thread(target=drain_stderr, args=(proc.stderr,), daemon=True)
+    reader.start()
+
+    block = {}
+    for line in proc.stdout:
+        key, _, value = line.strip().partition('=')
+        if key != 'progress':
+            block[key] = value
+            continue
+
+        # 一个 progress=continue/end 代表一组完整的进度快照
+        try:
+            stats['frames'] = int(block.get('frame', stats['frames']) or 0)
+            stats['bytes'] = int(block.get('total_size', stats['bytes']) or 0)
+            out_us = block.get('out_time_us') or block.get('out_time_ms')
+            if out_us and out_us != 'N/A':
+                stats['media_sec'] = max(0.0, int(out_us) / 1_000_000)
+        except ValueError:
+            pass
+        cur_fps = block.get('fps', '0')
+        cur_speed = block.get('speed', '0x').rstrip('x').strip()
+
+        now = time.time()
+        if value == 'continue' and now - last_report >= report_interval:
+            last_report = now
+            msg = f"📊 [{label}] {cur_fps} fps | {cur_speed}x | {_fmt_size(stats['bytes'])}"
+            total = expected['duration']
+            try:
+                speed_val = float(cur_speed)
+            except ValueError:
+                speed_val = 0.0
+            if total and speed_val > 0:
+                pct = min(100.0, stats['media_sec'] / total * 100)
+                eta = max(0.0, total - stats['media_sec']) / speed_val
+                msg += f" | {pct:.0f}% | ETA {eta:.0f}s"
+            print(msg)
+        block = {}
+
+    proc.wait()
+    reader.join()
+
+    wall = time.time() - start
+    stats['returncode'] = proc.returncode
+    stats['wall_sec'] = round(wall, 2)
+    stats['avg_fps'] = round(stats['frames'] / wall, 2) if wall > 0 else 0.0
+    stats['speed'] = round(stats['media_sec'] / wall, 3) if wall > 0 else 0.0
+    stats['media_sec'] = round(stats['media_sec'], 2)
+    return FFmpegResult(proc.returncode, ''.join(stderr_lines), stats)
+
+
+class RunTelemetry:
+    """收集一次批处理里所有 ffmpeg 任务的统计，结束时写出 JSON 汇总"""
+
+    def __init__(self, name, workers):
+        self.name = name
+        self.workers = workers
+        self.started = time.time()
+        self.jobs = []
+        self.lock = threading.Lock()
+
+    def add(self, stats):
+        if not stats:
+            return
+        with self.lock:
+            self.jobs.append(stats)
+
+    def summary(self):
+        wall = time.time() - self.started
+        ok_jobs = [j for j in self.jobs if j['returncode'] == 0]
+        media = sum(j['media_sec'] for j in ok_jobs)
+        busy = sum(j['wall_sec'] for j in self.jobs)
+
+        # 按滤镜链分组，看哪条链最拖后腿
+        by_filter = {}
+        for j in ok_jobs:
+            g = by_filter.setdefault(j['filter'] or '-', {'jobs': 0, 'media_sec': 0.0, 'wall_sec': 0.0})
+            g['jobs'] += 1
+            g['media_sec'] += j['media_sec']
+            g['wall_sec'] += j['wall_sec']
+        for g in by_filter.values():
+            g['speed'] = round(g['media_sec'] / g['wall_sec'], 3) if g['wall_sec'] else 0.0
+
+        return {
+            'name': self.name,
+            'workers': self.workers,
+            'started': datetime.fromtimestamp(self.started).strftime('%Y-%m-%d %H:%M:%S'),
+            'wall_sec': round(wall, 2),
+            'jobs': len(self.jobs),
+            'failed': len(self.jobs) - len(ok_jobs),
+            'media_sec': round(media, 2),
+            'bytes': sum(j['bytes'] for j in ok_jobs),
+            # 整批实时倍率：总输出时长 / 墙钟时间
+            'realtime_factor': round(media / wall, 3) if wall > 0 else 0.0,
+            # 平均并发度：任务耗时之和 / 墙钟时间，接近 workers 说明池子一直是满的
+            'avg_concurrency': round(busy / wall, 2) if wall > 0 else 0.0,
+            'by_filter': by_filter,
+            'job_stats': self.jobs,
+        }
+
+    def write(self, output_dir):
+        os.makedirs(output_dir, exist_ok=True)
+        data = self.summary()
+        path = os.path.join(output_dir, f"telemetry_{self.name}_{datetime.now().strftime('%Y%m%d_%H%M%S')}.json")
+        with open(path, 'w', encoding='utf-8') as f:
+            json.dump(data, f, ensure_ascii=False, indent=2)
+        print(f"📈 吞吐汇总: {data['realtime_factor']}x 实时 | 平均并发 {data['avg_concurrency']}/{self.workers} "
+              f"| 失败 {data['failed']} | 报告: {path}")
+        return path
@@ -0,0 +1,319 @@
+import re
+
+# ================= 配置区 =================
+# 大半径模糊先缩到 1/N 分辨率再做，最后放大回去；背景模糊肉眼看不出差别
+BLUR_DOWNSCALE = 4
+BLUR_MIN_RADIUS = 8  # 半径太小的模糊缩小后会失真，不做改写
+DEFAULT_SIZE = (1920, 1080)  # 输入尺寸未知时按 1080P 估算成本
+
+# 每个滤镜处理一个输出像素的相对成本 (以 scale 为 1)，只用于排序和估算
+FILTER_COST = {
+    'scale': 1.0, 'crop': 0.05, 'setsar': 0.0, 'setpts': 0.0, 'trim': 0.0, 'fps': 0.0, 'split': 0.1,
+    'boxblur': 2.0, 'gblur': 3.0, 'unsharp': 4.0, 'eq': 1.0, 'noise': 2.0, 'vibrance': 1.5,
+    'geq': 25.0, 'chromakey': 3.0, 'despill': 1.5, 'overlay': 1.5, 'pad': 0.3, 'format': 0.5,
+    'drawbox': 0.3,
+}
+# 不改像素内容的滤镜：scale 与 crop 之间夹着它们时仍可交换顺序
+TRANSPARENT = {'setsar', 'setpts'}
+# 只改像素、不改时间轴的滤镜：fps 可以安全地挪到它们前面
+PIXEL_ONLY = {'scale', 'crop', 'setsar', 'boxblur', 'gblur', 'unsharp', 'eq', 'noise', 'vibrance',
+              'geq', 'chromakey', 'despill', 'pad', 'format'}
+# 逐像素按颜色处理、结果与分辨率无关的重滤镜：后面紧跟的缩小可以挪到它们前面，少处理像素
+# (geq 只有不引用坐标 / 画面尺寸时才算，见 _resolution_free)
+PER_PIXEL = {'chromakey', 'despill', 'geq'}
+
+
+# ==========================================
+
+def _even(v):
+    return max(2, int(v) // 2 * 2)
+
+
+def _resolution_free(step):
+    """滤镜结果是否与分辨率无关：geq 引用了 X/Y/W/H 等坐标 (羽化渐变之类) 时缩小前后结果不同"""
+    if step.name != 'geq':
+        return step.name in PER_PIXEL
+    expr = re.sub(r"\b(p|lum|cb|cr|alpha|r|g|b)\(\s*X\s*,\s*Y\s*\)", '', step.args)
+    return not re.search(r"\b(X|Y|W|H|SW|SH)\b", expr)
+
+
+def _eval_expr(expr, iw, ih):
+    """计算 crop/scale 里的简单尺寸表达式 (iw*0.9 之类)，算不出来返回 None"""
+    # 输入尺寸未知时只有常数表达式能算出来，引用 iw/ih 的会因变量缺失返回 None
+    names = {'min': min, 'max': max}
+    if iw is not None and ih is not None:
+        names.update({'iw': iw, 'ih': ih, 'in_w': iw, 'in_h': ih})
+    try:
+        return float(eval(expr.strip("'\""), {'__builtins__': {}}, names))
+    except Exception:
+        return None
+
+
+class Step:
+    def __init__(self, name, args=''):
+        self.name = name
+        self.args = args
+
+    def params(self):
+        """把 a:b:key=v 形式的参数拆成 (位置参数列表, 命名参数字典)"""
+        pos, named = [], {}
+        for part in re.split(r"(?<!\\):", self.args) if self.args else []:
+            if '=' in part and not part.startswith(("'", '"')):
+                k, v = part.split('=', 1)
+                named[k] = v
+            else:
+                pos.append(part)
+        return pos, named
+
+    def render(self):
+        return f"{self.name}={self.args}" if self.args else self.name
+
+
+class Chain:
+    """一条线性滤镜链：[输入标签] f1,f2,... [输出标签]；音频链只拼字符串，不参与成本估算和改写"""
+
+    def __init__(self, inputs='', outputs='', size=None, audio=False):
+        self.inputs = inputs
+        self.outputs = outputs
+        self.size = size
+        self.audio = audio
+        self.steps = []
+
+    def add(self, name, args=''):
+        self.steps.append(Step(name, str(args)))
+        return self
+
+    def scale(self, w, h, flags=None, **extra):
+        args = f"{w}:{h}"
+        if flags:
+            args += f":flags={flags}"
+        for k, v in extra.items():
+            args += f":{k}={v}"
+        return self.add('scale', args)
+
+    def crop(self, w, h, x=None, y=None):
+        args = f"{w}:{h}"
+        if x is not None:
+            args += f":{x}:{y if y is not None else 0}"
+        return self.add('crop', args)
+
+    def boxblur(self, radius, power=1):
+        return self.add('boxblur', f"{radius}:{power}")
+
+    def fps(self, rate):
+        return self.add('fps', rate)
+
+    # ---------- 尺寸推算与成本估算 ----------
+
+    def walk_sizes(self, steps=None):
+        """逐个滤镜推算输出尺寸，返回 [(step, (w, h) 或 None), ...]"""
+        w, h = self.size or (None, None)
+        out = []
+        for step in steps if steps is not None else self.steps:
+            pos, named = step.params()
+            if step.name == 'scale' and len(pos) >= 2:
+                nw, nh = _eval_expr(pos[0], w, h), _eval_expr(pos[1], w, h)
+                if nw == -1 and nh and w and h:
+                    nw = w * nh / h
+                elif nh == -1 and nw and w and h:
+                    nh = h * nw / w
+                w, h = (nw, nh) if nw and nh and nw > 0 and nh > 0 else (None, None)
+            elif step.name == 'crop' and len(pos) >= 2:
+                w, h = _eval_expr(pos[0], w, h), _eval_expr(pos[1], w, h)
+            elif step.name == 'pad' and len(pos) >= 2:
+                w, h = _eval_expr(pos[0], w, h), _eval_expr(pos[1], w, h)
+            out.append((step, (w, h) if w and h else None))
+        return out
+
+    def out_size(self):
+        sizes = self.walk_sizes()
+        return sizes[-1][1] if sizes else self.size
+
+    def cost(self, steps=None):
+        """每帧成本估算，单位: 百万像素·操作 (Mpx-op)"""
+        if self.audio:
+            return 0.0
+        total = 0.0
+        prev = self.size or DEFAULT_SIZE
+        for step, size in self.walk_sizes(steps):
+            w, h = size or DEFAULT_SIZE
+            px = w * h
+            if step.name == 'scale':
+                # 缩放既要读输入也要写输出，按两者平均计
+                px = (prev[0] * prev[1] + px) / 2
+            total += FILTER_COST.get(step.name, 1.0) * px / 1e6
+            prev = (w, h)
+        return total
+
+    # ---------- 成本改写 ----------
+
+    def optimize(self):
+        """按规则改写滤镜顺序，返回应用了的改写名列表"""
+        applied = []
+        if self.audio:
+            return applied
+        if self._fps_first():
+            applied.append('fps提前')
+        if self._crop_before_scale():
+            applied.append('先裁后缩')
+        if self._blur_at_low_res():
+            applied.append('低分辨率模糊')
+        if self._per_pixel_at_low_res():
+            applied.append('先缩后抠')
+        return applied
+
+    def _fps_first(self):
+        # fps 降帧挪到连续的纯像素滤镜之前，后面的重滤镜少处理帧
+        changed = False
+        for i, step in enumerate(self.steps):
+            if step.name != 'fps':
+                continue
+            j = i
+            while j > 0 and self.steps[j - 1].name in PIXEL_ONLY:
+                j -= 1
+            if j < i:
+                self.steps.insert(j, self.steps.pop(i))
+                changed = True
+        return changed
+
+    def _crop_before_scale(self):
+        changed = False
+        i = 0
+        while i < len(self.steps) - 1:
+            sc = self.steps[i]
+            j = i + 1
+            while j < len(self.steps) - 1 and self.steps[j].name in TRANSPARENT:
+                j += 1
+            cr = self.steps[j]
+            if sc.name != 'scale' or cr.name != 'crop':
+                i += 1
+                continue
+            s_pos, s_named = sc.params()
+            c_pos, c_named = cr.params()
+            if len(s_pos) < 2 or len(c_pos) < 2 or c_named:
+                i += 1
+                continue
+            flags = f":flags={s_named['flags']}" if 'flags' in s_named else ''
+            try:
+                W, H = int(s_pos[0]), int(s_pos[1])
+                cw, ch = int(c_pos[0]), int(c_pos[1])
+            except ValueError:
+                i += 1
+                continue
+            foar = s_named.get('force_original_aspect_ratio')
+            if foar == 'increase' and (cw, ch) == (W, H) and len(c_pos) == 2:
+                # 等比放大填满后居中裁切 == 先按目标宽高比居中裁切，再缩放
+                crop = Step('crop', f"'min(iw,ih*{W}/{H})':'min(ih,iw*{H}/{W})'")
+            elif not foar and W > 0 and H > 0:
+                # 缩放后的裁切框映射回原图坐标：少缩放被裁掉的那部分像素
+                cx, cy = (c_pos[2], c_pos[3]) if len(c_pos) >= 4 else (f"{(W - cw) / 2:g}", f"{(H - ch) / 2:g}")
+                try:
+                    cx, cy = float(cx), float(cy)
+                except ValueError:
+                    i += 1
+                    continue
+                crop = Step('crop', f"iw*{cw}/{W}:ih*{ch}/{H}:iw*{cx:g}/{W}:ih*{cy:g}/{H}")
+            else:
+                i += 1
+                continue
+            between = self.steps[i + 1:j]
+            self.steps[i:j + 1] = [crop, Step('scale', f"{cw}:{ch}{flags}"), *between]
+            changed = True
+            i = j + 1
+        return changed
+
+    def _blur_at_low_res(self):
+        changed = False
+        i = 0
+        while i < len(self.steps) - 1:
+            sc, bl = self.steps[i], self.steps[i + 1]
+            if sc.name != 'scale' or bl.name != 'boxblur':
+                i += 1
+                continue
+            s_pos, s_named = sc.params()
+            b_pos, _ = bl.params()
+            try:
+                W, H = int(s_pos[0]), int(s_pos[1])
+                radius = int(b_pos[0])
+            except (ValueError, IndexError):
+                i += 1
+                continue
+            if radius < BLUR_MIN_RADIUS or W <= 0 or H <= 0:
+                i += 1
+                continue
+            f = BLUR_DOWNSCALE
+            flags = f":flags={s_named['flags']}" if 'flags' in s_named else ''
+            power = b_pos[1] if len(b_pos) > 1 else '1'
+            self.steps[i:i + 2] = [
+                Step('scale', f"{_even(W / f)}:{_even(H / f)}{flags}"),
+                Step('boxblur', f"{max(1, round(radius / f))}:{power}"),
+                Step('scale', f"{W}:{H}:flags=bilinear"),
+            ]
+            changed = True
+            i += 3
+        return changed
+
+    def _per_pixel_at_low_res(self):
+        # chromakey / despill / geq 后面紧跟缩小 (中间只夹着 setsar/setpts)：它们的结果只在小尺寸上被用到，
+        # 先缩小再做，省下的是整段重滤镜的像素量。抠像边缘变成在缩小后的像素上算，差别在一个输出像素以内
+        changed = False
+        sizes = [self.size] + [size for _, size in self.walk_sizes()]
+        i = 0
+        while i < len(self.steps):
+            sc = self.steps[i]
+            j = i
+            while j > 0 and (_resolution_free(self.steps[j - 1]) or self.steps[j - 1].name in TRANSPARENT):
+                j -= 1
+            run = self.steps[j:i]
+            if sc.name != 'scale' or not any(s.name in PER_PIXEL for s in run):
+                i += 1
+                continue
+            w, h = sizes[j] or DEFAULT_SIZE
+            nw, nh = Chain(size=(w, h)).add('scale', sc.args).out_size() or (None, None)
+            if not nw or nw * nh >= w * h:
+                i += 1
+                continue
+            self.steps[j:i + 1] = [sc, *run]
+            sizes[j + 1:i + 2] = [(nw, nh)] * (i - j + 1)
+            changed = True
+            i += 1
+        return changed
+
+    def render(self):
+        return f"{self.inputs}{','.join(s.render() for s in self.steps)}{self.outputs}"
+
+
+class FilterGraph:
+    """
+    多条滤镜链组成的 filter_complex。render() 时自动做成本改写：
+    先裁后缩、低分辨率模糊再放大、fps 降帧提前、抠像等逐像素滤镜挪到缩小之后；report() 打印改写前后的每帧成本估算。
+    """
+
+    def __init__(self, name='graph'):
+        self.name = name
+        self.chains = []
+        self.before = 0.0
+        self.after = 0.0
+        self.applied = []
+        self.rendered = None
+
+    def chain(self, inputs='', outputs='', size=None, audio=False):
+        c = Chain(inputs, outputs, size, audio)
+        self.chains.append(c)
+        return c
+
+    def render(self):
+        # 改写是原地进行的，只做一次
+        if self.rendered is not None:
+            return self.rendered
+        self.before = sum(c.cost() for c in self.chains)
+        self.applied = []
+        for c in self.chains:
+            self.applied.extend(c.optimize())
+        self.after = sum(c.cost() for c in self.chains)
+        self.rendered = ';'.join(c.render() for c in self.chains)
+        return self.rendered
+
+    def report(self):
+        rules = '、'.join(dict.fromkeys(self.applied)) or '无'
+        print(f"🧮 [{self.name}] 滤镜每帧成本估算: {self.before:.1f} -> {self.after:.1f} Mpx-op (改写: {rules})")
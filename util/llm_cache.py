@@ -0,0 +1,58 @@
+import os
+import json
+import time
+import sqlite3
+import hashlib
+
+# ================= 配置区 =================
+LLM_CACHE_DB = os.path.expanduser("~/.cache/creative/llm_responses.sqlite")
+LLM_CACHE_BYPASS = os.getenv("LLM_CACHE_BYPASS") == "1"  # 为 1 时全部强制重新请求 (结果仍会写回缓存)
+
+
+# ==========================================
+
+def response_key(provider, models, template_version, prompt, options=None):
+    """
+    LLM 回复的缓存键：服务商 + 模型列表 + 提示词模板版本 + 完整输入的哈希。
+    改了模板文字但没升版本号也不会误命中 (输入哈希变了)；升版本号可以在文字不变时强制作废旧结果。
+    """
+    h = hashlib.blake2b(digest_size=16)
+    h.update(json.dumps([provider, list(models), template_version, options or {}],
+                        sort_keys=True, ensure_ascii=False).encode('utf-8'))
+    h.update(prompt.encode('utf-8'))
+    return h.hexdigest()
+
+
+class LLMCache:
+    def __init__(self, path=LLM_CACHE_DB):
+        self.path = path
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        with self._conn() as conn:
+            conn.execute(
+                "CREATE TABLE IF NOT EXISTS responses ("
+                " key TEXT PRIMARY KEY, provider TEXT, model TEXT, template_version TEXT, response TEXT NOT NULL,"
+                " created_at REAL NOT NULL)"
+            )
+
+    def _conn(self):
+        return sqlite3.connect(self.path, timeout=30)
+
+    def get(self, key):
+        with self._conn() as conn:
+            row = conn.execute("SELECT response FROM responses WHERE key = ?", (key,)).fetchone()
+        return row[0] if row else None
+
+    def put(self, key, provider, model, template_version, response):
+        with self._conn() as conn:
+            conn.execute("INSERT OR REPLACE INTO responses VALUES (?, ?, ?, ?, ?, ?)",
+                         (key, provider, model, template_version, response, time.time()))
+
+
+_cache = None
+
+
+def get_cache():
+    global _cache
+    if _cache is None:
+        _cache = LLMCache()
+    return _cache
@@ -0,0 +1,193 @@
+import os
+import time
+import random
+import asyncio
+
+from util.llm_cache import get_cache, response_key, LLM_CACHE_BYPASS
+
+# ================= 配置区 =================
+# 每个 (服务商, 模型) 一个令牌桶：每分钟请求数 + 允许的瞬时突发数；没单独配置的模型用服务商默认值
+RATE_LIMITS = {
+    'groq': (30, 5),
+    'gemini': (15, 3),
+    'stub': (600, 50),
+}
+MODEL_RATE_LIMITS = {}  # 例: {('groq', 'llama-3.1-8b-instant'): (60, 10)}
+MAX_IN_FLIGHT = 4  # 每个客户端同时在途的请求数
+MAX_RETRIES = 5  # 每个模型的重试次数，用完换下一个模型
+BACKOFF_BASE = 2.0
+BACKOFF_CAP = 60.0
+REQUEST_TIMEOUT = 120
+
+# 设置 LLM_STUB_URL 后所有请求都打到本地桩服务 (python -m util.llm_stub)，离线压测吞吐用
+STUB_URL = os.getenv("LLM_STUB_URL")
+
+RETRYABLE = {408, 409, 429, 500, 502, 503, 504}
+NOT_FOUND = {404}
+
+
+# ==========================================
+
+class TokenBucket:
+    """经典令牌桶：每分钟补 rate 个令牌，最多攒 burst 个；没令牌时异步等待，不占线程"""
+
+    def __init__(self, rate_per_min, burst):
+        self.rate = rate_per_min / 60.0
+        self.capacity = burst
+        self.tokens = burst
+        self.updated = time.monotonic()
+        self.lock = asyncio.Lock()
+
+    async def acquire(self):
+        async with self.lock:
+            while True:
+                now = time.monotonic()
+                self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+                self.updated = now
+                if self.tokens >= 1:
+                    self.tokens -= 1
+                    return
+                await asyncio.sleep((1 - self.tokens) / self.rate)
+
+    def drain(self):
+        """收到 429 时清空令牌，后面的请求一起让路"""
+        self.tokens = 0
+        self.updated = time.monotonic()
+
+
+def _status(e):
+    """
+    按 SDK 异常类型取状态码：Groq 的 APIStatusError / Gemini 的 APIError 带真实状态码；
+    连接失败、超时 (Groq 的 APIConnectionError / APITimeoutError、httpx 传输错误) 统一当作 408 可重试。
+    其它异常返回 None，不重试。
+    """
+    try:
+        import groq
+        if isinstance(e, groq.APIStatusError):
+            return e.status_code
+        if isinstance(e, groq.APIConnectionError):  # APITimeoutError 是它的子类
+            return 408
+    except ImportError:
+        pass
+    try:
+        from google.genai import errors
+        if isinstance(e, errors.APIError):
+            return e.code
+    except ImportError:
+        pass
+    try:
+        import httpx
+        if isinstance(e, httpx.TransportError):
+            return 408
+    except ImportError:
+        pass
+    return 408 if isinstance(e, (asyncio.TimeoutError, ConnectionError)) else None
+
+
+def _retry_after(e):
+    response = getattr(e, 'response', None)
+    try:
+        return float(response.headers.get('retry-after'))
+    except (AttributeError, TypeError, ValueError):
+        return None
+
+
+def backoff_delay(attempt):
+    """指数退避 + 全抖动，避免一批请求在同一时刻一起重试"""
+    return random.uniform(0, min(BACKOFF_CAP, BACKOFF_BASE * 2 ** attempt))
+
+
+class LLMClient:
+    """
+    异步 LLM 客户端：按 (服务商, 模型) 令牌桶限速、抖动退避重试、多请求并发在途、模型依次降级。
+    provider: 'groq' / 'gemini'；传了 base_url (或设置了 LLM_STUB_URL) 时一律走该地址上的本地桩服务。
+    """
+
+    def __init__(self, provider, api_key=None, max_in_flight=MAX_IN_FLIGHT, base_url=None):
+        self.base_url = base_url or STUB_URL
+        self.provider = 'stub' if self.base_url else provider
+        self.api_key = api_key
+        self.in_flight = asyncio.Semaphore(max_in_flight)
+        self.buckets = {}
+        self.stats = {'requests': 0, 'cache_hits': 0, 'retries': 0, 'fallbacks': 0, 'failed': 0}
+        self._sdk = None
+
+    def _bucket(self, model):
+        if model not in self.buckets:
+            rate, burst = MODEL_RATE_LIMITS.get((self.provider, model), RATE_LIMITS[self.provider])
+            self.buckets[model] = TokenBucket(rate, burst)
+        return self.buckets[model]
+
+    def sdk(self):
+        if self._sdk is None:
+            if self.provider == 'gemini':
+                from google import genai
+                self._sdk = genai.Client(api_key=self.api_key)
+            else:
+                # 桩服务实现的是 Groq (OpenAI 兼容) 的接口，直接复用 Groq SDK
+                from groq import AsyncGroq
+                if self.provider == 'stub':
+                    kwargs = {'base_url': self.base_url, 'api_key': 'stub'}
+                else:
+                    kwargs = {'api_key': self.api_key}
+                self._sdk = AsyncGroq(max_retries=0, timeout=REQUEST_TIMEOUT, **kwargs)
+        return self._sdk
+
+    async def _call(self, model, prompt, json_mode, temperature):
+        if self.provider == 'gemini':
+            response = await self.sdk().aio.models.generate_content(model=model, contents=prompt)
+            return response.text if response else None
+        kwargs = {'response_format': {"type": "json_object"}} if json_mode else {}
+        completion = await self.sdk().chat.completions.create(
+            model=model, messages=[{"role": "user", "content": prompt}], temperature=temperature, **kwargs)
+        return completion.choices[0].message.content
+
+    async def complete(self, prompt, models, json_mode=False, temperature=0.7, template_version="v1",
+                       use_cache=True, validate=None):
+        """
+        按 models 顺序尝试，返回文本；全部失败返回 None。
+        相同 (服务商, 模型列表, 模板版本, 输入) 直接返回缓存的回复，不占限额也没有延迟；
+        use_cache=False 或环境变量 LLM_CACHE_BYPASS=1 时强制重新请求。
+        validate(text) 为假的回复 (解析不出来的) 不写缓存，下次重跑还会重新请求。
+        """
+        models = [models] if isinstance(models, str) else list(models)
+        key = response_key(self.provider, models, template_version, prompt,
+                           {'json_mode': json_mode, 'temperature': temperature})
+        if use_cache and not LLM_CACHE_BYPASS:
+            hit = get_cache().get(key)
+            if hit is not None:
+                self.stats['cache_hits'] += 1
+                return hit
+
+        text, model = await self._request(prompt, models, json_mode, temperature)
+        if text and (validate is None or validate(text)):
+            get_cache().put(key, self.provider, model, template_version, text)
+        return text
+
+    async def _request(self, prompt, models, json_mode, temperature):
+        for i, model in enumerate(models):
+            if i:
+                self.stats['fallbacks'] += 1
+                print(f"⚠️ 切换备用模型: {model}")
+            for attempt in range(MAX_RETRIES):
+                bucket = self._bucket(model)
+                await bucket.acquire()
+                async with self.in_flight:
+                    try:
+                        self.stats['requests'] += 1
+                        return await self._call(model, prompt, json_mode, temperature), model
+                    except Exception as e:
+                        code, err = _status(e), e
+                if code in NOT_FOUND:
+                    break  # 模型名不对，重试没意义，直接换下一个
+                if code not in RETRYABLE:
+                    print(f"❌ {self.provider}/{model} 报错: {err}")
+                    break
+                if code == 429:
+                    bucket.drain()
+                delay = _retry_after(err) or backoff_delay(attempt)
+                self.stats['retries'] += 1
+                print(f"⏳ {self.provider}/{model} 返回 {code}，{delay:.1f}s 后重试 ({attempt + 1}/{MAX_RETRIES})")
+                await asyncio.sleep(delay)
+        self.stats['failed'] += 1
+        return None, None
@@ -0,0 +1,134 @@
+import json
+import time
+import random
+import asyncio
+import argparse
+import threading
+from http.server import ThreadingHTTPServer, BaseHTTPRequestHandler
+
+# ================= 配置区 =================
+HOST = "127.0.0.1"
+PORT = 8766
+LATENCY = (0.5, 2.0)  # 模拟的单次生成耗时 (秒)
+SERVER_RPM = 120  # 模拟服务端的每分钟限额，超了返回 429
+ERROR_RATE = 0.02  # 随机 503 的比例
+# 用 json_object 模式请求时返回的假内容
+FAKE_JSON = {"summary": "桩服务返回的假總結", "characters": ["人物A"]}
+FAKE_TEXT = "TITLE: 桩服务标题\nDESC: 桩服务简介\nTAGS: #stub #test"
+
+
+# ==========================================
+
+class StubLimiter:
+    """服务端的滑动窗口限额，模拟真实服务商按分钟计数的 429"""
+
+    def __init__(self, rpm):
+        self.rpm = rpm
+        self.hits = []
+        self.lock = threading.Lock()
+
+    def allow(self):
+        with self.lock:
+            now = time.monotonic()
+            self.hits = [t for t in self.hits if now - t < 60]
+            if len(self.hits) >= self.rpm:
+                return False, 60 - (now - self.hits[0])
+            self.hits.append(now)
+            return True, 0
+
+
+class Handler(BaseHTTPRequestHandler):
+    limiter = None
+    stats = {'ok': 0, 'rate_limited': 0, 'errors': 0}
+
+    def _reply(self, code, data, headers=None):
+        body = json.dumps(data, ensure_ascii=False).encode('utf-8')
+        self.send_response(code)
+        self.send_header('Content-Type', 'application/json; charset=utf-8')
+        self.send_header('Content-Length', str(len(body)))
+        for k, v in (headers or {}).items():
+            self.send_header(k, v)
+        self.end_headers()
+        self.wfile.write(body)
+
+    def do_GET(self):
+        if self.path == '/health':
+            self._reply(200, self.stats)
+        else:
+            self._reply(404, {'error': {'message': 'not found'}})
+
+    def do_POST(self):
+        # Groq SDK 的路径是 /openai/v1/chat/completions，裸 OpenAI 兼容客户端是 /v1/chat/completions
+        if not self.path.endswith('/chat/completions'):
+            self._reply(404, {'error': {'message': 'not found'}})
+            return
+        req = json.loads(self.rfile.read(int(self.headers.get('Content-Length', 0))) or b'{}')
+
+        ok, wait = self.limiter.allow()
+        if not ok:
+            self.stats['rate_limited'] += 1
+            self._reply(429, {'error': {'message': 'rate limit exceeded'}}, {'retry-after': f"{wait:.1f}"})
+            return
+        time.sleep(random.uniform(*LATENCY))
+        if random.random() < ERROR_RATE:
+            self.stats['errors'] += 1
+            self._reply(503, {'error': {'message': 'service unavailable'}})
+            return
+
+        json_mode = (req.get('response_format') or {}).get('type') == 'json_object'
+        content = json.dumps(FAKE_JSON, ensure_ascii=False) if json_mode else FAKE_TEXT
+        self.stats['ok'] += 1
+        self._reply(200, {
+            'id': f"stub-{self.stats['ok']}", 'object': 'chat.completion', 'created': int(time.time()),
+            'model': req.get('model', 'stub'),
+            'choices': [{'index': 0, 'message': {'role': 'assistant', 'content': content}, 'finish_reason': 'stop'}],
+            'usage': {'prompt_tokens': 0, 'completion_tokens': 0, 'total_tokens': 0},
+        })
+
+    def log_message(self, fmt, *args):
+        pass
+
+
+def start(host=HOST, port=PORT, rpm=SERVER_RPM):
+    """后台线程里起桩服务，返回 server (压测时和客户端放在同一进程)"""
+    Handler.limiter = StubLimiter(rpm)
+    server = ThreadingHTTPServer((host, port), Handler)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    print(f"🧪 LLM 桩服务已启动: http://{host}:{port} | 限额 {rpm}/min")
+    return server
+
+
+async def bench(n, models, base_url):
+    """用真实的 LLMClient 打 n 个请求，看限速 + 退避下的实际吞吐 (显式指向本桩服务，不依赖环境变量)"""
+    from util.llm_client import LLMClient
+    client = LLMClient('stub', base_url=base_url)
+    t0 = time.time()
+    # 压测不走缓存，否则第二次跑全部命中
+    results = await asyncio.gather(*[client.complete(f"请求 {i}", models, json_mode=True, use_cache=False)
+                                     for i in range(n)])
+    cost = time.time() - t0
+    ok = sum(r is not None for r in results)
+    print(f"📊 {ok}/{n} 成功 | 耗时 {cost:.1f}s | 吞吐 {ok / cost * 60:.1f} 次/分钟 | 客户端: {client.stats} | 服务端: {Handler.stats}")
+
+
+if __name__ == "__main__":
+    # 只起服务:   python -m util.llm_stub                (脚本侧 export LLM_STUB_URL=http://127.0.0.1:8766)
+    # 起服务并压测: python -m util.llm_stub --bench 200
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--host', default=HOST)
+    parser.add_argument('--port', type=int, default=PORT)
+    parser.add_argument('--rpm', type=int, default=SERVER_RPM)
+    parser.add_argument('--bench', type=int, default=0, help="压测请求数，0 表示只起服务")
+    parser.add_argument('--models', nargs='*', default=["stub-large", "stub-small"])
+    args = parser.parse_args()
+
+    server = start(args.host, args.port, args.rpm)
+    try:
+        if args.bench:
+            asyncio.run(bench(args.bench, args.models, f"http://{args.host}:{args.port}"))
+        else:
+            threading.Event().wait()
+    except KeyboardInterrupt:
+        print("🛑 LLM 桩服务已停止")
+    finally:
+        server.shutdown()
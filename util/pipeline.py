@@ -0,0 +1,130 @@
+import time
+import asyncio
+import logging
+
+# ================= 配置区 =================
+QUEUE_SIZE = 4  # 相邻两级之间最多积压几条，上游太快时会被挡住，不会把解码好的音频堆满内存
+REPORT_INTERVAL = 30.0  # 运行中每隔几秒打印一次各级利用率
+
+
+# ==========================================
+
+logger = logging.getLogger("pipeline")
+
+_END = object()
+
+
+class Stage:
+    """
+    流水线的一级：workers 个并发处理者从上游队列取任务。
+    threaded=True 时 fn 是普通函数，放到线程里跑 (ffmpeg 解码 / 转录这类阻塞调用)；
+    否则 fn 是协程函数，直接在事件循环里 await (LLM 请求)。
+    fn 返回 None 表示这一条到此为止，不往下游传。
+    """
+
+    def __init__(self, name, fn, workers=1, threaded=True, queue_size=QUEUE_SIZE):
+        self.name = name
+        self.fn = fn
+        self.workers = workers
+        self.threaded = threaded
+        self.queue_size = queue_size
+        self.busy = 0.0  # 所有处理者累计在干活的秒数
+        self.blocked = 0.0  # 结果做好了、等下游腾出队列位置的秒数
+        self.done = 0
+        self.failed = 0
+        self.active = 0  # 正在处理中的条数
+        self.queue = None
+
+    def pending(self):
+        """本级还没处理完的条数 (排队 + 处理中)，下游据此判断后面还有没有东西要来"""
+        return (self.queue.qsize() if self.queue else 0) + self.active
+
+    def utilization(self, wall):
+        return self.busy / (self.workers * wall) if wall > 0 else 0.0
+
+
+class Pipeline:
+    """
+    多级流水线：各级之间用有界队列连接，各级同时运行。
+    总耗时取决于最慢的一级，而不是各级耗时之和；结束时报告每级利用率，利用率最高的就是瓶颈。
+    """
+
+    def __init__(self, stages, report_interval=REPORT_INTERVAL):
+        self.stages = stages
+        self.report_interval = report_interval
+        self.started = None
+
+    async def _worker(self, stage, out_queue, on_result):
+        while True:
+            item = await stage.queue.get()
+            if item is _END:
+                return
+            t0 = time.monotonic()
+            stage.active += 1
+            try:
+                result = await (asyncio.to_thread(stage.fn, item) if stage.threaded else stage.fn(item))
+            except Exception as e:
+                stage.failed += 1
+                logger.error(f"[{stage.name}] 处理失败: {e}")
+                continue
+            finally:
+                stage.active -= 1
+                stage.busy += time.monotonic() - t0
+            stage.done += 1
+            if result is None:
+                continue
+            if out_queue is None:
+                if on_result:
+                    on_result(result)
+                continue
+            t1 = time.monotonic()
+            await out_queue.put(result)
+            stage.blocked += time.monotonic() - t1
+
+    async def _run_stage(self, i, on_result):
+        stage = self.stages[i]
+        nxt = self.stages[i + 1] if i + 1 < len(self.stages) else None
+        await asyncio.gather(*[self._worker(stage, nxt.queue if nxt else None, on_result)
+                               for _ in range(stage.workers)])
+        # 本级全部处理完，通知下一级的每个处理者收工
+        if nxt:
+            for _ in range(nxt.workers):
+                await nxt.queue.put(_END)
+
+    async def _feed(self, items):
+        first = self.stages[0]
+        for item in items:
+            await first.queue.put(item)
+        for _ in range(first.workers):
+            await first.queue.put(_END)
+
+    async def _report_loop(self):
+        while True:
+            await asyncio.sleep(self.report_interval)
+            logger.info(f"⏱️ 流水线进度 | {self.status_line()}")
+
+    def status_line(self):
+        wall = time.monotonic() - self.started
+        return " | ".join(f"{s.name}: 完成 {s.done} 失败 {s.failed} 排队 {s.queue.qsize()} 利用率 {s.utilization(wall):.0%}"
+                          for s in self.stages)
+
+    def report(self):
+        wall = time.monotonic() - self.started
+        logger.info(f"📊 流水线总耗时 {wall:.1f}s")
+        for s in self.stages:
+            logger.info(f"   {s.name:<10} x{s.workers} | 完成 {s.done} 失败 {s.failed} | 干活 {s.busy:.1f}s "
+                        f"等下游 {s.blocked:.1f}s | 利用率 {s.utilization(wall):.0%}")
+        bottleneck = max(self.stages, key=lambda s: s.utilization(wall))
+        logger.info(f"   瓶颈: {bottleneck.name}")
+
+    async def run(self, items, on_result=None):
+        """items 依次进入第一级；最后一级的非 None 结果交给 on_result (在事件循环线程里调用)"""
+        for stage in self.stages:
+            stage.queue = asyncio.Queue(maxsize=stage.queue_size)
+        self.started = time.monotonic()
+        reporter = asyncio.create_task(self._report_loop())
+        try:
+            await asyncio.gather(self._feed(items), *[self._run_stage(i, on_result) for i in range(len(self.stages))])
+        finally:
+            reporter.cancel()
+            self.report()
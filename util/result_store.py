@@ -0,0 +1,111 @@
+import os
+import sys
+import json
+import time
+import sqlite3
+import argparse
+
+# ================= 配置区 =================
+RESULT_DB_NAME = "results.sqlite"  # 放在各脚本的输出目录下，和导出的 CSV 在一起
+
+
+# ==========================================
+
+class ResultStore:
+    """
+    逐条追加的结果库 (SQLite WAL)：每处理完一个视频写一行，崩溃时已提交的行都在，
+    「是否已处理」走主键索引，不用再把整个 CSV 读进 pandas。
+    同一 (数据集, 键) 重复写入时覆盖，失败行重跑成功后自动替换。
+    """
+
+    def __init__(self, path):
+        self.path = path
+        os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+        self.conn = sqlite3.connect(path, timeout=30)
+        self.conn.execute("PRAGMA journal_mode=WAL")
+        self.conn.execute("PRAGMA synchronous=NORMAL")  # WAL 下 NORMAL 已能保证进程崩溃不丢已提交的数据
+        self.conn.execute(
+            "CREATE TABLE IF NOT EXISTS results ("
+            " dataset TEXT NOT NULL, key TEXT NOT NULL, ok INTEGER NOT NULL, record TEXT NOT NULL,"
+            " updated_at REAL NOT NULL, PRIMARY KEY (dataset, key))"
+        )
+        self.conn.commit()
+
+    def append(self, dataset, key, record, ok=True):
+        with self.conn:
+            self.conn.execute("INSERT OR REPLACE INTO results VALUES (?, ?, ?, ?, ?)",
+                              (dataset, str(key), int(ok), json.dumps(record, ensure_ascii=False), time.time()))
+
+    def is_done(self, dataset, key):
+        row = self.conn.execute("SELECT ok FROM results WHERE dataset = ? AND key = ?",
+                                (dataset, str(key))).fetchone()
+        return bool(row and row[0])
+
+    def done_keys(self, dataset):
+        return {r[0] for r in self.conn.execute("SELECT key FROM results WHERE dataset = ? AND ok = 1", (dataset,))}
+
+    def count(self, dataset, ok_only=True):
+        sql = "SELECT COUNT(*) FROM results WHERE dataset = ?" + (" AND ok = 1" if ok_only else "")
+        return self.conn.execute(sql, (dataset,)).fetchone()[0]
+
+    def datasets(self):
+        return [r[0] for r in self.conn.execute("SELECT DISTINCT dataset FROM results ORDER BY dataset")]
+
+    def records(self, dataset, ok_only=False):
+        sql = "SELECT record FROM results WHERE dataset = ?" + (" AND ok = 1" if ok_only else "") + " ORDER BY rowid"
+        return [json.loads(r[0]) for r in self.conn.execute(sql, (dataset,))]
+
+    def import_csv(self, dataset, csv_path, key_col, is_ok=None):
+        """把旧版脚本写的 CSV 导入一次 (库里已有这个数据集时跳过)，老的输出照样能断点续传"""
+        if not os.path.exists(csv_path) or self.count(dataset, ok_only=False):
+            return 0
+        import pandas as pd
+        rows = pd.read_csv(csv_path).fillna("").to_dict('records')
+        with self.conn:
+            for r in rows:
+                self.conn.execute("INSERT OR REPLACE INTO results VALUES (?, ?, ?, ?, ?)",
+                                  (dataset, str(r[key_col]), int(is_ok(r) if is_ok else True),
+                                   json.dumps(r, ensure_ascii=False, default=str), time.time()))
+        print(f"📥 已从旧 CSV 导入 {len(rows)} 条: {csv_path}")
+        return len(rows)
+
+    def export(self, dataset, out_path, columns=None):
+        """导出为 CSV / Excel (按扩展名)，给运营直接打开"""
+        import pandas as pd
+        df = pd.DataFrame(self.records(dataset))
+        if columns and not df.empty:
+            df = df[[c for c in columns if c in df.columns]]
+        if out_path.lower().endswith(('.xlsx', '.xls')):
+            df.to_excel(out_path, index=False)
+        else:
+            df.to_csv(out_path, index=False, encoding='utf-8-sig')
+        return len(df)
+
+    def close(self):
+        self.conn.close()
+
+
+if __name__ == "__main__":
+    # 用法:
+    #   python -m util.result_store list   <输出目录>/results.sqlite
+    #   python -m util.result_store export <输出目录>/results.sqlite <数据集> 结果.xlsx
+    parser = argparse.ArgumentParser()
+    sub = parser.add_subparsers(dest='cmd', required=True)
+    p_list = sub.add_parser('list')
+    p_list.add_argument('db')
+    p_export = sub.add_parser('export')
+    p_export.add_argument('db')
+    p_export.add_argument('dataset')
+    p_export.add_argument('out', help="输出文件，.csv 或 .xlsx")
+    args = parser.parse_args()
+
+    if not os.path.exists(args.db):
+        sys.exit(f"❌ 结果库不存在: {args.db}")
+    store = ResultStore(args.db)
+    if args.cmd == 'list':
+        for name in store.datasets():
+            print(f"{name}: {store.count(name)} 条完成 / {store.count(name, ok_only=False)} 条记录")
+    else:
+        n = store.export(args.dataset, args.out)
+        print(f"✅ 已导出 {n} 条 -> {args.out}")
+    store.close()
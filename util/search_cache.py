@@ -0,0 +1,83 @@
+import os
+import re
+import json
+import time
+import sqlite3
+
+from util.browser_pool import get_pool
+
+# ================= 配置区 =================
+SEARCH_CACHE_DB = os.path.expanduser("~/.cache/creative/search_cache.sqlite")
+SEARCH_TTL_SEC = 12 * 3600  # 搜索结果的有效期，热点词排名变化不快，半天内直接复用
+SEARCH_CACHE_BYPASS = False  # 设为 True 时全部强制重新抓取 (结果仍会写回缓存)
+
+
+# ==========================================
+
+def normalize_keyword(keyword):
+    """去首尾空白、合并连续空白、英文统一小写，保证「 Foo  bar」和「foo bar」命中同一条"""
+    return re.sub(r'\s+', ' ', keyword.strip()).lower()
+
+
+class SearchCache:
+    """关键词搜索结果的 SQLite 缓存，按 (规范化关键词, 排序模式) 存候选列表"""
+
+    def __init__(self, path=SEARCH_CACHE_DB, ttl=SEARCH_TTL_SEC):
+        self.path = path
+        self.ttl = ttl
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        with self._conn() as conn:
+            conn.execute(
+                "CREATE TABLE IF NOT EXISTS search_results ("
+                " keyword TEXT NOT NULL, sort TEXT NOT NULL, results TEXT NOT NULL, fetched_at REAL NOT NULL,"
+                " PRIMARY KEY (keyword, sort))"
+            )
+
+    def _conn(self):
+        return sqlite3.connect(self.path, timeout=30)
+
+    def get(self, keyword, order="click", ttl=None):
+        """命中且未过期时返回候选列表 [{'url', 'sec', 'd_str', 'title'}, ...]，否则返回 None"""
+        ttl = self.ttl if ttl is None else ttl
+        with self._conn() as conn:
+            row = conn.execute("SELECT results, fetched_at FROM search_results WHERE keyword = ? AND sort = ?",
+                               (normalize_keyword(keyword), order or "default")).fetchone()
+        if not row or time.time() - row[1] > ttl:
+            return None
+        return json.loads(row[0])
+
+    def put(self, keyword, order, results):
+        with self._conn() as conn:
+            conn.execute("INSERT OR REPLACE INTO search_results VALUES (?, ?, ?, ?)",
+                         (normalize_keyword(keyword), order or "default", json.dumps(results, ensure_ascii=False),
+                          time.time()))
+
+
+_cache = None
+
+
+def get_cache():
+    global _cache
+    if _cache is None:
+        _cache = SearchCache()
+    return _cache
+
+
+async def cached_search(keyword, order="click", ttl=None, bypass=False):
+    """
+    先查缓存，未命中或 bypass 时才从浏览器池抓取并写回。
+    全部命中时不会启动浏览器，崩溃后重跑可以直接跳过抓取。
+    """
+    cache = get_cache()
+    if not (bypass or SEARCH_CACHE_BYPASS):
+        hit = cache.get(keyword, order, ttl)
+        if hit is not None:
+            print(f"💾 搜索缓存命中: {keyword} ({len(hit)} 条)")
+            return hit
+
+    pool = await get_pool()
+    results = await pool.search(keyword, order=order)
+    # 空结果多半是被风控或页面没加载出来，不缓存
+    if results:
+        cache.put(keyword, order, results)
+    return results
@@ -0,0 +1,82 @@
+import os
+import json
+import urllib.error
+import urllib.request
+
+from util import transcribe_engine
+from util.transcribe_server import HOST, PORT, PRIORITY_HIGH, PRIORITY_NORMAL, PRIORITY_LOW
+
+# ================= 配置区 =================
+SERVICE_URL = f"http://{HOST}:{PORT}"
+LOCAL_FALLBACK = True  # 服务没开时在本进程里载入模型转录 (慢，但脚本照样能跑)
+
+
+# ==========================================
+
+_warned = False
+
+
+def _post(path, payload, samples=None):
+    if samples is None:
+        req = urllib.request.Request(SERVICE_URL + path, data=json.dumps(payload).encode('utf-8'),
+                                     headers={'Content-Type': 'application/json'})
+    else:
+        # 采样直接作为请求体，参数 (ASCII 转义后) 放请求头
+        req = urllib.request.Request(SERVICE_URL + path, data=samples.astype('float32').tobytes(),
+                                     headers={'Content-Type': 'application/octet-stream', 'X-Params': json.dumps(payload)})
+    # 转录可能要几分钟，不设超时
+    with urllib.request.urlopen(req) as resp:
+        return json.loads(resp.read())
+
+
+def transcribe(audio, model="small", language=None, initial_prompt=None, start=0, duration=None,
+               backend=None, vad=True, priority=PRIORITY_NORMAL, **options):
+    """
+    所有脚本统一的转录入口：交给本机常驻的转录服务 (python -m util.transcribe_server)。
+    audio 为本机文件路径，或已用 audio_ingest.decode_audio 解码好的数组 (此时忽略 start/duration)；
+    backend 为 'faster' / 'openai' (默认见 transcribe_engine.DEFAULT_BACKEND)。
+    返回 {'text', 'language', 'segments': [{'start', 'end', 'text'}, ...], 'cached'}。
+    """
+    global _warned
+    params = {'model': model, 'language': language, 'initial_prompt': initial_prompt,
+              'start': start, 'duration': duration, 'backend': backend, 'vad': vad, **options}
+    try:
+        if isinstance(audio, str):
+            # 服务进程的工作目录和脚本不同，统一传绝对路径
+            audio = os.path.abspath(audio)
+            return _post('/transcribe', {'audio': audio, **params, 'priority': priority})
+        return _post('/transcribe_samples', {**params, 'priority': priority}, samples=audio)
+    except urllib.error.HTTPError as e:
+        raise RuntimeError(f"转录服务报错: {json.loads(e.read()).get('error')}")
+    except urllib.error.URLError:
+        if not LOCAL_FALLBACK:
+            raise
+        if not _warned:
+            print(f"⚠️ 转录服务未启动 ({SERVICE_URL})，改为本进程内载入模型")
+            _warned = True
+
+    return transcribe_engine.transcribe(audio, **params)
+
+
+def transcribe_batch(paths, model="small", language=None, initial_prompt=None, duration=None, backend=None, vad=True,
+                     priority=PRIORITY_NORMAL, **options):
+    """
+    一次转录一批短文件 (本机路径)：服务端把各文件切成 30 秒窗口叠成批推理，比逐个调用 transcribe 吞吐高；
+    超过 transcribe_engine.BATCH_MAX_SEC 的长文件服务端会自动改为逐个转录。
+    返回与 paths 一一对应的结果列表，格式同 transcribe()；解码失败的文件该项带 'error'，其余照常返回。
+    """
+    global _warned
+    params = {'audios': [os.path.abspath(p) for p in paths], 'model': model, 'language': language,
+              'initial_prompt': initial_prompt, 'duration': duration, 'backend': backend, 'vad': vad, **options}
+    try:
+        return _post('/transcribe_batch', {**params, 'priority': priority})['results']
+    except urllib.error.HTTPError as e:
+        raise RuntimeError(f"转录服务报错: {json.loads(e.read()).get('error')}")
+    except urllib.error.URLError:
+        if not LOCAL_FALLBACK:
+            raise
+        if not _warned:
+            print(f"⚠️ 转录服务未启动 ({SERVICE_URL})，改为本进程内载入模型")
+            _warned = True
+
+    return transcribe_engine.transcribe_batch(**params)
@@ -0,0 +1,310 @@
+import os
+import threading
+
+import numpy as np
+
+from util.audio_ingest import decode_audio, SAMPLE_RATE
+from util.transcript_cache import get_cache, audio_key
+
+# ================= 配置区 =================
+DEFAULT_MODEL = "small"
+# faster: faster-whisper CTranslate2 int8，CPU 上比 openai-whisper fp32 快数倍；没装时自动退回 openai
+DEFAULT_BACKEND = "faster"
+FASTER_COMPUTE_TYPE = "int8"
+VAD = True  # 默认跳过静音 / 纯音乐段，只把有人声的部分送进模型
+
+# 两个后端都用 Silero VAD (随 faster-whisper 一起装)，静音和纯音乐段都会跳过；
+# 只装了 openai-whisper 时 openai 后端退回能量门限，那样只能跳过静音、跳不过纯音乐
+VAD_FRAME_MS = 30
+VAD_SILENCE_DB = -40  # 低于这个响度 (dBFS) 的帧算静音
+VAD_MIN_SILENCE_SEC = 0.6  # 短于这个的停顿不切开
+VAD_PAD_SEC = 0.2  # 每段人声前后留的余量
+# openai 后端只认这些参数，faster 后端不认 fp16
+OPENAI_ONLY_OPTIONS = {'fp16'}
+# CTranslate2 默认只开 4 个线程；批量推理时把核都用上
+FASTER_CPU_THREADS = os.cpu_count() or 4
+
+# 批量转录：多个短文件切成 30 秒窗口后叠成一批一起过编码器 / 解码器
+WINDOW_SEC = 30  # Whisper 编码器固定输入 30 秒
+BATCH_SIZE = 8  # 每批窗口数，越大吞吐越高、内存占用越大
+BATCH_BEAM_SIZE = 5
+# 只有这么短的文件才走批量 (硬切 30 秒窗口、窗口间不带上下文)；更长的逐个走 transcribe，保留跨窗口的连贯性
+BATCH_MAX_SEC = 120
+
+
+# ==========================================
+
+_models = {}
+_load_lock = threading.Lock()
+# 同一个模型对象不是线程安全的，推理串行执行
+_infer_lock = threading.Lock()
+
+
+def resolve_backend(backend=None):
+    backend = backend or DEFAULT_BACKEND
+    if backend == "faster":
+        try:
+            import faster_whisper  # noqa: F401
+        except ImportError:
+            return "openai"
+    return backend
+
+
+def get_model(name=DEFAULT_MODEL, backend=None):
+    """按 (后端, 模型名) 加载并常驻内存，同一进程里只加载一次"""
+    backend = resolve_backend(backend)
+    with _load_lock:
+        if (backend, name) not in _models:
+            print(f"🤖 正在载入 Whisper ({backend}/{name}) 引擎...")
+            # 延迟导入：torch 很重，瘦客户端只有在服务没开、需要本地回退时才付这个成本
+            if backend == "faster":
+                from faster_whisper import WhisperModel
+                _models[(backend, name)] = WhisperModel(name, device="cpu", compute_type=FASTER_COMPUTE_TYPE,
+                                                        cpu_threads=FASTER_CPU_THREADS)
+            else:
+                import whisper
+                _models[(backend, name)] = whisper.load_model(name)
+        return _models[(backend, name)]
+
+
+def loaded_models():
+    return [f"{backend}/{name}" for backend, name in _models]
+
+
+# ---------- openai 后端 / 批量转录用的 VAD ----------
+
+def speech_spans(audio, sr=SAMPLE_RATE):
+    """
+    找出有人声的区间，返回 [(起始采样, 结束采样), ...]。
+    优先用 faster-whisper 自带的 Silero VAD (和 faster 后端的 vad_filter 同一个模型，纯音乐段也会跳过)；
+    没装 faster-whisper 时退回按帧响度的能量门限，只能跳过静音。
+    """
+    try:
+        from faster_whisper.vad import VadOptions, get_speech_timestamps
+    except ImportError:
+        return _energy_spans(audio, sr)
+    opts = VadOptions(min_silence_duration_ms=int(VAD_MIN_SILENCE_SEC * 1000), speech_pad_ms=int(VAD_PAD_SEC * 1000))
+    return [(int(t['start']), int(t['end'])) for t in get_speech_timestamps(audio, opts, sampling_rate=sr)]
+
+
+def _energy_spans(audio, sr=SAMPLE_RATE):
+    """按帧响度找出有声音的区间 (能量门限，没有 Silero VAD 时的退路)"""
+    frame = int(sr * VAD_FRAME_MS / 1000)
+    n = len(audio) // frame
+    if n == 0:
+        return [(0, len(audio))] if len(audio) else []
+    rms = np.sqrt(np.mean(audio[:n * frame].reshape(n, frame) ** 2, axis=1)) + 1e-10
+    voiced = np.flatnonzero(20 * np.log10(rms) > VAD_SILENCE_DB)
+    if not len(voiced):
+        return []
+
+    gap = int(VAD_MIN_SILENCE_SEC * 1000 / VAD_FRAME_MS)
+    pad = int(VAD_PAD_SEC * sr)
+    spans = []
+    start = prev = voiced[0]
+    for i in voiced[1:]:
+        if i - prev > gap:
+            spans.append((start, prev + 1))
+            start = i
+        prev = i
+    spans.append((start, prev + 1))
+
+    merged = []
+    for a, b in spans:
+        a, b = max(0, a * frame - pad), min(len(audio), b * frame + pad)
+        if merged and a <= merged[-1][1]:
+            merged[-1] = (merged[-1][0], b)
+        else:
+            merged.append((a, b))
+    return merged
+
+
+def _remap(t, spans, sr=SAMPLE_RATE):
+    """拼接后音频上的时间 -> 原音频时间"""
+    pos = t * sr
+    offset = 0
+    for a, b in spans:
+        if pos <= offset + (b - a):
+            return float(a + pos - offset) / sr
+        offset += b - a
+    return float(spans[-1][1]) / sr
+
+
+def _run_openai(m, audio, language, initial_prompt, vad, options):
+    spans = speech_spans(audio) if vad else [(0, len(audio))]
+    if not spans:
+        return {'text': "", 'language': language, 'segments': []}
+    # 人声占九成以上时拼接省不了多少，直接整段送
+    if sum(b - a for a, b in spans) < len(audio) * 0.9:
+        audio = np.concatenate([audio[a:b] for a, b in spans])
+    else:
+        spans = [(0, len(audio))]
+    options.setdefault('fp16', False)  # CPU 上只能 fp32
+    result = m.transcribe(audio, language=language, initial_prompt=initial_prompt, **options)
+    return {
+        'text': result['text'],
+        'language': result.get('language'),
+        'segments': [{'start': _remap(float(s['start']), spans), 'end': _remap(float(s['end']), spans),
+                      'text': s['text']} for s in result.get('segments', [])],
+    }
+
+
+def _run_faster(m, audio, language, initial_prompt, vad, options):
+    for k in OPENAI_ONLY_OPTIONS:
+        options.pop(k, None)
+    # faster-whisper 的 VAD 直接跳过静音段，返回的时间戳已是原音频上的时间
+    segments, info = m.transcribe(audio, language=language, initial_prompt=initial_prompt, vad_filter=vad, **options)
+    segments = [{'start': float(s.start), 'end': float(s.end), 'text': s.text} for s in segments]
+    return {
+        'text': "".join(s['text'] for s in segments),
+        'language': info.language,
+        'segments': segments,
+    }
+
+
+def transcribe(audio, model=DEFAULT_MODEL, language=None, initial_prompt=None, start=0, duration=None,
+               backend=None, vad=VAD, use_cache=True, **options):
+    """
+    统一转录接口，返回 {'text', 'language', 'segments': [{'start', 'end', 'text'}, ...], 'cached'}。
+    audio 为音视频文件路径 (可配合 start/duration 只解码一个窗口) 或已解码好的 16kHz float32 数组。
+    backend: 'faster' (faster-whisper int8) / 'openai' (openai-whisper)；vad=True 时跳过没人声的部分。
+    其余参数 (task / condition_on_previous_text 等) 原样传给后端。同样的音频 + 参数直接返回缓存，不碰模型。
+    """
+    if isinstance(audio, str):
+        # 一次 ffmpeg 直接解码到内存，不经过临时 mp3
+        audio = decode_audio(audio, start, duration)
+    backend = resolve_backend(backend)
+
+    key = audio_key(audio, f"{backend}/{model}", language, initial_prompt, {**options, 'vad': vad})
+    if use_cache:
+        hit = get_cache().get(key)
+        if hit is not None:
+            return {**hit, 'cached': True}
+
+    m = get_model(model, backend)
+    run = _run_faster if backend == "faster" else _run_openai
+    with _infer_lock:
+        result = run(m, audio, language, initial_prompt, vad, dict(options))
+    get_cache().put(key, f"{backend}/{model}", result)
+    return {**result, 'cached': False}
+
+
+# ---------- 批量转录 ----------
+
+def _pack_windows(audio, vad, sr=SAMPLE_RATE):
+    """把一个文件的人声区间按顺序装进 ≤30 秒的窗口，返回 [[(起, 止), ...], ...]；超长区间硬切"""
+    limit = WINDOW_SEC * sr
+    spans = speech_spans(audio) if vad else [(0, len(audio))]
+    windows, cur, used = [], [], 0
+    for a, b in spans:
+        while b - a > 0:
+            if used and used + (b - a) > limit:
+                windows.append(cur)
+                cur, used = [], 0
+            take = min(b - a, limit - used)
+            cur.append((a, a + take))
+            used += take
+            a += take
+    if cur:
+        windows.append(cur)
+    return windows
+
+
+def _window_audio(audio, spans, sr=SAMPLE_RATE):
+    chunk = np.concatenate([audio[a:b] for a, b in spans]).astype(np.float32)
+    return np.pad(chunk, (0, WINDOW_SEC * sr - len(chunk)))
+
+
+def _decode_openai(m, windows, language, initial_prompt, options):
+    import torch
+    import whisper
+    torch.set_num_threads(os.cpu_count() or 1)
+    mel = torch.stack([whisper.log_mel_spectrogram(w, m.dims.n_mels) for w in windows]).to(m.device)
+    opts = whisper.DecodingOptions(language=language, prompt=initial_prompt, without_timestamps=True,
+                                   fp16=options.get('fp16', False), beam_size=options.get('beam_size', BATCH_BEAM_SIZE),
+                                   task=options.get('task', 'transcribe'))
+    # whisper.decode 接受 (批, n_mels, 3000) 的 mel，编码器和解码器都按批跑
+    return [(r.text, r.language) for r in whisper.decode(m, mel, opts)]
+
+
+def _decode_faster(m, windows, language, initial_prompt, options):
+    from faster_whisper.tokenizer import Tokenizer
+    n_frames = WINDOW_SEC * SAMPLE_RATE // m.feature_extractor.hop_length
+    features = np.stack([m.feature_extractor(w)[:, :n_frames] for w in windows])
+    encoded = m.encode(features)
+    if language:
+        languages = [language] * len(windows)
+    else:
+        # detect_language 返回每个窗口的 [("<|zh|>", 概率), ...]
+        languages = [r[0][0][2:-2] for r in m.model.detect_language(encoded)]
+
+    tokenizers, prompts = [], []
+    for lang in languages:
+        tok = Tokenizer(m.hf_tokenizer, m.model.is_multilingual, task=options.get('task', 'transcribe'), language=lang)
+        prompt = []
+        if initial_prompt:
+            prompt = [tok.sot_prev] + tok.encode(" " + initial_prompt.strip())[-223:]
+        tokenizers.append(tok)
+        prompts.append(prompt + list(tok.sot_sequence) + [tok.no_timestamps])
+    results = m.model.generate(encoded, prompts, beam_size=options.get('beam_size', BATCH_BEAM_SIZE),
+                               max_length=448, suppress_blank=True)
+    return [(tok.decode(r.sequences_ids[0]), lang) for tok, r, lang in zip(tokenizers, results, languages)]
+
+
+def transcribe_batch(audios, model=DEFAULT_MODEL, language=None, initial_prompt=None, duration=None,
+                     backend=None, vad=VAD, use_cache=True, batch_size=BATCH_SIZE, **options):
+    """
+    批量转录一批短文件：每个文件 (路径或 16kHz 数组) 去掉静音后切成 30 秒窗口，
+    所有文件的窗口叠在一起，每 batch_size 个窗口跑一次编码器 + 解码器，省掉逐文件调用的开销。
+    超过 BATCH_MAX_SEC 的文件改走逐个的 transcribe()。
+    返回与 audios 一一对应的结果列表，格式同 transcribe()；批量的 segments 为窗口粒度 (每个窗口一条)。
+    单个文件解码 / 转录失败不影响其它文件，该项结果带 'error'，调用方跳过即可。
+    """
+    backend = resolve_backend(backend)
+    results = [None] * len(audios)
+    keys, jobs = {}, []  # keys: 走批量的文件序号 -> 缓存键；jobs: (文件序号, 该窗口的区间列表, 窗口音频)
+
+    for i, audio in enumerate(audios):
+        try:
+            if isinstance(audio, str):
+                audio = decode_audio(audio, 0, duration)
+            if len(audio) > BATCH_MAX_SEC * SAMPLE_RATE:
+                results[i] = transcribe(audio, model, language, initial_prompt, backend=backend, vad=vad,
+                                        use_cache=use_cache, **options)
+                continue
+        except Exception as e:
+            results[i] = {'text': "", 'language': language, 'segments': [], 'cached': False, 'error': str(e)}
+            continue
+
+        key = keys[i] = audio_key(audio, f"{backend}/{model}", language, initial_prompt,
+                                  {**options, 'vad': vad, 'batched': True})
+        hit = get_cache().get(key) if use_cache else None
+        if hit is not None:
+            results[i] = {**hit, 'cached': True}
+            continue
+        for spans in _pack_windows(audio, vad):
+            jobs.append((i, spans, _window_audio(audio, spans)))
+
+    if jobs:
+        m = get_model(model, backend)
+        decode = _decode_faster if backend == "faster" else _decode_openai
+        decoded = []
+        with _infer_lock:
+            for b in range(0, len(jobs), batch_size):
+                decoded += decode(m, [w for _, _, w in jobs[b:b + batch_size]], language, initial_prompt, options)
+
+        for (i, spans, _), (text, lang) in zip(jobs, decoded):
+            if results[i] is None:
+                results[i] = {'text': "", 'language': lang, 'segments': []}
+            results[i]['text'] += text
+            results[i]['segments'].append({'start': float(spans[0][0]) / SAMPLE_RATE,
+                                           'end': float(spans[-1][1]) / SAMPLE_RATE, 'text': text})
+
+    for i, key in keys.items():
+        r = results[i]
+        if r is None:  # 整个文件都是静音
+            r = results[i] = {'text': "", 'language': language, 'segments': []}
+        if 'cached' not in r:
+            get_cache().put(key, f"{backend}/{model}", r)
+            results[i] = {**r, 'cached': False}
+    return results
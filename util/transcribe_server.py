@@ -0,0 +1,132 @@
+import json
+import queue
+import argparse
+import itertools
+import threading
+from http.server import ThreadingHTTPServer, BaseHTTPRequestHandler
+
+import numpy as np
+
+from util import transcribe_engine
+
+# ================= 配置区 =================
+HOST = "127.0.0.1"  # 只监听本机
+PORT = 8765
+PRELOAD_MODELS = ["small"]  # 启动时预先载入的模型，其它模型首次用到时再载入
+
+# 优先级数字越小越先处理
+PRIORITY_HIGH = 0  # 交互式 / 单条
+PRIORITY_NORMAL = 5
+PRIORITY_LOW = 9  # 批量补齐素材
+
+
+# ==========================================
+
+class Job:
+    def __init__(self, params):
+        self.params = params
+        self.done = threading.Event()
+        self.result = None
+        self.error = None
+
+
+class TranscribeService:
+    """常驻的转录服务：模型只载入一次，任务进优先级队列，由单个工作线程串行推理"""
+
+    def __init__(self):
+        self.jobs = queue.PriorityQueue()
+        self.seq = itertools.count()  # 同优先级按提交顺序
+        self.finished = 0
+        threading.Thread(target=self._worker, daemon=True).start()
+
+    def submit(self, params):
+        job = Job(params)
+        self.jobs.put((params.pop('priority', PRIORITY_NORMAL), next(self.seq), job))
+        return job
+
+    def _worker(self):
+        while True:
+            _, _, job = self.jobs.get()
+            try:
+                if job.params.pop('batch', False):
+                    job.result = {'results': transcribe_engine.transcribe_batch(**job.params)}
+                else:
+                    job.result = transcribe_engine.transcribe(**job.params)
+            except Exception as e:
+                job.error = str(e)
+            self.finished += 1
+            job.done.set()
+
+    def status(self):
+        return {'models': transcribe_engine.loaded_models(), 'queued': self.jobs.qsize(), 'finished': self.finished}
+
+
+class Handler(BaseHTTPRequestHandler):
+    service = None
+
+    def _reply(self, code, data):
+        body = json.dumps(data, ensure_ascii=False).encode('utf-8')
+        self.send_response(code)
+        self.send_header('Content-Type', 'application/json; charset=utf-8')
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def do_GET(self):
+        if self.path == '/health':
+            self._reply(200, self.service.status())
+        else:
+            self._reply(404, {'error': 'not found'})
+
+    def do_POST(self):
+        if self.path not in ('/transcribe', '/transcribe_samples', '/transcribe_batch'):
+            self._reply(404, {'error': 'not found'})
+            return
+        body = self.rfile.read(int(self.headers.get('Content-Length', 0)))
+        try:
+            if self.path == '/transcribe':
+                params = json.loads(body)
+            elif self.path == '/transcribe_batch':
+                # {'audios': [文件路径, ...], ...}，一个任务里叠窗口批量推理
+                params = json.loads(body)
+                params['batch'] = True
+            else:
+                # 客户端已解码好的 16kHz float32 原始采样，参数放在请求头里
+                params = json.loads(self.headers.get('X-Params', '{}'))
+                params['audio'] = np.frombuffer(body, dtype=np.float32)
+        except ValueError:
+            self._reply(400, {'error': 'bad request'})
+            return
+        job = self.service.submit(params)
+        job.done.wait()
+        if job.error:
+            self._reply(500, {'error': job.error})
+        else:
+            self._reply(200, job.result)
+
+    def log_message(self, fmt, *args):
+        pass  # 不刷 HTTP 访问日志
+
+
+def serve(host=HOST, port=PORT, preload=PRELOAD_MODELS):
+    for name in preload:
+        transcribe_engine.get_model(name)
+    Handler.service = TranscribeService()
+    server = ThreadingHTTPServer((host, port), Handler)
+    print(f"🎧 转录服务已启动: http://{host}:{port} | 已载入模型: {', '.join(transcribe_engine.loaded_models())}")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        print("🛑 转录服务已停止")
+    finally:
+        server.server_close()
+
+
+if __name__ == "__main__":
+    # 用法: python -m util.transcribe_server --models small base
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--host', default=HOST)
+    parser.add_argument('--port', type=int, default=PORT)
+    parser.add_argument('--models', nargs='*', default=PRELOAD_MODELS)
+    args = parser.parse_args()
+    serve(args.host, args.port, args.models)
@@ -0,0 +1,59 @@
+import os
+import json
+import time
+import sqlite3
+import hashlib
+
+# ================= 配置区 =================
+TRANSCRIPT_CACHE_DB = os.path.expanduser("~/.cache/creative/transcripts.sqlite")
+
+
+# ==========================================
+
+def audio_key(samples, model, language=None, prompt=None, options=None):
+    """
+    转录结果的内容寻址键：解码后音频窗口的哈希 + 模型 / 语言 / 提示词 / 其它转录参数。
+    同一段声音不管来自哪个文件、哪个脚本，只要参数相同就命中同一条。
+    """
+    h = hashlib.blake2b(digest_size=16)
+    h.update(samples.tobytes())
+    h.update(json.dumps([model, language, prompt, options or {}], sort_keys=True, ensure_ascii=False).encode('utf-8'))
+    return h.hexdigest()
+
+
+class TranscriptCache:
+    def __init__(self, path=TRANSCRIPT_CACHE_DB):
+        self.path = path
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        with self._conn() as conn:
+            conn.execute(
+                "CREATE TABLE IF NOT EXISTS transcripts ("
+                " key TEXT PRIMARY KEY, model TEXT, text TEXT NOT NULL, language TEXT, segments TEXT NOT NULL,"
+                " created_at REAL NOT NULL)"
+            )
+
+    def _conn(self):
+        return sqlite3.connect(self.path, timeout=30)
+
+    def get(self, key):
+        with self._conn() as conn:
+            row = conn.execute("SELECT text, language, segments FROM transcripts WHERE key = ?", (key,)).fetchone()
+        if not row:
+            return None
+        return {'text': row[0], 'language': row[1], 'segments': json.loads(row[2])}
+
+    def put(self, key, model, result):
+        with self._conn() as conn:
+            conn.execute("INSERT OR REPLACE INTO transcripts VALUES (?, ?, ?, ?, ?, ?)",
+                         (key, model, result['text'], result.get('language'),
+                          json.dumps(result['segments'], ensure_ascii=False), time.time()))
+
+
+_cache = None
+
+
+def get_cache():
+    global _cache
+    if _cache is None:
+        _cache = TranscriptCache()
+    return _cache
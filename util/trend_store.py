@@ -0,0 +1,118 @@
+import os
+import time
+import sqlite3
+
+# ================= 配置区 =================
+TREND_DB = os.path.expanduser("~/.cache/creative/trends.sqlite")
+OFF_BOARD_RANK = 51  # 不在榜上的词按第 51 名算 (微博实时榜 50 条)
+
+
+# ==========================================
+
+class TrendStore:
+    """
+    热搜趋势库：只在某个词的排名 / 热度变化 (或上榜、掉榜) 时追加一条记录，
+    每个词的最新状态单独一张小表，轮询时逐条比对即可，不用再扫描历史快照。
+    「近 N 小时涨得最快」「新上榜」都是走索引的一条 SQL，毫秒级返回。
+    """
+
+    def __init__(self, path=TREND_DB):
+        self.path = path
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        self.conn = sqlite3.connect(path, timeout=30)
+        self.conn.execute("PRAGMA journal_mode=WAL")
+        with self.conn:
+            self.conn.executescript(
+                "CREATE TABLE IF NOT EXISTS terms ("
+                " id INTEGER PRIMARY KEY, term TEXT NOT NULL UNIQUE, category TEXT, first_seen REAL NOT NULL);"
+                # rank 为 NULL 表示这一刻掉出榜单
+                "CREATE TABLE IF NOT EXISTS changes ("
+                " term_id INTEGER NOT NULL, ts REAL NOT NULL, rank INTEGER, hot INTEGER);"
+                "CREATE INDEX IF NOT EXISTS idx_changes_term_ts ON changes (term_id, ts);"
+                "CREATE INDEX IF NOT EXISTS idx_changes_ts ON changes (ts);"
+                "CREATE TABLE IF NOT EXISTS latest ("
+                " term_id INTEGER PRIMARY KEY, rank INTEGER, hot INTEGER, changed_at REAL NOT NULL);"
+                "CREATE TABLE IF NOT EXISTS polls (ts REAL PRIMARY KEY, items INTEGER NOT NULL, changed INTEGER NOT NULL);"
+            )
+
+    def _term_id(self, term, category, ts):
+        row = self.conn.execute("SELECT id FROM terms WHERE term = ?", (term,)).fetchone()
+        if row:
+            return row[0]
+        return self.conn.execute("INSERT INTO terms (term, category, first_seen) VALUES (?, ?, ?)",
+                                 (term, category, ts)).lastrowid
+
+    def record(self, items, ts=None):
+        """
+        写入一次榜单快照 [{'term', 'rank', 'hot', 'category'}, ...]，只追加有变化的词；
+        上次在榜、这次不在的词追加一条 rank=NULL。返回变化条数。
+        """
+        ts = ts or time.time()
+        changed = 0
+        with self.conn:
+            latest = {r[0]: (r[1], r[2]) for r in self.conn.execute("SELECT term_id, rank, hot FROM latest")}
+            seen = set()
+            for it in items:
+                tid = self._term_id(it['term'], it.get('category'), ts)
+                seen.add(tid)
+                state = (it['rank'], it.get('hot'))
+                if latest.get(tid) != state:
+                    self.conn.execute("INSERT INTO changes VALUES (?, ?, ?, ?)", (tid, ts, *state))
+                    self.conn.execute("INSERT OR REPLACE INTO latest VALUES (?, ?, ?, ?)", (tid, *state, ts))
+                    changed += 1
+            for tid, (rank, _) in latest.items():
+                if rank is not None and tid not in seen:
+                    self.conn.execute("INSERT INTO changes VALUES (?, ?, NULL, NULL)", (tid, ts))
+                    self.conn.execute("INSERT OR REPLACE INTO latest VALUES (?, NULL, NULL, ?)", (tid, ts))
+                    changed += 1
+            self.conn.execute("INSERT OR REPLACE INTO polls VALUES (?, ?, ?)", (ts, len(items), changed))
+        return changed
+
+    def rising(self, window_sec=3 * 3600, limit=20, now=None):
+        """
+        近 window_sec 内排名上升的在榜词，按上升速度排序：
+        [{'term', 'category', 'rank', 'old_rank', 'rank_velocity' (名/小时), 'hot', 'hot_delta', 'first_seen'}, ...]
+        窗口开始时不在榜上的按 OFF_BOARD_RANK 算，新上榜的词也能排进来；排名没变或下降的不返回。
+        速度按实际观察到的时长算：窗口内才上榜的词从它上榜前的最后一次轮询 (没有就从上榜时) 算起，
+        不按整个窗口摊薄；实在没有起点 (库里第一次轮询) 时按整个窗口算。
+        """
+        now = now or time.time()
+        since = now - window_sec
+        rows = self.conn.execute(
+            "WITH past AS ("
+            "  SELECT c.term_id, c.ts, c.rank, c.hot FROM changes c"
+            "  JOIN (SELECT term_id, MAX(ts) AS ts FROM changes WHERE ts <= :since GROUP BY term_id) p"
+            "    ON c.term_id = p.term_id AND c.ts = p.ts),"
+            " rows AS ("
+            "  SELECT t.term, t.category, l.rank, COALESCE(past.rank, :off) AS old_rank, l.hot,"
+            "         l.hot - COALESCE(past.hot, 0) AS hot_delta, t.first_seen,"
+            "         :now - MAX(:since, COALESCE(past.ts,"
+            "           (SELECT MAX(ts) FROM polls WHERE ts < t.first_seen), t.first_seen)) AS elapsed"
+            "  FROM latest l JOIN terms t ON t.id = l.term_id LEFT JOIN past ON past.term_id = l.term_id"
+            "  WHERE l.rank IS NOT NULL)"
+            " SELECT term, category, rank, old_rank, hot, hot_delta, first_seen,"
+            "        (old_rank - rank) * 3600.0 / (CASE WHEN elapsed > 0 THEN elapsed ELSE :window END) AS velocity"
+            " FROM rows WHERE old_rank > rank"
+            " ORDER BY velocity DESC, hot_delta DESC LIMIT :limit",
+            {'since': since, 'now': now, 'off': OFF_BOARD_RANK, 'window': window_sec, 'limit': limit}).fetchall()
+        return [{'term': r[0], 'category': r[1], 'rank': r[2], 'old_rank': r[3],
+                 'rank_velocity': r[7], 'hot': r[4], 'hot_delta': r[5], 'first_seen': r[6]}
+                for r in rows]
+
+    def first_seen(self, window_sec=3 * 3600, now=None):
+        """近 window_sec 内第一次上榜的词，按当前排名排序 (已掉榜的排最后)"""
+        now = now or time.time()
+        rows = self.conn.execute(
+            "SELECT t.term, t.category, l.rank, l.hot, t.first_seen FROM terms t JOIN latest l ON l.term_id = t.id"
+            " WHERE t.first_seen >= ? ORDER BY l.rank IS NULL, l.rank",
+            (now - window_sec,)).fetchall()
+        return [{'term': r[0], 'category': r[1], 'rank': r[2], 'hot': r[3], 'first_seen': r[4]} for r in rows]
+
+    def history(self, term):
+        """某个词的全部变化 [(ts, rank, hot), ...]"""
+        return self.conn.execute(
+            "SELECT c.ts, c.rank, c.hot FROM changes c JOIN terms t ON t.id = c.term_id WHERE t.term = ? ORDER BY c.ts",
+            (term,)).fetchall()
+
+    def close(self):
+        self.conn.close()